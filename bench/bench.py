@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Benchmarks of representative BQL workloads.
+
+Run from the top of the source tree after building::
+
+    ./pythenv.sh python bench/bench.py -o results.json
+    ./pythenv.sh python bench/bench.py -b results.json
+
+The first command records wall time, throughput, and peak resident
+set size of each workload on each dataset in ``results.json``.  The
+second runs the workloads again and fails if any is slower than in
+``results.json`` by more than the regression threshold.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import bayeslite
+import bayeslite.core as core
+
+from bayeslite.sqlite3_util import sqlite3_quote_name
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Datasets bundled with the tests.
+bundled = {
+    'satellites': os.path.join(root, 'tests', 'satellites.csv'),
+    'dha': os.path.join(root, 'tests', 'dha.csv'),
+}
+
+# Workloads in the order they run.  Each depends on the ones before.
+workloads = [
+    'load_csv',
+    'guess_schema',
+    'initialize',
+    'analyze',
+    'dependence_probability',
+    'mutual_information',
+    'similarity_topk',
+    'simulate',
+    'infer',
+]
+
+def synthetic_csv(f, nrows, ncols, seed):
+    """Write a synthetic table of `nrows` rows and `ncols` columns to `f`.
+
+    The rows are drawn from a mixture of clusters, and the columns
+    alternate between numerical and nominal, so that there is some
+    structure for the models to find.
+    """
+    prng = random.Random(seed)
+    nclusters = 4
+    centres = [[prng.gauss(0, 10) for _c in xrange(ncols)]
+        for _k in xrange(nclusters)]
+    f.write(','.join('c%d' % (c,) for c in xrange(ncols)))
+    f.write('\n')
+    for _r in xrange(nrows):
+        k = prng.randrange(nclusters)
+        row = []
+        for c in xrange(ncols):
+            x = prng.gauss(centres[k][c], 1)
+            if c % 2 == 0:
+                row.append('%.6g' % (x,))
+            else:
+                row.append('v%d' % (int(x) % 5,))
+        f.write(','.join(row))
+        f.write('\n')
+
+@contextlib.contextmanager
+def dataset_csv(name, args):
+    if name in bundled:
+        yield bundled[name]
+        return
+    assert name == 'synthetic'
+    fd, pathname = tempfile.mkstemp(prefix='bench', suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            synthetic_csv(f, args.rows, args.columns, args.seed)
+        yield pathname
+    finally:
+        os.unlink(pathname)
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak if sys.platform == 'darwin' else 1024*peak
+
+def modelled_variables(bdb, population):
+    population_id = core.bayesdb_get_population(bdb, population)
+    sql = '''
+        SELECT name, stattype FROM bayesdb_variable
+            WHERE population_id = ? AND generator_id IS NULL
+            ORDER BY colno
+    '''
+    return bdb.sql_execute(sql, (population_id,)).fetchall()
+
+def run_dataset(name, args):
+    """Run the workloads on dataset `name` and return their results."""
+    results = {}
+    seed = struct.pack('<QQQQ', args.seed, 0, 0, 0)
+    with dataset_csv(name, args) as pathname, \
+            bayeslite.bayesdb_open(seed=seed) as bdb:
+        state = {}
+        def load_csv():
+            bayeslite.bayesdb_read_csv_file(bdb, 't', pathname,
+                header=True, create=True)
+            n = bdb.sql_execute('SELECT COUNT(*) FROM t').fetchvalue()
+            return n
+        def guess_schema():
+            bdb.execute('CREATE POPULATION p FOR t'
+                ' (GUESS STATTYPES FOR (*))')
+            variables = modelled_variables(bdb, 'p')
+            state['variables'] = [v for v, _st in variables]
+            state['numerical'] = [v for v, st in variables
+                if st == 'numerical']
+            return len(variables)
+        def initialize():
+            bdb.execute('CREATE GENERATOR g FOR p USING %s' %
+                (args.metamodel,))
+            bdb.execute('INITIALIZE %d MODELS FOR g' % (args.models,))
+            return args.models
+        def analyze():
+            bdb.execute('ANALYZE g FOR %d ITERATIONS WAIT' %
+                (args.iterations,))
+            return args.models * args.iterations
+        def dependence_probability():
+            return len(bdb.execute('ESTIMATE DEPENDENCE PROBABILITY'
+                ' FROM PAIRWISE VARIABLES OF p').fetchall())
+        def mutual_information():
+            subset = state['variables'][:args.mi_variables]
+            return len(bdb.execute('ESTIMATE MUTUAL INFORMATION'
+                ' USING %d SAMPLES FROM PAIRWISE VARIABLES OF p FOR %s' %
+                (args.samples,
+                    ', '.join(map(sqlite3_quote_name, subset)))).fetchall())
+        def similarity_topk():
+            context = sqlite3_quote_name(state['variables'][0])
+            return len(bdb.execute('ESTIMATE _rowid_ FROM p'
+                ' ORDER BY SIMILARITY TO (_rowid_ = 1)'
+                ' IN THE CONTEXT OF %s DESC LIMIT %d' %
+                (context, args.topk)).fetchall())
+        def simulate():
+            columns = ', '.join(map(sqlite3_quote_name, state['variables']))
+            return len(bdb.execute('SIMULATE %s FROM p LIMIT %d' %
+                (columns, args.simulate)).fetchall())
+        def infer():
+            if len(state['numerical']) == 0:
+                return None
+            target = sqlite3_quote_name(state['numerical'][0])
+            return len(bdb.execute('INFER EXPLICIT PREDICT %s'
+                ' CONFIDENCE conf USING %d SAMPLES FROM p LIMIT %d' %
+                (target, args.samples, args.infer)).fetchall())
+        workload_fns = {
+            'load_csv': load_csv,
+            'guess_schema': guess_schema,
+            'initialize': initialize,
+            'analyze': analyze,
+            'dependence_probability': dependence_probability,
+            'mutual_information': mutual_information,
+            'similarity_topk': similarity_topk,
+            'simulate': simulate,
+            'infer': infer,
+        }
+        # Each workload depends on the ones before, so run everything
+        # up to the last one requested, but report only those.
+        requested = args.workloads or workloads
+        last = max(workloads.index(w) for w in requested)
+        for workload in workloads[:last + 1]:
+            start = time.time()
+            count = workload_fns[workload]()
+            elapsed = time.time() - start
+            if workload not in requested or count is None:
+                continue
+            results[workload] = {
+                'seconds': elapsed,
+                'count': count,
+                'throughput': count/elapsed if 0 < elapsed else None,
+                'peak_rss': peak_rss(),
+            }
+            if args.verbose:
+                sys.stderr.write('%s %s: %.3fs, %s/s\n' % (name, workload,
+                    elapsed, results[workload]['throughput']))
+    return results
+
+# Script timing startup in a fresh process.
+startup_script = '''
+import json
+import sys
+import time
+start = time.time()
+import bayeslite
+imported = time.time()
+bayeslite.bayesdb_open().close()
+opened_memory = time.time()
+bayeslite.bayesdb_open(pathname=sys.argv[1]).close()
+opened_file = time.time()
+json.dump({
+    'import': imported - start,
+    'open_memory': opened_memory - imported,
+    'open_file': opened_file - opened_memory,
+}, sys.stdout)
+'''
+
+def run_startup(args):
+    """Time importing bayeslite and opening BayesDBs in a fresh process.
+
+    The file opened is a synthetic population with models, so that
+    opening it exercises the checks of an existing database.  Each
+    time is the best of several runs.
+    """
+    fd, pathname = tempfile.mkstemp(prefix='bench', suffix='.bdb')
+    os.close(fd)
+    os.unlink(pathname)
+    try:
+        with dataset_csv('synthetic', args) as csv_pathname, \
+                bayeslite.bayesdb_open(pathname=pathname) as bdb:
+            bayeslite.bayesdb_read_csv_file(bdb, 't', csv_pathname,
+                header=True, create=True)
+            bdb.execute('CREATE POPULATION p FOR t'
+                ' (GUESS STATTYPES FOR (*))')
+            bdb.execute('CREATE GENERATOR g FOR p USING %s' %
+                (args.metamodel,))
+            bdb.execute('INITIALIZE %d MODELS FOR g' % (args.models,))
+        best = {}
+        for _i in xrange(args.startup_runs):
+            output = subprocess.check_output(
+                [sys.executable, '-c', startup_script, pathname])
+            for workload, seconds in json.loads(output).iteritems():
+                best[workload] = min(best.get(workload, seconds), seconds)
+    finally:
+        os.unlink(pathname)
+    results = {}
+    for workload, seconds in best.iteritems():
+        results[workload] = {
+            'seconds': seconds,
+            'count': 1,
+            'throughput': 1/seconds if 0 < seconds else None,
+            'peak_rss': None,
+        }
+        if args.verbose:
+            sys.stderr.write('startup %s: %.3fs\n' % (workload, seconds))
+    return results
+
+def compare(results, baseline, threshold):
+    """Return a list of regressions of `results` from `baseline`."""
+    regressions = []
+    for dataset, workload_results in sorted(results.iteritems()):
+        for workload, result in sorted(workload_results.iteritems()):
+            try:
+                base = baseline[dataset][workload]
+            except KeyError:
+                continue
+            if base['count'] != result['count']:
+                # Not the same work, so not comparable.
+                continue
+            ratio = result['seconds'] / max(base['seconds'], 1e-6)
+            if 1 + threshold < ratio:
+                regressions.append((dataset, workload, base['seconds'],
+                    result['seconds'], ratio))
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark BQL workloads.')
+    parser.add_argument('-o', '--output', metavar='FILE',
+        help='write results as JSON to FILE')
+    parser.add_argument('-b', '--baseline', metavar='FILE',
+        help='compare results with the JSON results in FILE')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+        help='fraction slower than baseline that counts as a regression')
+    parser.add_argument('-d', '--dataset', dest='datasets', action='append',
+        choices=['startup', 'synthetic'] + sorted(bundled),
+        help='dataset to run (default: all)')
+    parser.add_argument('-w', '--workload', dest='workloads',
+        action='append', choices=workloads,
+        help='workload to report (default: all)')
+    parser.add_argument('--rows', type=int, default=1000,
+        help='rows in the synthetic dataset')
+    parser.add_argument('--columns', type=int, default=10,
+        help='columns in the synthetic dataset')
+    parser.add_argument('--metamodel', default='crosscat',
+        help='metamodel of the generator')
+    parser.add_argument('--models', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--samples', type=int, default=50,
+        help='samples for MUTUAL INFORMATION and INFER')
+    parser.add_argument('--mi-variables', type=int, default=4,
+        help='variables in pairwise MUTUAL INFORMATION')
+    parser.add_argument('--topk', type=int, default=10)
+    parser.add_argument('--simulate', type=int, default=100,
+        help='rows to SIMULATE')
+    parser.add_argument('--infer', type=int, default=100,
+        help='rows to INFER')
+    parser.add_argument('--startup-runs', type=int, default=3,
+        help='fresh processes to time startup in')
+    parser.add_argument('--startup-budget', type=float, default=1.,
+        help='seconds allowed to import bayeslite and open a BayesDB')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv[1:])
+
+    datasets = args.datasets or ['startup', 'synthetic'] + sorted(bundled)
+    results = {}
+    for dataset in datasets:
+        if dataset == 'startup':
+            results[dataset] = run_startup(args)
+        else:
+            results[dataset] = run_dataset(dataset, args)
+    report = {
+        'parameters': dict((k, v) for k, v in vars(args).iteritems()
+            if k not in ('output', 'baseline', 'threshold', 'datasets',
+                'workloads', 'startup_runs', 'startup_budget', 'verbose')),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'bayeslite': bayeslite.__version__,
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    status = 0
+    if 'startup' in results:
+        startup = results['startup']['import']['seconds'] + \
+            results['startup']['open_memory']['seconds']
+        if args.startup_budget < startup:
+            sys.stderr.write('startup: %.3fs over budget of %.3fs\n' %
+                (startup, args.startup_budget))
+            status = 1
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('parameters') != report['parameters']:
+            sys.stderr.write('warning: baseline parameters differ\n')
+        regressions = compare(results, baseline['results'], args.threshold)
+        for dataset, workload, before, after, ratio in regressions:
+            sys.stderr.write('%s %s: %.3fs -> %.3fs (%.2fx)\n' %
+                (dataset, workload, before, after, ratio))
+        if regressions:
+            status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Effect of SQLite storage profiles on checkpoints and cold queries.
+
+Run from the top of the source tree after building::
+
+    ./pythenv.sh python bench/storage.py -p default -p fast
+
+For each storage profile, this builds a synthetic BayesDB file and
+records, as JSON:
+
+- the latency of each ``ANALYZE ... FOR 1 ITERATION WAIT``, which
+  rewrites the models in the file when it commits;
+- the latency of the first query after reopening the file, which
+  reads the models back, and of the same query again once warm.
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import bayeslite
+import bayeslite.storage as storage
+
+from bench import synthetic_csv
+
+query = 'ESTIMATE PREDICTIVE PROBABILITY OF c0 FROM p'
+
+def run_profile(profile, args):
+    fd, pathname = tempfile.mkstemp(prefix='bench', suffix='.bdb')
+    os.close(fd)
+    os.unlink(pathname)
+    fd, csv_pathname = tempfile.mkstemp(prefix='bench', suffix='.csv')
+    seed = struct.pack('<QQQQ', args.seed, 0, 0, 0)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            synthetic_csv(f, args.rows, args.columns, args.seed)
+        with bayeslite.bayesdb_open(pathname=pathname, seed=seed,
+                storage_profile=profile) as bdb:
+            settings = bdb.storage_settings()
+            bayeslite.bayesdb_read_csv_file(bdb, 't', csv_pathname,
+                header=True, create=True)
+            bdb.execute('CREATE POPULATION p FOR t'
+                ' (GUESS STATTYPES FOR (*))')
+            bdb.execute('CREATE GENERATOR g FOR p USING %s' %
+                (args.metamodel,))
+            bdb.execute('INITIALIZE %d MODELS FOR g' % (args.models,))
+            checkpoints = []
+            for _i in xrange(args.checkpoints):
+                start = time.time()
+                bdb.execute('ANALYZE g FOR 1 ITERATION WAIT')
+                checkpoints.append(time.time() - start)
+        with bayeslite.bayesdb_open(pathname=pathname, seed=seed,
+                storage_profile=profile) as bdb:
+            start = time.time()
+            bdb.execute(query).fetchall()
+            cold = time.time() - start
+            start = time.time()
+            bdb.execute(query).fetchall()
+            warm = time.time() - start
+        size = os.path.getsize(pathname)
+    finally:
+        os.unlink(csv_pathname)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(pathname + suffix):
+                os.unlink(pathname + suffix)
+    checkpoints.sort()
+    return {
+        'settings': settings,
+        'checkpoint_median': checkpoints[len(checkpoints)//2],
+        'checkpoint_max': checkpoints[-1],
+        'cold_query': cold,
+        'warm_query': warm,
+        'file_size': size,
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark SQLite storage profiles.')
+    parser.add_argument('-o', '--output', metavar='FILE',
+        help='write results as JSON to FILE')
+    parser.add_argument('-p', '--profile', dest='profiles', action='append',
+        choices=sorted(storage.storage_profiles),
+        help='storage profile to run (default: all)')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--metamodel', default='crosscat')
+    parser.add_argument('--models', type=int, default=8)
+    parser.add_argument('--checkpoints', type=int, default=5,
+        help='ANALYZE iterations to time')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv[1:])
+
+    profiles = args.profiles or sorted(storage.storage_profiles)
+    results = dict((profile, run_profile(profile, args))
+        for profile in profiles)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
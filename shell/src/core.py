@@ -14,7 +14,6 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import StringIO
 import apsw
 import cmd
 import traceback
@@ -45,7 +44,7 @@ class Shell(cmd.Cmd):
         if stderr is None:
             stderr = sys.stderr
         self.prompt = self.def_prompt
-        self.bql = StringIO.StringIO()
+        self.bql = parse.BQLIncrementalParser()
         self.identchars += '.'
         self.stderr = stderr
         cmd.Cmd.__init__(self, 'Tab', stdin, stdout)
@@ -63,6 +62,7 @@ class Shell(cmd.Cmd):
         #
         # XXX Does not disable the `quit' command and whatever other
         # bollocks is built-in.
+        self._installcmd('backup', self.dot_backup)
         self._installcmd('codebook', self.dot_codebook)
         self._installcmd('csv', self.dot_csv)
         self._installcmd('describe', self.dot_describe)
@@ -121,32 +121,29 @@ class Shell(cmd.Cmd):
                         break
                 self.stdout.write('Unknown command: %s\n' % (cmd,))
                 return False
-        # Add a line and check whether it finishes a BQL phrase.
-        self.bql.write(line)
-        self.bql.write('\n')
-        string = self.bql.getvalue()
-        if parse.bql_string_complete_p(string):
-            # Reset the BQL input.
-            self.bql = StringIO.StringIO()
-            self.prompt = self.def_prompt
-            try:
-                first = True
-                for phrase in parse.parse_bql_string(string):
-                    cursor = bql.execute_phrase(self._bdb, phrase)
-                    with txn.bayesdb_caching(self._bdb):
-                        # Separate the output tables by a blank line.
-                        if first:
-                            first = False
-                        else:
-                            self.stdout.write('\n')
-                        if cursor is not None:
-                            pretty.pp_cursor(self.stdout, cursor)
-            except (bayeslite.BayesDBException, bayeslite.BQLParseError) as e:
-                self.stdout.write('%s\n' % (e,))
-            except Exception:
-                self.stdout.write(traceback.format_exc())
-        else:
+        # Add a line and execute any BQL phrases it finishes.
+        try:
+            first = True
+            for phrase, _string in self.bql.feed(line + '\n'):
+                cursor = bql.execute_phrase(self._bdb, phrase)
+                with txn.bayesdb_caching(self._bdb):
+                    # Separate the output tables by a blank line.
+                    if first:
+                        first = False
+                    else:
+                        self.stdout.write('\n')
+                    if cursor is not None:
+                        pretty.pp_cursor(self.stdout, cursor)
+        except (bayeslite.BayesDBException, bayeslite.BQLParseError) as e:
+            self.bql = parse.BQLIncrementalParser()
+            self.stdout.write('%s\n' % (e,))
+        except Exception:
+            self.bql = parse.BQLIncrementalParser()
+            self.stdout.write(traceback.format_exc())
+        if self.bql.incomplete():
             self.prompt = self.bql_prompt
+        else:
+            self.prompt = self.def_prompt
         return False
 
     def dot_help(self, line):
@@ -225,14 +222,21 @@ class Shell(cmd.Cmd):
             self.stdout.write('%s\n' % (e,))
             return
 
+        def run(cmd_disp, cmd_exec):
+            if verbose:
+                self.stdout.write('bayeslite> ' + cmd_disp)
+            self.onecmd(cmd_exec)
+            if sequential:
+                raw_input('Press any key to continue.')
+
         try:
             with f:
+                # Run each command as soon as the next one begins, so
+                # that only one is ever in memory.
                 padding = ' '*11
-                cmds_exec = []
-                cmds_disp = []
                 cmd_exec = []
                 cmd_disp = []
-                for i, line in enumerate(f):
+                for line in f:
                     if (hide_comments and is_comment(line)) or line.isspace():
                         continue
 
@@ -243,19 +247,10 @@ class Shell(cmd.Cmd):
                         cmd_exec.append(line.strip())
                         cmd_disp.append(padding + line)
                     else:
-                        cmds_exec.append(' '.join(cmd_exec) + '\n')
+                        run(''.join(cmd_disp), ' '.join(cmd_exec) + '\n')
                         cmd_exec = [line.strip()]
-                        cmds_disp.append(''.join(cmd_disp))
                         cmd_disp = [line]
-                cmds_exec.append(' '.join(cmd_exec) + '\n')
-                cmds_disp.append('\n'.join(cmd_disp))
-
-                for cmd_disp, cmd_exec in zip(cmds_disp, cmds_exec):
-                    if verbose:
-                        self.stdout.write('bayeslite> ' + cmd_disp)
-                    self.onecmd(cmd_exec)
-                    if sequential:
-                        raw_input('Press any key to continue.')
+                run('\n'.join(cmd_disp), ' '.join(cmd_exec) + '\n')
         except Exception as e:
             self.stdout.write('%s\n' % (e,))
 
@@ -338,6 +333,26 @@ class Shell(cmd.Cmd):
             self.stdout.write(traceback.format_exc())
         return False
 
+    def dot_backup(self, line):
+        '''back up the database to a file
+        <pathname>
+
+        Copy the last committed state of the database to the file
+        <pathname>, replacing its contents, without stopping other
+        users of the database for long.
+        '''
+        # XXX Lousy, lousy tokenizer.
+        tokens = line.split()
+        if len(tokens) != 1:
+            self.stdout.write('Usage: .backup <pathname>\n')
+            return
+        try:
+            self._bdb.backup(tokens[0])
+        except apsw.Error as e:
+            self.stdout.write('%s\n' % (e,))
+        except Exception:
+            self.stdout.write(traceback.format_exc())
+
     def dot_open(self, line):
         '''close existing database and open new one
         <pathname>|-m
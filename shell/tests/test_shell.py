@@ -21,6 +21,8 @@ import pytest
 import sys
 import tempfile
 
+import bayeslite
+
 from bayeslite import __version__ as bayeslite_version
 
 
@@ -162,6 +164,7 @@ def test_help_returns_list_of_commands(spawnbdb):
     c = spawnbdb
     c.sendexpectcmd('.help')
     c.expect_lines([
+        '   .backup    back up the database to a file',
         ' .codebook    load codebook for table',
         '      .csv    create table from CSV file',
         ' .describe    describe BayesDB entities',
@@ -189,6 +192,19 @@ def test_trace_usage(spawnbdb):
     ])
 
 
+def test_backup(spawntable):
+    table, c = spawntable
+    with tempfile.NamedTemporaryFile(prefix='bayeslite-shell') as temp:
+        c.sendexpectcmd('.backup %s' % (temp.name,))
+        c.expect_prompt()
+        c.sendexpectcmd('.backup')
+        c.expect_lines(['Usage: .backup <pathname>'])
+        c.expect_prompt()
+        with bayeslite.bayesdb_open(pathname=temp.name) as bdb:
+            sql = 'SELECT COUNT(*) FROM %s' % (table,)
+            assert 0 < bdb.sql_execute(sql).fetchvalue()
+
+
 def test_untrace_usage(spawnbdb):
     c = spawnbdb
     c.sendexpectcmd('.untrace')
@@ -386,6 +402,7 @@ def test_hook(spawnbdb):
     c.expect_prompt()
     c.sendexpectcmd('.help')
     c.expect_lines([
+        '   .backup    back up the database to a file',
         ' .codebook    load codebook for table',
         '      .csv    create table from CSV file',
         ' .describe    describe BayesDB entities',
@@ -53,34 +53,49 @@ You can also execute normal SQL on a BayesDB handle `bdb` with the
 you must use :meth:`~BayesDB.sql_execute` for those.)
 """
 
+from bayeslite.asyncdb import AsyncBayesDB
 from bayeslite.bayesdb import BayesDB
 from bayeslite.bayesdb import bayesdb_open
 from bayeslite.bayesdb import IBayesDBTracer
 from bayeslite.codebook import bayesdb_load_codebook_csv_file
+from bayeslite.colstats import bayesdb_column_stats_refresh
 from bayeslite.exception import BayesDBException
 from bayeslite.exception import BQLError
+from bayeslite.exception import BQLTimeoutError
 from bayeslite.metamodel import IBayesDBMetamodel
 from bayeslite.metamodel import bayesdb_builtin_metamodel
+from bayeslite.metamodel import bayesdb_builtin_metamodel_lazy
 from bayeslite.metamodel import bayesdb_deregister_metamodel
 from bayeslite.metamodel import bayesdb_register_metamodel
 from bayeslite.nullify import bayesdb_nullify
 from bayeslite.parse import BQLParseError
+from bayeslite.pool import BayesDBPool
+from bayeslite.profiler import BayesDBProfiler
 from bayeslite.quote import bql_quote_name
 from bayeslite.read_csv import bayesdb_read_csv
 from bayeslite.read_csv import bayesdb_read_csv_file
 from bayeslite.schema import bayesdb_upgrade_schema
+from bayeslite.snapshot import bayesdb_export_models
+from bayeslite.snapshot import bayesdb_import_models
 from bayeslite.txn import BayesDBTxnError
 from bayeslite.version import __version__
 
 # XXX This is not a good place for me.  Find me a better home, please!
 
 __all__ = [
+    'AsyncBayesDB',
     'BQLError',
     'BQLParseError',
+    'BQLTimeoutError',
     'BayesDB',
     'BayesDBException',
+    'BayesDBPool',
+    'BayesDBProfiler',
     'BayesDBTxnError',
+    'bayesdb_column_stats_refresh',
     'bayesdb_deregister_metamodel',
+    'bayesdb_export_models',
+    'bayesdb_import_models',
     'bayesdb_load_codebook_csv_file',
     'bayesdb_nullify',
     'bayesdb_open',
@@ -93,11 +108,17 @@ __all__ = [
     'IBayesDBTracer',
 ]
 
-# Register crosscat as a builtin metamodel.
-from bayeslite.metamodels.crosscat import CrosscatMetamodel
-from crosscat.LocalEngine import LocalEngine as CrosscatLocalEngine
-bayesdb_builtin_metamodel(CrosscatMetamodel(CrosscatLocalEngine(seed=0)))
+# Register crosscat and cgpm as builtin metamodels.  Importing them and
+# their dependencies is slow, so defer it until a BayesDB uses them.
 
-# Register cgpm as a builtin metamodel.
-from bayeslite.metamodels.cgpm_metamodel import CGPM_Metamodel
-bayesdb_builtin_metamodel(CGPM_Metamodel({}, multiprocess=True))
+def _crosscat_metamodel():
+    from bayeslite.metamodels.crosscat import CrosscatMetamodel
+    from crosscat.LocalEngine import LocalEngine as CrosscatLocalEngine
+    return CrosscatMetamodel(CrosscatLocalEngine(seed=0), multiprocess=True)
+
+def _cgpm_metamodel():
+    from bayeslite.metamodels.cgpm_metamodel import CGPM_Metamodel
+    return CGPM_Metamodel({}, multiprocess=True)
+
+bayesdb_builtin_metamodel_lazy('crosscat', _crosscat_metamodel)
+bayesdb_builtin_metamodel_lazy('cgpm', _cgpm_metamodel)
@@ -153,6 +153,14 @@ DropModels = namedtuple('DropModels', [
     'modelnos',
 ])
 
+ModelSubset = namedtuple('ModelSubset', [
+    'method',                   # MODELSUBSET_*
+    'k',                        # int
+])
+
+MODELSUBSET_TOP = 'top'
+MODELSUBSET_RANDOM = 'random'
+
 Regress = namedtuple('Regress', [
     'target',
     'givens',
@@ -162,11 +170,15 @@ Regress = namedtuple('Regress', [
     'modelnos'
 ])
 
+Explain = namedtuple('Explain', [
+    'query',                    # query phrase
+])
+
 Simulate = namedtuple('Simulate', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
     'constraints',              # [(XXX name, Exp*)]
     'nsamples',                 # Exp* or None
     'accuracy',                 # int or None
@@ -226,19 +238,28 @@ Estimate = namedtuple('Estimate', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
+    'sample',                   # Sample or None (all rows)
     'condition',                # Exp* or None (unconditional)
     'grouping',                 # Grouping or None
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited)
 ])
 
+Sample = namedtuple('Sample', [
+    'unit',                     # SAMPLE_*
+    'size',                     # int or float
+])
+
+SAMPLE_ROWS = 'rows'
+SAMPLE_PERCENT = 'percent'
+
 EstBy = namedtuple('EstBy', [
     'quantifier',               # SELQUANT_*
     'columns',                  # [(Exp*, XXX name)]
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
 ])
 
 SELQUANT_DISTINCT = 'distinct'
@@ -274,7 +295,7 @@ InferAuto = namedtuple('InferAuto', [
     'nsamples',                 # Exp* or None
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
     'condition',                # Exp* or None (unconditional)
     'grouping',                 # Grouping or None
     'order',                    # [Ord] or None (unordered)
@@ -285,7 +306,7 @@ InferExplicit = namedtuple('InferExplicit', [
     'columns',                  # [SelCol* or PredCol]
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
     'condition',                # Exp* or None (unconditional)
     'grouping',                 # Grouping or None
     'order',                    # [Ord] or None (unordered)
@@ -302,7 +323,7 @@ EstCols = namedtuple('EstCols', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
     'condition',                # Exp* or None (unconditional)
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited),
@@ -313,7 +334,7 @@ EstPairCols = namedtuple('EstPairCols', [
     'population',               # XXX name
     'subcolumns',               # ColList* or None
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
     'condition',                # Exp* or None (unconditional)
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited),
@@ -323,7 +344,7 @@ EstPairRow = namedtuple('EstPairRow', [
     'columns',                  # [SelCol*]
     'population',               # XXX name
     'generator',                # XXX name
-    'modelnos',                 # List or None
+    'modelnos',                 # List, ModelSubset, or None
     'condition',                # Exp* or None (unconditional)
     'order',                    # [Ord] or None (unordered)
     'limit',                    # Lim or None (unlimited),
@@ -420,7 +441,9 @@ ExpBQLPredRel = namedtuple('ExpBQLPredRel', [
 ])
 ExpBQLDepProb = namedtuple('ExpBQLDepProb', ['column0', 'column1'])
 ExpBQLMutInf = namedtuple('ExpBQLMutInf', [
-    'columns0', 'columns1', 'constraints', 'nsamples'
+    'columns0', 'columns1', 'constraints', 'nsamples',
+    'tolerance',                # Exp* or None
+    'stderr',                   # bool: standard error instead of estimate
 ])
 ExpBQLCorrel = namedtuple('ExpBQLCorrel', ['column0', 'column1'])
 ExpBQLCorrelPval = namedtuple('ExpBQLCorrelPval', ['column0', 'column1'])
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Non-blocking front end for a BayesDB.
+
+An :class:`AsyncBayesDB` runs everything it is asked to do on a
+BayesDB in one thread of its own, in the order asked, and returns a
+future for the result at once, so that an event loop or a server
+thread need not wait for metamodel work::
+
+    adb = AsyncBayesDB(pathname='foo.bdb')
+    future = adb.execute('ESTIMATE PREDICTIVE PROBABILITY OF x FROM p')
+    ...
+    cursor = future.result()
+    for rows in cursor.batches(100):
+        ...
+    adb.close()
+
+The futures have the interface of ``concurrent.futures.Future``:
+`result`, `exception`, `done`, and `add_done_callback`.  Callbacks run
+in the thread of the :class:`AsyncBayesDB`, so an event loop should
+use them only to hand the result back to itself, e.g. with
+``loop.call_soon_threadsafe``.
+
+Tracers and profilers installed with :meth:`AsyncBayesDB.call` see
+every query as usual, since the queries all run on the same BayesDB.
+"""
+
+import Queue
+import sys
+import threading
+import time
+
+from bayeslite.bayesdb import bayesdb_open
+from bayeslite.quote import bql_quote_name
+
+class AsyncBayesDB(object):
+    """BayesDB whose queries run in a thread of their own.
+
+    The arguments are as for :func:`~bayeslite.bayesdb_open`.  The
+    BayesDB is opened, used, and closed only in the thread of the
+    :class:`AsyncBayesDB`, so only one query touches its SQLite
+    connection at a time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._requests = Queue.Queue()
+        self._bdb = None
+        self._thread = threading.Thread(target=self._run,
+            name='AsyncBayesDB')
+        self._thread.daemon = True
+        self._thread.start()
+        try:
+            self._bdb = self._submit(bayesdb_open, *args, **kwargs).result()
+        except:
+            self._requests.put(None)
+            self._thread.join()
+            raise
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def close(self):
+        """Close the BayesDB once everything asked of it is done."""
+        if self._bdb is None:
+            return
+        future = self._submit(self._bdb.close)
+        self._requests.put(None)
+        self._thread.join()
+        self._bdb = None
+        future.result()
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            future, fn, args, kwargs = request
+            # Drop our references to the arguments here, so that any
+            # cursors among them are finalized in this thread.
+            del request
+            result = None
+            if future._start():
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    future._set_exception(sys.exc_info()[1])
+                else:
+                    future._set_result(result)
+            del future, fn, args, kwargs, result
+
+    def _submit(self, fn, *args, **kwargs):
+        if not self._thread.is_alive():
+            raise ValueError('AsyncBayesDB is closed')
+        future = BayesDBFuture()
+        self._requests.put((future, fn, args, kwargs))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Call ``fn(bdb, *args, **kwargs)`` in turn with the BayesDB.
+
+        Returns a future for its return value.  Use this for anything
+        not covered by the other methods, e.g. to install a tracer::
+
+            adb.call(lambda bdb: bdb.trace(tracer))
+        """
+        return self._submit(fn, self._bdb, *args, **kwargs)
+
+    def execute(self, string, bindings=None, timeout=None):
+        """Execute a BQL query in turn.
+
+        Returns a future for an :class:`AsyncBayesDBCursor` of its
+        results.  The arguments are as for
+        :meth:`~bayeslite.BayesDB.execute`.
+        """
+        def execute():
+            cursor = self._bdb.execute(string, bindings, timeout)
+            return AsyncBayesDBCursor(self, cursor)
+        return self._submit(execute)
+
+    def sql_execute(self, string, bindings=None):
+        """Execute a SQL query in turn.
+
+        Returns a future for an :class:`AsyncBayesDBCursor` of its
+        results.
+        """
+        def sql_execute():
+            cursor = self._bdb.sql_execute(string, bindings)
+            return AsyncBayesDBCursor(self, cursor)
+        return self._submit(sql_execute)
+
+    def analyze(self, generator, iterations=None, seconds=None, step=None,
+            progress=None):
+        """Analyze `generator` in turn, reporting progress as it goes.
+
+        Analysis stops after `iterations` iterations or `seconds`
+        seconds, whichever comes first; at least one must be given.
+        It proceeds `step` iterations (default 1) at a time, each
+        committed as it is done, and after each step calls
+        ``progress(iterations_done, elapsed_seconds)`` if `progress`
+        is given.  Returns a future for the number of iterations done.
+        """
+        if iterations is None and seconds is None:
+            raise ValueError('Specify iterations or seconds to analyze')
+        if step is None:
+            step = 1
+        if not 0 < step:
+            raise ValueError('Invalid analysis step: %r' % (step,))
+        def analyze():
+            done = 0
+            start = time.time()
+            while iterations is None or done < iterations:
+                if seconds is not None and start + seconds <= time.time():
+                    break
+                n = step if iterations is None \
+                    else min(step, iterations - done)
+                self._bdb.execute('ANALYZE %s FOR %d ITERATION WAIT' %
+                    (bql_quote_name(generator), n))
+                done += n
+                if progress is not None:
+                    progress(done, time.time() - start)
+            return done
+        return self._submit(analyze)
+
+    def interrupt(self):
+        """Abandon the BQL query in progress, if any.
+
+        The future of the query fails with
+        :exc:`~bayeslite.BQLTimeoutError`.  Unlike the other methods,
+        this takes effect at once.
+        """
+        self._bdb.interrupt()
+
+class AsyncBayesDBCursor(object):
+    """Cursor of results of a query on an :class:`AsyncBayesDB`.
+
+    Results are fetched in turn with the other work of the
+    :class:`AsyncBayesDB`.
+    """
+
+    def __init__(self, adb, cursor):
+        self._adb = adb
+        self._cursor = cursor
+        self.description = cursor.description
+
+    def __del__(self):
+        # Finalizing a cursor may run SQL, e.g. to drop temporary
+        # tables, so hand it back to the thread of the BayesDB.
+        if self._adb._thread.is_alive():
+            self._adb._submit(lambda cursor: None, self._cursor)
+        del self._cursor
+
+    def fetchmany(self, size=1):
+        """Return a future for a list of up to `size` more rows."""
+        return self._adb._submit(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        """Return a future for the list of all remaining rows."""
+        return self._adb._submit(self._cursor.fetchall)
+
+    def batches(self, size=100):
+        """Yield lists of up to `size` rows until there are no more.
+
+        Each batch is fetched while the caller works on the one
+        before.
+        """
+        future = self.fetchmany(size)
+        while True:
+            rows = future.result()
+            if len(rows) < size:
+                if 0 < len(rows):
+                    yield rows
+                return
+            future = self.fetchmany(size)
+            yield rows
+
+    def __iter__(self):
+        for rows in self.batches():
+            for row in rows:
+                yield row
+
+class BayesDBFuture(object):
+    """Result of work submitted to an :class:`AsyncBayesDB`."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._state = 'pending'
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def cancel(self):
+        """Cancel the work if it has not started.  Return true if so."""
+        with self._condition:
+            if self._state == 'pending':
+                self._state = 'cancelled'
+                self._condition.notify_all()
+            elif self._state != 'cancelled':
+                return False
+        self._run_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == 'cancelled'
+
+    def running(self):
+        return self._state == 'running'
+
+    def done(self):
+        return self._state in ('cancelled', 'finished')
+
+    def result(self, timeout=None):
+        """Wait for and return the result, or raise its exception."""
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for the work and return its exception or ``None``."""
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Call ``fn(future)`` when done, or now if already done."""
+        with self._condition:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _wait(self, timeout):
+        # Condition.wait without a timeout can't be interrupted, so
+        # wait a long time instead.
+        deadline = time.time() + (1e9 if timeout is None else timeout)
+        with self._condition:
+            while not self.done():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self._state == 'cancelled':
+                raise BayesDBFutureCancelled()
+            if not self.done():
+                raise BayesDBFutureTimeout()
+
+    def _start(self):
+        with self._condition:
+            if self._state == 'cancelled':
+                return False
+            self._state = 'running'
+            return True
+
+    def _set_result(self, result):
+        with self._condition:
+            self._result = result
+            self._state = 'finished'
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def _set_exception(self, exception):
+        with self._condition:
+            self._exception = exception
+            self._state = 'finished'
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        callbacks = self._callbacks
+        self._callbacks = []
+        for fn in callbacks:
+            fn(self)
+
+class BayesDBFutureCancelled(Exception):
+    """The work of a :class:`BayesDBFuture` was cancelled."""
+    pass
+
+class BayesDBFutureTimeout(Exception):
+    """A :class:`BayesDBFuture` was not done in time."""
+    pass
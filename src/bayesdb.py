@@ -19,22 +19,40 @@ import contextlib
 import numpy.random
 import random
 import struct
+import threading
+import time
 
+import bayeslite.ast as ast
 import bayeslite.bql as bql
 import bayeslite.bqlfn as bqlfn
 import bayeslite.bqlvtab as bqlvtab
+import bayeslite.core as core
 import bayeslite.metamodel as metamodel
 import bayeslite.parse as parse
 import bayeslite.schema as schema
+import bayeslite.storage as storage
 import bayeslite.txn as txn
 import bayeslite.weakprng as weakprng
+import bayeslite.weakprng.chacha as chacha
 
+from bayeslite.exception import BQLTimeoutError
 from bayeslite.util import cursor_value
 
 bayesdb_open_cookie = 0xed63e2c26d621a5b5146a334849d43f0
 
+# Number of SQLite virtual machine instructions between checks of the
+# query deadline.
+_PROGRESS_INSTRUCTIONS = 10000
+
+# Tag distinguishing blocks that derive substream keys from blocks of
+# the stream itself.
+_SUBSTREAM_TAG = 0x62737562     # 'bsub'
+
+# Bytes of a script to read at a time.
+_SCRIPT_CHUNK = 0x10000
+
 def bayesdb_open(pathname=None, builtin_metamodels=None, seed=None,
-        version=None, compatible=None):
+        version=None, compatible=None, readonly=None, storage_profile=None):
     """Open the BayesDB in the file at `pathname`.
 
     If there is no file at `pathname`, it is automatically created.
@@ -50,11 +68,21 @@ def bayesdb_open(pathname=None, builtin_metamodels=None, seed=None,
     bayeslite cannot read it.  If `compatible` is `True`,
     `bayesdb_open` will not incompatibly change the format of the
     database (but some newer bayesdb features may not work).
+
+    If `readonly` is `True`, the database at `pathname` must already
+    exist, and it is opened read-only: BQL queries that would modify
+    it fail.  Its format is left alone as if `compatible` were `True`.
+
+    `storage_profile` is the name of a storage profile, such as
+    ``'fast'``, or a dictionary of SQLite storage settings; see
+    :mod:`bayeslite.storage`.  If not specified, SQLite's defaults
+    are used.
     """
     if builtin_metamodels is None:
         builtin_metamodels = True
     bdb = BayesDB(bayesdb_open_cookie, pathname=pathname, seed=seed,
-        version=version, compatible=compatible)
+        version=version, compatible=compatible, readonly=readonly,
+        storage_profile=storage_profile)
     if builtin_metamodels:
         metamodel.bayesdb_register_builtin_metamodels(bdb)
     return bdb
@@ -72,28 +100,45 @@ class BayesDB(object):
     """
 
     def __init__(self, cookie, pathname=None, seed=None, version=None,
-            compatible=None):
+            compatible=None, readonly=None, storage_profile=None):
         if cookie != bayesdb_open_cookie:
             raise ValueError('Do not construct BayesDB objects directly!')
         if pathname is None:
             pathname = ":memory:"
+        if readonly and pathname == ":memory:":
+            raise ValueError('Cannot open an in-memory database read-only.')
         self.pathname = pathname
-        self._sqlite3 = apsw.Connection(pathname)
+        self.readonly = bool(readonly)
+        self.storage_profile = storage_profile
+        self._storage = storage.storage_profile_settings(storage_profile)
+        self._sqlite3 = self._connect()
         self._txn_depth = 0     # managed in txn.py
         self._cache = None      # managed in txn.py
-        self.metamodels = {}
+        self.metamodels = metamodel.BayesDBMetamodels(self)
         self.tracer = None
         self.sql_tracer = None
+        self.profiler = None
+        self.pool = None
         self.temptable = 0
         self.qid = 0
+        self._nqueries = 0
+        self._query_depth = 0
+        self._query = _BayesDBQuery(None, None)
+        self._interrupted = False
+        self._interrupt_lock = threading.Lock()
+        self._default_models = {}
         if seed is None:
             seed = struct.pack('<QQQQ', 0, 0, 0, 0)
+        self._seed = seed
         self._prng = weakprng.weakprng(seed)
         pyrseed = self._prng.weakrandom32()
         self._py_prng = random.Random(pyrseed)
         nprseed = [self._prng.weakrandom32() for _ in range(4)]
         self._np_prng = numpy.random.RandomState(nprseed)
 
+        # Set up storage before anything is written to a new file.
+        storage.bayesdb_storage_apply(self, self._storage)
+
         # Set up or check the permanent schema on disk.
         schema.bayesdb_install_schema(self, version=version,
             compatible=compatible)
@@ -141,6 +186,50 @@ class BayesDB(object):
         """
         return self._np_prng
 
+    def substream(self, generator_id=None, modelno=None, chunk=None):
+        """Return a weakprng for an independent substream of the seed.
+
+        The substream is determined by the seed supplied to
+        :func:`bayesdb_open`, `generator_id`, `modelno`, the BQL query
+        in progress, and `chunk`, and by nothing else -- in
+        particular, not by how much randomness has been drawn from
+        other substreams, so computations that draw from distinct
+        substreams give the same results whether run serially in any
+        order or in parallel.
+
+        If `chunk` is ``None``, each call gets the next chunk for
+        `generator_id` and `modelno` in the query in progress.
+        """
+        query = self._query
+        if chunk is None:
+            chunk = query.chunks.get((generator_id, modelno), 0)
+            query.chunks[generator_id, modelno] = chunk + 1
+        path = (generator_id, modelno, query.qid, chunk)
+        return weakprng.weakprng(_substream_seed(self._seed, path))
+
+    def substream_np_prng(self, generator_id=None, modelno=None,
+            chunk=None):
+        """A Numpy RandomState object for an independent substream.
+
+        See :meth:`~BayesDB.substream` for the meaning of the
+        arguments.
+        """
+        prng = self.substream(generator_id, modelno, chunk)
+        return numpy.random.RandomState(
+            [prng.weakrandom32() for _ in range(4)])
+
+    def _query_np_prng(self):
+        # Numpy RandomState for miscellaneous randomness in the query
+        # in progress, such as bql_rand.  No chunk is named None, so
+        # this is distinct from all substreams of the query.
+        query = self._query
+        if query.np_prng is None:
+            path = (None, None, query.qid, None)
+            prng = weakprng.weakprng(_substream_seed(self._seed, path))
+            query.np_prng = numpy.random.RandomState(
+                [prng.weakrandom32() for _ in range(4)])
+        return query.np_prng
+
     @property
     def cache(self):
         return self._cache
@@ -211,7 +300,57 @@ class BayesDB(object):
         assert self.sql_tracer == tracer
         self.sql_tracer = None
 
-    def execute(self, string, bindings=None):
+    def profile(self, profiler):
+        """Profile BQL queries with `profiler`.
+
+        `profiler` is a :class:`~bayeslite.profiler.BayesDBProfiler`
+        which records the time spent in each phase of each query.
+
+        Only one profiler can be established at a time.  To remove
+        it, use :meth:`~BayesDB.unprofile`.
+        """
+        assert self.profiler is None
+        self.profiler = profiler
+
+    def unprofile(self, profiler):
+        """Stop profiling BQL queries with `profiler`.
+
+        `profiler` must have been previously established with
+        :meth:`~BayesDB.profile`.
+
+        Its report is stored in the temporary table
+        ``bayesdb_profile``.
+        """
+        assert self.profiler == profiler
+        self.profiler = None
+        profiler.save(self)
+
+    def set_default_models(self, generator, method=None, k=None):
+        """Use only `k` of `generator`'s models in queries naming none.
+
+        `method` is ``'top'``, for the `k` models of highest log
+        score as in ``USING TOP <k> MODELS BY LOGSCORE``, or
+        ``'random'``, for `k` models chosen afresh in each query as in
+        ``USING <k> RANDOM MODELS``.  If `method` is ``None``, queries
+        use all models again.
+
+        The default applies only to this connection, and only to
+        queries that name `generator` or whose population has no
+        other generator.
+        """
+        if not core.bayesdb_has_generator(self, None, generator):
+            raise ValueError('No such generator: %r' % (generator,))
+        generator_id = core.bayesdb_get_generator(self, None, generator)
+        if method is None:
+            self._default_models.pop(generator_id, None)
+            return
+        if method not in (ast.MODELSUBSET_TOP, ast.MODELSUBSET_RANDOM):
+            raise ValueError('Invalid model subset method: %r' % (method,))
+        if not isinstance(k, (int, long)) or k <= 0:
+            raise ValueError('Number of models must be positive: %r' % (k,))
+        self._default_models[generator_id] = ast.ModelSubset(method, k)
+
+    def execute(self, string, bindings=None, timeout=None):
         """Execute a BQL query and return a cursor for its results.
 
         The argument `string` is a string parsed into a single BQL
@@ -221,11 +360,147 @@ class BayesDB(object):
         The argument `bindings` is a sequence or dictionary of
         bindings for parameters in the query, or ``None`` to supply no
         bindings.
+
+        The argument `timeout` is a number of seconds after which the
+        query, including consumption of its results from the cursor,
+        is abandoned with :exc:`~bayeslite.BQLTimeoutError`, or
+        ``None`` for no time limit.  Any effects of an abandoned query
+        are rolled back.
         """
         if bindings is None:
             bindings = ()
-        return self._maybe_trace(
-            self.tracer, self._do_execute, string, bindings)
+        return self._execute(string, bindings, timeout, self._do_execute)
+
+    def execute_many(self, string, bindings_seq, timeout=None):
+        """Execute a BQL query once for each bindings in a sequence.
+
+        Return a cursor for the results of all the executions in
+        turn, with each row preceded by the index in `bindings_seq` of
+        the bindings that gave it.
+
+        The query is parsed and traced once, and, unless compiling it
+        requires evaluating subqueries or simulating, compiled once.
+        All the executions happen in one savepoint, sharing the models
+        they load, and all their results are read before this returns.
+
+        The arguments `string` and `timeout` are as for
+        :meth:`~BayesDB.execute`, with `timeout` covering the whole
+        batch.  Tracers get the list of bindings as the bindings.
+        """
+        bindings_seq = list(bindings_seq)
+        return self._execute(string, bindings_seq, timeout,
+            self._do_execute_many)
+
+    def execute_script(self, f, timeout=None):
+        """Execute each BQL phrase in the file `f` in turn.
+
+        `f` is a file object, or anything with a compatible ``read``
+        method.  Phrases are executed as soon as they are read, so the
+        whole script need not fit in memory, and the results of each
+        are read and discarded before the next.  A phrase that fails
+        to parse or execute stops the script, leaving the effects of
+        the phrases before it.
+
+        The argument `timeout` is as for :meth:`~BayesDB.execute`, for
+        each phrase.
+        """
+        parser = parse.BQLIncrementalParser()
+        while True:
+            text = f.read(_SCRIPT_CHUNK)
+            phrases = parser.feed(text) if text else parser.close()
+            for phrase, string in phrases:
+                execute = lambda string, bindings: \
+                    self._do_execute(string, bindings, phrase)
+                cursor = self._execute(string, (), timeout, execute)
+                for _row in cursor:
+                    pass
+            if not text:
+                break
+
+    def _execute(self, string, bindings, timeout, do_execute):
+        deadline = self._query.deadline
+        if timeout is not None:
+            deadline = time.time() + timeout if deadline is None \
+                else min(deadline, time.time() + timeout)
+        self._nqueries += 1
+        query = _BayesDBQuery(self._nqueries, deadline)
+        if self.profiler is not None:
+            self.profiler.start(query.qid, string, bindings)
+        def execute(string, bindings):
+            with self._query_scope(query):
+                cursor = do_execute(string, bindings)
+            if cursor is not self._empty_cursor:
+                cursor._bind_query(query)
+            return cursor
+        return self._maybe_trace(self.tracer, execute, string, bindings)
+
+    def interrupt(self):
+        """Abandon the BQL query in progress, if any.
+
+        The query fails with :exc:`~bayeslite.BQLTimeoutError` and any
+        of its effects are rolled back.  This may be called from
+        another thread while a query is executing.
+        """
+        # Hold the lock so the query cannot end, and clear the flag for
+        # the next one, between checking for it and interrupting it.
+        with self._interrupt_lock:
+            if 0 < self._query_depth:
+                self._interrupted = True
+                self._sqlite3.interrupt()
+
+    def check_deadline(self):
+        """Raise :exc:`~bayeslite.BQLTimeoutError` if the query is over.
+
+        The BQL query in progress is over if it has passed its
+        deadline or if it has been abandoned with
+        :meth:`~BayesDB.interrupt`.  Metamodels should call this
+        periodically in long-running computations.
+        """
+        if self._interrupted:
+            raise BQLTimeoutError(self, 'Query interrupted')
+        deadline = self._query.deadline
+        if deadline is not None and deadline <= time.time():
+            raise BQLTimeoutError(self, 'Query timed out')
+
+    @contextlib.contextmanager
+    def _query_scope(self, query):
+        outer = self._query
+        progress = query.deadline is not None and outer.deadline is None
+        with self._interrupt_lock:
+            self._query_depth += 1
+        self._query = query
+        if progress:
+            self._sqlite3.setprogresshandler(
+                self._progress, _PROGRESS_INSTRUCTIONS)
+        try:
+            yield
+        except apsw.InterruptError:
+            # SQLite abandoned the statement, either because our
+            # progress handler said so or because of interrupt.
+            self.check_deadline()
+            raise
+        finally:
+            if progress:
+                self._sqlite3.setprogresshandler(None)
+            self._query = outer
+            with self._interrupt_lock:
+                self._query_depth -= 1
+                if self._query_depth == 0:
+                    self._interrupted = False
+
+    def _profile(self, phase, name=None):
+        if self.profiler is None:
+            return _NO_PROFILE
+        return self.profiler.measure(self._query.qid, phase, name)
+
+    def _profile_metamodel(self, metamodel):
+        if self.profiler is None:
+            return metamodel
+        return self.profiler.metamodel(lambda: self._query.qid, metamodel)
+
+    def _progress(self):
+        deadline = self._query.deadline
+        return deadline is not None and deadline <= time.time()
 
     def _maybe_trace(self, tracer, meth, string, bindings):
         if tracer and isinstance(tracer, IBayesDBTracer):
@@ -261,22 +536,32 @@ class BayesDB(object):
             tracer.error(qid, e)
             raise
 
-    def _do_execute(self, string, bindings):
-        phrases = parse.parse_bql_string(string)
-        phrase = None
-        try:
-            phrase = phrases.next()
-        except StopIteration:
-            raise ValueError('no BQL phrase in string')
-        try:
-            phrases.next()
-        except StopIteration:
-            pass
-        else:
-            raise ValueError('>1 phrase in string')
+    def _do_execute(self, string, bindings, phrase=None):
+        if phrase is None:
+            phrase = self._parse(string)
         cursor = bql.execute_phrase(self, phrase, bindings)
         return self._empty_cursor if cursor is None else cursor
 
+    def _do_execute_many(self, string, bindings_seq):
+        phrase = self._parse(string)
+        return bql.execute_phrase_many(self, phrase, bindings_seq)
+
+    def _parse(self, string):
+        phrases = parse.parse_bql_string(string)
+        phrase = None
+        with self._profile('parse'):
+            try:
+                phrase = phrases.next()
+            except StopIteration:
+                raise ValueError('no BQL phrase in string')
+            try:
+                phrases.next()
+            except StopIteration:
+                pass
+            else:
+                raise ValueError('>1 phrase in string')
+        return phrase
+
     def sql_execute(self, string, bindings=None):
         """Execute a SQL query on the underlying SQLite database.
 
@@ -295,7 +580,30 @@ class BayesDB(object):
 
     def _do_sql_execute(self, string, bindings):
         cursor = self._sqlite3.cursor()
-        cursor.execute(string, bindings)
+        with self._profile('sql', 'execute'):
+            cursor.execute(string, bindings)
+        return bql.BayesDBCursor(self, cursor)
+
+    def sql_execute_many(self, string, bindings_seq):
+        """Execute a SQL query once for each bindings in a sequence.
+
+        The query is prepared once and executed with each bindings in
+        `bindings_seq` in turn.  Return a cursor for the results of
+        all the executions in turn.  Executions giving no results all
+        happen before this returns; wrap it in a savepoint to commit
+        them all at once.
+
+        The argument `string` is as for :meth:`~BayesDB.sql_execute`.
+        Tracers get the list of bindings as the bindings.
+        """
+        bindings_seq = list(bindings_seq)
+        return self._maybe_trace(
+            self.sql_tracer, self._do_sql_execute_many, string, bindings_seq)
+
+    def _do_sql_execute_many(self, string, bindings_seq):
+        cursor = self._sqlite3.cursor()
+        with self._profile('sql', 'execute'):
+            cursor.executemany(string, bindings_seq)
         return bql.BayesDBCursor(self, cursor)
 
     @contextlib.contextmanager
@@ -363,7 +671,39 @@ class BayesDB(object):
                 database. All prior transactions would be lost.""")
         assert self._txn_depth == 0, "pending BayesDB transactions"
         self._sqlite3.close()
-        self._sqlite3 = apsw.Connection(self.pathname)
+        self._sqlite3 = self._connect()
+        storage.bayesdb_storage_apply(self, self._storage)
+
+    def _connect(self):
+        if self.readonly:
+            return apsw.Connection(self.pathname,
+                flags=apsw.SQLITE_OPEN_READONLY)
+        return apsw.Connection(self.pathname)
+
+    def storage_settings(self):
+        """Return a dictionary of the SQLite storage settings in effect.
+
+        The keys are those of a storage profile, such as
+        ``journal_mode`` and ``mmap_size``, whether or not they were
+        given in the `storage_profile` passed to
+        :func:`bayesdb_open`.
+        """
+        return storage.bayesdb_storage_settings(self)
+
+    def backup(self, pathname, pages_per_step=None, sleep=None,
+            progress=None):
+        """Copy the database to the file at `pathname` while in use.
+
+        The copy is a consistent snapshot of the last commit, made
+        with SQLite's online backup a few pages at a time, so that
+        other handles on the file, such as one running ``ANALYZE`` in
+        another thread, can proceed meanwhile.  An in-memory database
+        cannot be backed up during a transaction.  See
+        :func:`bayeslite.storage.bayesdb_storage_backup` for the
+        arguments.
+        """
+        storage.bayesdb_storage_backup(self, pathname,
+            pages_per_step=pages_per_step, sleep=sleep, progress=progress)
 
     def changes(self):
         """Return the number of changes of the last INSERT, DELETE, or UPDATE.
@@ -373,6 +713,37 @@ class BayesDB(object):
         """
         return self._sqlite3.changes()
 
+class _BayesDBQuery(object):
+    """State of a BQL query while it executes or its results are consumed."""
+    def __init__(self, qid, deadline):
+        self.qid = qid
+        self.deadline = deadline
+        self.chunks = {}
+        self.np_prng = None
+        self.memo = {}
+
+class _NoProfile(object):
+    def __enter__(self):
+        pass
+    def __exit__(self, *_exc_info):
+        return False
+
+_NO_PROFILE = _NoProfile()
+
+def _substream_seed(seed, path):
+    # Derive a key for each element of the path in turn from the key
+    # for its prefix, with one ChaCha8 block whose input is the
+    # element, its depth, and a tag.  The stream for a key counts its
+    # input up from zero and so never reaches the tag in the top word.
+    key = struct.unpack('<IIIIIIII', seed)
+    out = [0] * 16
+    for depth, i in enumerate(path):
+        i = 0xffffffffffffffff if i is None else i & 0xffffffffffffffff
+        block = [i & 0xffffffff, i >> 32, depth, _SUBSTREAM_TAG]
+        chacha.core(8, out, block, key, chacha.const32)
+        key = out[0:8]
+    return struct.pack('<IIIIIIII', *key)
+
 class IBayesDBTracer(object):
     """BayesDB articulated tracing interface.
 
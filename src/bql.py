@@ -29,8 +29,10 @@ import apsw
 
 import bayeslite.ast as ast
 import bayeslite.bqlfn as bqlfn
+import bayeslite.colstats as colstats
 import bayeslite.compiler as compiler
 import bayeslite.core as core
+import bayeslite.explain as explain
 import bayeslite.guess as guess
 import bayeslite.txn as txn
 
@@ -57,16 +59,23 @@ def execute_phrase(bdb, phrase, bindings=()):
         # Ignore extraneous bindings.  XXX Bad idea?
 
     if ast.is_query(phrase):
-        # Compile the query in the transaction in case we need to
-        # execute subqueries to determine column lists.  Compiling is
-        # a quick tree descent, so this should be fast.
-        out = compiler.Output(n_numpar, nampar_map, bindings)
-        with bdb.savepoint():
-            compiler.compile_query(bdb, phrase, out)
+        out = compile_query(bdb, phrase, n_numpar, nampar_map, bindings)
         winders, unwinders = out.getwindings()
         return execute_wound(bdb, winders, unwinders, out.getvalue(),
             out.getbindings())
 
+    if isinstance(phrase, ast.Explain):
+        out = None
+        if not isinstance(phrase.query, ast.Simulate):
+            # Compiling SIMULATE runs the simulation, wherever it is.
+            if explain.contains_simulate(phrase.query):
+                raise BQLError(bdb, 'Cannot explain SIMULATE in a subquery'
+                    ' without running it')
+            out = compile_query(bdb, phrase.query, n_numpar, nampar_map,
+                bindings)
+        rows = explain.bayesdb_explain(bdb, phrase.query, out, bindings)
+        return BayesDBCursor(bdb, _RowListCursor(explain.DESCRIPTION, rows))
+
     if isinstance(phrase, ast.Begin):
         txn.bayesdb_begin_transaction(bdb)
         return empty_cursor(bdb)
@@ -94,7 +103,8 @@ def execute_phrase(bdb, phrase, bindings=()):
             temp = 'TEMP ' if phrase.temp else ''
             ifnotexists = 'IF NOT EXISTS ' if phrase.ifnotexists else ''
             out.write('CREATE %sTABLE %s%s AS ' % (temp, ifnotexists, qt))
-            compiler.compile_query(bdb, phrase.query, out)
+            with bdb._profile('compile'):
+                compiler.compile_query(bdb, phrase.query, out)
             winders, unwinders = out.getwindings()
             with compiler.bayesdb_wind(bdb, winders, unwinders):
                 bdb.sql_execute(out.getvalue(), out.getbindings())
@@ -122,6 +132,7 @@ def execute_phrase(bdb, phrase, bindings=()):
                     (repr(phrase.name),))
             bdb.sql_execute('DELETE FROM bayesdb_column WHERE tabname = ?',
                 (phrase.name,))
+            colstats.bayesdb_column_stats_forget(bdb, phrase.name)
             ifexists = 'IF EXISTS ' if phrase.ifexists else ''
             qt = sqlite3_quote_name(phrase.name)
             return bdb.sql_execute('DROP TABLE %s%s' % (ifexists, qt))
@@ -418,7 +429,7 @@ def execute_phrase(bdb, phrase, bindings=()):
         if metamodel_name not in bdb.metamodels:
             raise BQLError(bdb, 'No such metamodel: %s' %
                 (repr(metamodel_name),))
-        metamodel = bdb.metamodels[metamodel_name]
+        metamodel = bdb._profile_metamodel(bdb.metamodels[metamodel_name])
 
         with bdb.savepoint():
             if core.bayesdb_has_generator(bdb, population_id, phrase.name):
@@ -437,6 +448,10 @@ def execute_phrase(bdb, phrase, bindings=()):
                 generator_id = core.bayesdb_get_generator(
                     bdb, population_id, phrase.name)
 
+                # Forget any default models of a generator whose
+                # creation with the same id was rolled back.
+                bdb._default_models.pop(generator_id, None)
+
                 # Populate bayesdb_generator_column.
                 #
                 # XXX Omit needless bayesdb_generator_column table --
@@ -501,6 +516,9 @@ def execute_phrase(bdb, phrase, bindings=()):
                 DELETE FROM bayesdb_generator WHERE id = ?
             '''
             bdb.sql_execute(drop_generator_sql, (generator_id,))
+
+            # Forget its default models.
+            bdb._default_models.pop(generator_id, None)
         return empty_cursor(bdb)
 
     if isinstance(phrase, ast.AlterGen):
@@ -725,7 +743,9 @@ def execute_phrase(bdb, phrase, bindings=()):
         constraints = []
         colnos = [colno_target] + list(colno_givens_unique)
         nsamp = 100 if phrase.nsamp is None else phrase.nsamp.value.value
-        modelnos = None if phrase.modelnos is None else str(phrase.modelnos)
+        modelnos = compiler.resolve_modelnos(
+            bdb, phrase.population, phrase.metamodel, phrase.modelnos)
+        modelnos = None if modelnos is None else str(modelnos)
         rows = bqlfn.bayesdb_simulate(
             bdb, population_id, generator_id, modelnos, constraints,
             colnos, numpredictions=nsamp)
@@ -901,6 +921,8 @@ def _column_contains_string(bdb, table, column):
 def rename_table(bdb, old, new):
     assert core.bayesdb_has_table(bdb, old)
     assert not core.bayesdb_has_table(bdb, new)
+    # Forget the column statistics, whose triggers name the old table.
+    colstats.bayesdb_column_stats_forget(bdb, old)
     # Rename the SQL table.
     qo = sqlite3_quote_name(old)
     qn = sqlite3_quote_name(new)
@@ -927,6 +949,58 @@ def rename_table(bdb, old, new):
     '''
     bdb.sql_execute(update_populations_sql, (new, old))
 
+def compile_query(bdb, query, n_numpar, nampar_map, bindings):
+    """Compile the BQL query `query` and return its compiler output."""
+    # Compile the query in the transaction in case we need to execute
+    # subqueries to determine column lists.  Compiling is a quick tree
+    # descent, so this should be fast.
+    out = compiler.Output(n_numpar, nampar_map, bindings)
+    with bdb.savepoint():
+        with bdb._profile('compile'):
+            compiler.compile_query(bdb, query, out)
+    return out
+
+def execute_phrase_many(bdb, phrase, bindings_seq):
+    """Execute `phrase` with each bindings in `bindings_seq` in turn.
+
+    Return a cursor of the results of all of them, each row preceded
+    by the index of its bindings in `bindings_seq`.
+    """
+    if isinstance(phrase, ast.Parametrized):
+        query = phrase.phrase
+        n_numpar = phrase.n_numpar
+        nampar_map = phrase.nampar_map
+    else:
+        query = phrase
+        n_numpar = 0
+        nampar_map = None
+    description = []
+    rows = []
+    with bdb.savepoint():
+        out = None
+        for i, bindings in enumerate(bindings_seq):
+            if out is not None and out.reusable():
+                # Same query, new bindings: skip compiling it again.
+                cursor = bdb.sql_execute(out.getvalue(),
+                    out.getbindings(bindings))
+            elif ast.is_query(query):
+                out = compile_query(bdb, query, n_numpar, nampar_map,
+                    bindings)
+                winders, unwinders = out.getwindings()
+                cursor = execute_wound(bdb, winders, unwinders,
+                    out.getvalue(), out.getbindings())
+            else:
+                cursor = execute_phrase(bdb, phrase, bindings)
+            if cursor is None:
+                continue
+            if not description:
+                description = cursor.description
+            rows.extend((i,) + tuple(row) for row in cursor)
+            del cursor
+    if description:
+        description = [('index', None)] + list(description)
+    return BayesDBCursor(bdb, _RowListCursor(description, rows))
+
 def empty_cursor(bdb):
     return None
 
@@ -934,13 +1008,15 @@ def execute_wound(bdb, winders, unwinders, sql, bindings):
     if len(winders) == 0 and len(unwinders) == 0:
         return bdb.sql_execute(sql, bindings)
     with bdb.savepoint():
-        for (wsql, wbindings) in winders:
-            bdb.sql_execute(wsql, wbindings)
+        with bdb._profile('wind'):
+            for (wsql, wbindings) in winders:
+                bdb.sql_execute(wsql, wbindings)
         try:
             return WoundCursor(bdb, bdb.sql_execute(sql, bindings), unwinders)
         except:
-            for (usql, ubindings) in unwinders:
-                bdb.sql_execute(usql, ubindings)
+            with bdb._profile('unwind'):
+                for (usql, ubindings) in unwinders:
+                    bdb.sql_execute(usql, ubindings)
             raise
 
 class BayesDBCursor(object):
@@ -959,20 +1035,51 @@ class BayesDBCursor(object):
             assert self._description is not None
             if self._description is None:
                 self._description = []
+        self._query = None
+    def _bind_query(self, query):
+        # Consuming the results of a BQL query is part of the query:
+        # it is subject to the query's deadline and to interruption,
+        # and draws from the query's random substreams.
+        self._query = query
     def __iter__(self):
         return self
     def next(self):
-        return self._cursor.next()
+        if self._query is None:
+            with self._bdb._profile('sql', 'step'):
+                return self._cursor.next()
+        with self._bdb._query_scope(self._query):
+            with self._bdb._profile('sql', 'step'):
+                return self._cursor.next()
     def fetchone(self):
-        return self._cursor.fetchone()
+        if self._query is None:
+            with self._bdb._profile('sql', 'step'):
+                return self._cursor.fetchone()
+        with self._bdb._query_scope(self._query):
+            with self._bdb._profile('sql', 'step'):
+                return self._cursor.fetchone()
     def fetchvalue(self):
         return cursor_value(self)
     def fetchmany(self, size=1):
-        with txn.bayesdb_caching(self._bdb):
-            return self._cursor.fetchmany(size=size)
+        if self._query is None:
+            with txn.bayesdb_caching(self._bdb):
+                with self._bdb._profile('sql', 'step'):
+                    return self._fetchmany(size)
+        with self._bdb._query_scope(self._query):
+            with txn.bayesdb_caching(self._bdb):
+                with self._bdb._profile('sql', 'step'):
+                    return self._fetchmany(size)
+    def _fetchmany(self, size):
+        # Not every version of apsw has Cursor.fetchmany.
+        return list(itertools.islice(self._cursor, size))
     def fetchall(self):
-        with txn.bayesdb_caching(self._bdb):
-            return self._cursor.fetchall()
+        if self._query is None:
+            with txn.bayesdb_caching(self._bdb):
+                with self._bdb._profile('sql', 'step'):
+                    return self._cursor.fetchall()
+        with self._bdb._query_scope(self._query):
+            with txn.bayesdb_caching(self._bdb):
+                with self._bdb._profile('sql', 'step'):
+                    return self._cursor.fetchall()
     @property
     def connection(self):
         return self._bdb
@@ -983,6 +1090,20 @@ class BayesDBCursor(object):
     def description(self):
         return self._description
 
+class _RowListCursor(object):
+    """Stand-in for an apsw cursor over a list of rows."""
+    def __init__(self, description, rows):
+        self.description = description
+        self._rows = iter(rows)
+    def __iter__(self):
+        return self
+    def next(self):
+        return self._rows.next()
+    def fetchone(self):
+        return next(self._rows, None)
+    def fetchall(self):
+        return list(self._rows)
+
 class WoundCursor(BayesDBCursor):
     def __init__(self, bdb, cursor, unwinders):
         self._unwinders = unwinders
@@ -998,7 +1119,8 @@ class WoundCursor(BayesDBCursor):
         # kludgily.  (But that might encourage people outside to
         # depend on that, which is not such a great idea.)
         if self._bdb._sqlite3 is not None:
-            for sql, bindings in reversed(self._unwinders):
-                self._bdb.sql_execute(sql, bindings)
+            with self._bdb._profile('unwind'):
+                for sql, bindings in reversed(self._unwinders):
+                    self._bdb.sql_execute(sql, bindings)
         # Apparently object doesn't have a __del__ method.
         #super(WoundCursor, self).__del__()
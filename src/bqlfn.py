@@ -17,6 +17,7 @@
 import json
 import math
 import numpy
+import time
 
 import bayeslite.core as core
 import bayeslite.stats as stats
@@ -29,18 +30,32 @@ from bayeslite.math_util import ieee_exp
 from bayeslite.math_util import logmeanexp
 from bayeslite.math_util import logavgexp_weighted
 from bayeslite.util import casefold
+from bayeslite.util import float_sum
 
 def bayesdb_install_bql(db, cookie):
     def function(name, nargs, fn):
-        db.createscalarfunction(name, (lambda *args: fn(cookie, *args)), nargs)
+        def call(*args):
+            # BQL functions run inside the SQLite VM where the
+            # progress handler does not reach, so check the deadline
+            # on every call.
+            cookie.check_deadline()
+            with cookie._profile('bqlfn', name):
+                return fn(cookie, *args)
+        db.createscalarfunction(name, call, nargs)
     function("bql_column_correlation", 5, bql_column_correlation)
     function("bql_column_correlation_pvalue", 5, bql_column_correlation_pvalue)
     function("bql_column_dependence_probability", 5,
         bql_column_dependence_probability)
     function("bql_column_mutual_information", -1, bql_column_mutual_information)
+    function("bql_column_mutual_information_adaptive", -1,
+        bql_column_mutual_information_adaptive)
+    function("bql_column_mutual_information_stderr", -1,
+        bql_column_mutual_information_stderr)
     function("bql_column_value_probability", -1, bql_column_value_probability)
     function("bql_rand", 0, bql_rand)
+    function("bql_sample_stderr", 6, bql_sample_stderr)
     function("bql_row_similarity", 6, bql_row_similarity)
+    function("bql_row_similarity_batch", 6, bql_row_similarity_batch)
     function("bql_row_predictive_relevance", -1, bql_row_predictive_relevance)
     function("bql_row_column_predictive_probability", 6,
         bql_row_column_predictive_probability)
@@ -318,6 +333,110 @@ def bql_column_mutual_information(
     # averaged over all population models.
     return stats.arithmetic_mean([stats.arithmetic_mean(m) for m in mutinfs])
 
+# Number of samples per batch, and default budget of samples with a
+# tolerance, for the adaptive mutual information estimator.
+MUTINF_BATCH_SAMPLES = 100
+MUTINF_MAX_SAMPLES = 10000
+
+# Two-column function:
+#   MUTUAL INFORMATION [OF <col0> WITH <col1>] ... TOLERANCE <tol>
+def bql_column_mutual_information_adaptive(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, tolerance, *constraint_args):
+    mutinfs, _stderr = _bql_column_mutual_information_memo(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, tolerance, *constraint_args)
+    # XXX Same integral over generators as bql_column_mutual_information.
+    return stats.arithmetic_mean([stats.arithmetic_mean(m) for m in mutinfs])
+
+# Two-column function:
+#   MUTUAL INFORMATION [OF <col0> WITH <col1>] ... STANDARD ERROR
+def bql_column_mutual_information_stderr(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, tolerance, *constraint_args):
+    _mutinfs, stderr = _bql_column_mutual_information_memo(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, tolerance, *constraint_args)
+    return stderr
+
+def _bql_column_mutual_information_memo(bdb, *args):
+    # A query asking for the estimate usually asks for its standard
+    # error too, so compute them once per query.  Outside a query,
+    # e.g. in bare SQL, there is nothing to bound the memo's life.
+    if bdb._query.qid is None:
+        return _bql_column_mutual_information_adaptive(bdb, *args)
+    memo = bdb._query.memo
+    key = ('bql_column_mutual_information_adaptive',) + args
+    if key not in memo:
+        memo[key] = _bql_column_mutual_information_adaptive(bdb, *args)
+    return memo[key]
+
+def _bql_column_mutual_information_adaptive(
+        bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+        numsamples, tolerance, *constraint_args):
+    """Estimate mutual information in batches until precise enough.
+
+    Draws batches of samples until the Monte Carlo standard error of
+    the estimate is at most `tolerance`, the budget of `numsamples`
+    samples is spent, or another batch would run past the deadline
+    of the query.  With no tolerance, spends the whole budget.
+
+    Returns ``(mutinfs, stderr)``, where `mutinfs` has a list for
+    each generator of each model's estimate averaged over batches,
+    and `stderr` is the standard error of the mean of all of them,
+    or ``None`` if there was only one batch.
+    """
+    colnos0 = json.loads(colnos0)
+    colnos1 = json.loads(colnos1)
+    modelnos = _retrieve_modelnos(modelnos)
+    if tolerance is not None and not 0 < tolerance:
+        raise BQLError(bdb, 'Tolerance must be positive: %r' % (tolerance,))
+    budget = numsamples
+    if budget is None:
+        budget = MUTINF_MAX_SAMPLES if tolerance is not None \
+            else 2*MUTINF_BATCH_SAMPLES
+    if not 0 < budget:
+        raise BQLError(bdb, 'Number of samples must be positive: %r' %
+            (budget,))
+    batch = max(1, min(MUTINF_BATCH_SAMPLES, budget // 2))
+    deadline = bdb._query.deadline
+    batches = []
+    stderr = None
+    spent = 0
+    while spent + batch <= budget:
+        start = time.time()
+        batches.append(_bql_column_mutual_information(
+            bdb, population_id, generator_id, modelnos, colnos0, colnos1,
+            batch, *constraint_args))
+        spent += batch
+        if 2 <= len(batches):
+            stderr = _mutinf_stderr(batches)
+            if tolerance is not None and stderr <= tolerance:
+                break
+        now = time.time()
+        if deadline is not None and deadline < now + (now - start):
+            break
+    mutinfs = [
+        [stats.arithmetic_mean(estimates) for estimates in
+            zip(*[mutinfs[i] for mutinfs in batches])]
+        for i in xrange(len(batches[0]))
+    ]
+    return mutinfs, stderr
+
+def _mutinf_stderr(batches):
+    # batches[b][g][m] is the estimate of model m of generator g in
+    # batch b.  The estimate is the mean over generators of the mean
+    # over models of the mean over batches, so sum the variances of
+    # the batch means with the squared weights.
+    ngenerators = len(batches[0])
+    variance = 0
+    for i in xrange(ngenerators):
+        models = zip(*[mutinfs[i] for mutinfs in batches])
+        variance += float_sum(
+            numpy.var(estimates, ddof=1) / len(estimates)
+            for estimates in models) / len(models)**2
+    return math.sqrt(variance) / ngenerators
+
 def _bql_column_mutual_information(
         bdb, population_id, generator_id, modelnos, colnos0, colnos1,
         numsamples, *constraint_args):
@@ -421,11 +540,28 @@ def _bql_logpdf(bdb, population_id, generator_id, modelnos, targets,
 # Row function:  SIMILARITY TO <target_row> IN THE CONTEXT OF <column>
 def bql_row_similarity(
         bdb, population_id, generator_id, modelnos, rowid, target_rowid, colno):
+    return _bql_row_similarity(bdb, population_id, generator_id, modelnos,
+        rowid, target_rowid, colno, False)
+
+# Row function:  SIMILARITY TO <target_row> IN THE CONTEXT OF <column>,
+# with the same target at every row of the query.
+def bql_row_similarity_batch(
+        bdb, population_id, generator_id, modelnos, rowid, target_rowid, colno):
+    return _bql_row_similarity(bdb, population_id, generator_id, modelnos,
+        rowid, target_rowid, colno, True)
+
+def _bql_row_similarity(bdb, population_id, generator_id, modelnos, rowid,
+        target_rowid, colno, batch):
     if target_rowid is None:
         raise BQLError(bdb, 'No such target row for SIMILARITY')
     modelnos = _retrieve_modelnos(modelnos)
     def generator_similarity(generator_id):
         metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        if batch:
+            similarities = _row_similarities_memo(
+                bdb, metamodel, generator_id, modelnos, target_rowid, colno)
+            if similarities is not None and rowid in similarities:
+                return similarities[rowid]
         # XXX Change [colno] to colno by updating IBayesDBMetamodel.
         return metamodel.row_similarity(
             bdb, generator_id, modelnos, rowid, target_rowid, [colno])
@@ -433,6 +569,25 @@ def bql_row_similarity(
     similarities = map(generator_similarity, generator_ids)
     return stats.arithmetic_mean(similarities)
 
+def _row_similarities_memo(
+        bdb, metamodel, generator_id, modelnos, target_rowid, colno):
+    # Queries such as ORDER BY SIMILARITY TO (...) LIMIT k ask for the
+    # similarity of every row to the same target, which metamodels
+    # can compute for all rows at once far faster than row by row.
+    # The compiler asks for this only if the target is the same at
+    # every row, so the memo holds one result for each SIMILARITY in
+    # the query.  Outside a query there is nothing to bound the memo's
+    # life, so go row by row.
+    if bdb._query.qid is None:
+        return None
+    memo = bdb._query.memo
+    key = ('bql_row_similarity', generator_id,
+        None if modelnos is None else tuple(modelnos), target_rowid, colno)
+    if key not in memo:
+        memo[key] = metamodel.row_similarities(
+            bdb, generator_id, modelnos, target_rowid, [colno])
+    return memo[key]
+
 # Row function:  PREDICTIVE RELEVANCE TO (<target_row>)
 #  [<AND HYPOTHETICAL ROWS WITH VALUES ((...))] IN THE CONTEXT OF <column>
 def bql_row_predictive_relevance(
@@ -503,7 +658,7 @@ def bql_predict(
     modelnos = _retrieve_modelnos(modelnos)
     if generator_id is None:
         generator_ids = core.bayesdb_population_generators(bdb, population_id)
-        index = bdb.np_prng.randint(0, high=len(generator_ids))
+        index = bdb._query_np_prng().randint(0, high=len(generator_ids))
         generator_id = generator_ids[index]
     metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
     return metamodel.predict(
@@ -517,7 +672,7 @@ def bql_predict_confidence(
     # how to aggregate imputations across different hypotheses.
     if generator_id is None:
         generator_ids = core.bayesdb_population_generators(bdb, population_id)
-        index = bdb.np_prng.randint(0, high=len(generator_ids))
+        index = bdb._query_np_prng().randint(0, high=len(generator_ids))
         generator_id = generator_ids[index]
     modelnos = _retrieve_modelnos(modelnos)
     metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
@@ -571,7 +726,7 @@ def bayesdb_simulate(
             likelihood / total_likelihood
             for likelihood in likelihoods
         ]
-        countses = bdb.np_prng.multinomial(
+        countses = bdb._query_np_prng().multinomial(
             numpredictions, probabilities, size=1)
         counts = countses[0]
     elif len(generator_ids) == 1:
@@ -586,7 +741,40 @@ def bayesdb_simulate(
 ### Seeded random number generation
 
 def bql_rand(bdb):
-    return bdb.np_prng.uniform()
+    return bdb._query_np_prng().uniform()
+
+### Row samples
+
+def bql_sample_stderr(bdb, estimator, nsample, npopulation, count, total,
+        total2):
+    """Standard error of an aggregate estimated from a row sample.
+
+    The sample is `nsample` rows drawn uniformly without replacement
+    from `npopulation`.  Of the sampled rows, `count` had a value, and
+    the values sum to `total` with squares summing to `total2`.
+    `estimator` is ``'mean'`` for the mean of the values, or
+    ``'count'`` or ``'total'`` for the population count or sum
+    estimated by scaling the sample's.
+    """
+    if estimator == 'mean':
+        n = count
+        if n < 2:
+            return None
+        scale = 1.
+    else:
+        n = nsample
+        if n < 2:
+            return None
+        if estimator == 'count':
+            # Each sampled row contributes 1 if counted, else 0.
+            total = total2 = count
+        else:
+            assert estimator == 'total'
+        scale = npopulation
+    mean = float(total) / n
+    variance = max(0., (total2 - n*mean*mean) / (n - 1))
+    fpc = 1 - float(nsample) / npopulation
+    return scale * math.sqrt(variance / n * fpc)
 
 ### Helper functions functions
 
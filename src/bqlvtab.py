@@ -28,6 +28,7 @@ class Mutinf(object):
     REFERENCE_VARS = 4
     CONDITIONS = 5
     NSAMPLES = 6
+    TOLERANCE = 7
 
 
 class MutinfModule(object):
@@ -45,7 +46,8 @@ class MutinfModule(object):
                 target_vars text not null,      -- json list
                 reference_vars text not null,   -- json list
                 conditions text,                -- json dict
-                nsamples integer
+                nsamples integer,
+                tolerance real
             )
         '''
         table = MutinfTable(self._bdb)
@@ -78,6 +80,7 @@ class MutinfTable(object):
         reference_vars = -1
         conditions = -1
         nsamples = -1
+        tolerance = -1
         for i, (c, op) in enumerate(constraints):
             if op != apsw.SQLITE_INDEX_CONSTRAINT_EQ:
                 continue
@@ -93,6 +96,8 @@ class MutinfTable(object):
                 conditions = i
             elif c == Mutinf.NSAMPLES:
                 nsamples = i
+            elif c == Mutinf.TOLERANCE:
+                tolerance = i
             else:
                 continue
             have |= 1 << c
@@ -116,6 +121,8 @@ class MutinfTable(object):
             index_info[conditions] = count.next()
         if have & (1 << Mutinf.NSAMPLES):
             index_info[nsamples] = count.next()
+        if have & (1 << Mutinf.TOLERANCE):
+            index_info[tolerance] = count.next()
 
         # XXX Tell sqlite3 that this is ordered by rowid.
         return (index_info, have)
@@ -133,6 +140,7 @@ class MutinfCursor(object):
         self._reference_vars = None
         self._conditions = None
         self._nsamples = None
+        self._tolerance = None
 
     def Close(self):
         pass
@@ -147,6 +155,7 @@ class MutinfCursor(object):
             self._reference_vars,
             self._conditions,
             self._nsamples,
+            self._tolerance,
         )[number + 1]
 
     def Next(self):
@@ -187,6 +196,10 @@ class MutinfCursor(object):
             self._nsamples = constraintargs[count.next()]
         else:
             self._nsamples = None
+        if indexnum & (1 << Mutinf.TOLERANCE):
+            self._tolerance = constraintargs[count.next()]
+        else:
+            self._tolerance = None
 
         # Parse the argument values that we need to parse.
         target_vars = json.loads(self._target_vars)
@@ -202,10 +215,17 @@ class MutinfCursor(object):
         #
         # XXX fsaad@20170624: Setting modelnos = None arbitrarily, figure out
         # how to set the modelnos argument.
-        mis = bqlfn._bql_column_mutual_information(
-            self._bdb, self._population_id, self._generator_id, None,
-            target_vars, reference_vars, self._nsamples,
-            *_flatten2(sorted(conditions.iteritems())))
+        constraint_args = _flatten2(sorted(conditions.iteritems()))
+        if self._tolerance is None:
+            mis = bqlfn._bql_column_mutual_information(
+                self._bdb, self._population_id, self._generator_id, None,
+                target_vars, reference_vars, self._nsamples,
+                *constraint_args)
+        else:
+            mis, _stderr = bqlfn._bql_column_mutual_information_adaptive(
+                self._bdb, self._population_id, self._generator_id, None,
+                self._target_vars, self._reference_vars, self._nsamples,
+                self._tolerance, *constraint_args)
         self._mi = _flatten2(mis)
 
 
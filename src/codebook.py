@@ -41,6 +41,9 @@ def bayesdb_load_codebook_csv_file(bdb, table, pathname):
             codebook.append(row)
             line += 1
     with bdb.savepoint():
+        # Map each column number to its entry, the last one for the
+        # column if the codebook names it more than once.
+        entries = {}
         for column_name, shortname, description, value_map_json in codebook:
             if not core.bayesdb_table_has_column(bdb, table, column_name):
                 raise IOError('Column does not exist in table %s: %s' %
@@ -54,29 +57,37 @@ def bayesdb_load_codebook_csv_file(bdb, table, pathname):
                 else:
                     raise IOError('Invalid value map for column %r: %r' %
                                   (column_name, value_map_json))
-            sql = '''
-                DELETE FROM bayesdb_column_map
-                    WHERE tabname = ? AND colno = ?
-            '''
-            bdb.sql_execute(sql, (table, colno))
-            sql = '''
-                INSERT INTO bayesdb_column_map
-                    (tabname, colno, key, value)
-                    VALUES (?, ?, ?, ?)
-            '''
+            entries[colno] = (shortname, description, value_map)
+        colnos = sorted(entries.keys())
+        sql = '''
+            DELETE FROM bayesdb_column_map
+                WHERE tabname = ? AND colno = ?
+        '''
+        bdb.sql_execute_many(sql, [(table, colno) for colno in colnos])
+        sql = '''
+            INSERT INTO bayesdb_column_map
+                (tabname, colno, key, value)
+                VALUES (?, ?, ?, ?)
+        '''
+        rows = []
+        for colno in colnos:
+            _shortname, _description, value_map = entries[colno]
             for key in sorted(value_map.keys()):
-                value = value_map[key]
-                bdb.sql_execute(sql, (table, colno, key, value))
-            sql = '''
-                UPDATE bayesdb_column
-                    SET shortname = :shortname, description = :description
-                    WHERE tabname = :table AND colno = :colno
-            '''
-            total_changes = bdb._sqlite3.totalchanges()
-            bdb.sql_execute(sql, {
-                'shortname': shortname,
-                'description': description,
+                rows.append((table, colno, key, value_map[key]))
+        bdb.sql_execute_many(sql, rows)
+        sql = '''
+            UPDATE bayesdb_column
+                SET shortname = :shortname, description = :description
+                WHERE tabname = :table AND colno = :colno
+        '''
+        total_changes = bdb._sqlite3.totalchanges()
+        bdb.sql_execute_many(sql, [
+            {
+                'shortname': entries[colno][0],
+                'description': entries[colno][1],
                 'table': table,
                 'colno': colno,
-            })
-            assert bdb._sqlite3.totalchanges() - total_changes == 1
+            }
+            for colno in colnos
+        ])
+        assert bdb._sqlite3.totalchanges() - total_changes == len(colnos)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2017, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Catalog of per-column statistics of tables.
+
+Creating a generator needs simple facts about each column -- its
+distinct values, or the count, sum, and sum of squares of its values
+-- which used to take a scan of the table per column.  The catalog
+computes them for every column of a table in one scan, on first use
+or by :func:`bayesdb_column_stats_refresh`, and keeps them in the
+``bayesdb_column_stats`` and ``bayesdb_column_stats_value`` tables.
+
+Triggers on the table forget its statistics on any ``INSERT``,
+``UPDATE``, or ``DELETE``, from any connection, so the catalog never
+answers for data that have changed.  Only the first changed row does
+any work, but every row fires the triggers, so bulk loaders such as
+:func:`~bayeslite.bayesdb_read_csv` drop them first with
+:func:`bayesdb_column_stats_forget`.  Without the catalog -- in a
+read-only database or one whose schema has not been upgraded -- the
+functions here return ``None`` and callers scan the table as before.
+"""
+
+from collections import namedtuple
+
+import bayeslite.core as core
+
+from bayeslite.schema import bayesdb_schema_version
+from bayeslite.sqlite3_util import sqlite3_quote_name
+from bayeslite.util import casefold
+from bayeslite.util import cursor_value
+
+# Schema version that introduced the catalog.
+_CATALOG_VERSION = 11
+
+# Distinct values per column beyond which they are not recorded.
+_DISTINCT_LIMIT = 10000
+
+ColumnStats = namedtuple('ColumnStats', [
+    'count',                    # number of non-null values
+    'nulls',                    # number of nulls
+    'ndistinct',                # number of distinct values, or None
+    'min',                      # least numeric value, or None
+    'max',                      # greatest numeric value, or None
+    'sum',                      # sum of numeric values
+    'sumsq',                    # sum of squares of numeric values
+])
+
+_TRIGGER_EVENTS = ('insert', 'update', 'delete')
+
+def bayesdb_column_stats(bdb, table, colno, compute=True):
+    """Return :class:`ColumnStats` for column `colno` of `table`.
+
+    Computes the statistics of every column of `table` in one scan if
+    they are not in the catalog, or returns ``None`` if `compute` is
+    false.  Returns ``None`` if `bdb` has no catalog.
+    """
+    if not _catalog_p(bdb):
+        return None
+    with bdb.savepoint():
+        if not _main_table_p(bdb, table):
+            if not core.bayesdb_has_table(bdb, table):
+                raise ValueError('No such table: %r' % (table,))
+            # Triggers in the main schema cannot watch a temporary table.
+            return None
+        if not _fresh_p(bdb, table):
+            if not compute:
+                return None
+            bayesdb_column_stats_refresh(bdb, table)
+        cursor = bdb.sql_execute('''
+            SELECT count, nulls, ndistinct, min, max, sum, sumsq
+                FROM bayesdb_column_stats
+                WHERE tabname = ? AND colno = ?
+        ''', (table, colno))
+        row = cursor.fetchone()
+    if row is None:
+        raise ValueError('No such column in table %r: %d' % (table, colno))
+    return ColumnStats(*row)
+
+def bayesdb_column_distinct_values(bdb, table, colno):
+    """Return the distinct non-null values of column `colno` of `table`.
+
+    The values are in order of first appearance in the table, as by
+    ``SELECT DISTINCT``.  Returns ``None`` if `bdb` has no catalog or
+    the column has too many distinct values to record.
+    """
+    stats = bayesdb_column_stats(bdb, table, colno)
+    if stats is None or stats.ndistinct is None:
+        return None
+    cursor = bdb.sql_execute('''
+        SELECT value FROM bayesdb_column_stats_value
+            WHERE tabname = ? AND colno = ?
+            ORDER BY rank ASC
+    ''', (table, colno))
+    # The catalog distinguishes 1 from 1.0, which DISTINCT does not.
+    values = []
+    seen = set()
+    for (value,) in cursor:
+        if value not in seen:
+            seen.add(value)
+            values.append(value)
+    return values
+
+def bayesdb_column_stats_refresh(bdb, table):
+    """Compute and record statistics of every column of `table`.
+
+    Does nothing if `bdb` has no catalog or `table` is temporary.
+    """
+    if not _catalog_p(bdb) or not _main_table_p(bdb, table):
+        return
+    qt = sqlite3_quote_name(table)
+    with bdb.savepoint():
+        bayesdb_column_stats_forget(bdb, table)
+        ncols = _table_ncols(bdb, table)
+        cursor = bdb.sql_execute('SELECT * FROM %s' % (qt,))
+        counts = [0] * ncols
+        nulls = [0] * ncols
+        mins = [None] * ncols
+        maxes = [None] * ncols
+        sums = [0] * ncols
+        sumsqs = [0] * ncols
+        # Map each column's (is-float, value) keys, which keep 1 and
+        # 1.0 apart as CAST(... AS TEXT) does, to [rank, count].
+        distincts = [{} for _ in xrange(ncols)]
+        for row in cursor:
+            for colno, value in enumerate(row):
+                if value is None:
+                    nulls[colno] += 1
+                    continue
+                counts[colno] += 1
+                if isinstance(value, (int, long, float)):
+                    if mins[colno] is None or value < mins[colno]:
+                        mins[colno] = value
+                    if maxes[colno] is None or maxes[colno] < value:
+                        maxes[colno] = value
+                    sums[colno] += value
+                    sumsqs[colno] += value * value
+                distinct = distincts[colno]
+                if distinct is None:
+                    continue
+                key = (isinstance(value, float), value)
+                entry = distinct.get(key)
+                if entry is not None:
+                    entry[1] += 1
+                elif len(distinct) < _DISTINCT_LIMIT:
+                    distinct[key] = [len(distinct), 1]
+                else:
+                    distincts[colno] = None
+        for colno in xrange(ncols):
+            distinct = distincts[colno]
+            ndistinct = None
+            if distinct is not None:
+                ndistinct = len(set(value for _, value in distinct))
+            bdb.sql_execute('''
+                INSERT INTO bayesdb_column_stats
+                    (tabname, colno, count, nulls, ndistinct, min, max,
+                        sum, sumsq)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (table, colno, counts[colno], nulls[colno], ndistinct,
+                mins[colno], maxes[colno], float(sums[colno]),
+                float(sumsqs[colno])))
+            if distinct is None:
+                continue
+            bdb.sql_execute_many('''
+                INSERT INTO bayesdb_column_stats_value
+                    (tabname, colno, rank, value, count)
+                    VALUES (?, ?, ?, ?, ?)
+            ''', ((table, colno, rank, value, count)
+                for (_, value), (rank, count) in distinct.iteritems()))
+        literal = "'%s'" % (table.replace("'", "''"),)
+        # Once the first changed row has made the triggers forget the
+        # statistics, every other row costs only one index probe.
+        for event in _TRIGGER_EVENTS:
+            bdb.sql_execute('''
+                CREATE TRIGGER %s AFTER %s ON %s
+                WHEN EXISTS (
+                    SELECT 1 FROM bayesdb_column_stats WHERE tabname = %s
+                )
+                BEGIN
+                    DELETE FROM bayesdb_column_stats_value
+                        WHERE tabname = %s;
+                    DELETE FROM bayesdb_column_stats WHERE tabname = %s;
+                END
+            ''' % (sqlite3_quote_name(_trigger_name(table, event)),
+                event.upper(), qt, literal, literal, literal))
+
+def bayesdb_column_stats_forget(bdb, table):
+    """Forget any statistics of `table`, and stop tracking its changes."""
+    if not _catalog_p(bdb):
+        return
+    with bdb.savepoint():
+        bdb.sql_execute('''
+            DELETE FROM bayesdb_column_stats_value WHERE tabname = ?
+        ''', (table,))
+        bdb.sql_execute('''
+            DELETE FROM bayesdb_column_stats WHERE tabname = ?
+        ''', (table,))
+        for event in _TRIGGER_EVENTS:
+            bdb.sql_execute('DROP TRIGGER IF EXISTS %s' %
+                (sqlite3_quote_name(_trigger_name(table, event)),))
+
+def _catalog_p(bdb):
+    return not bdb.readonly and \
+        _CATALOG_VERSION <= bayesdb_schema_version(bdb)
+
+def _main_table_p(bdb, table):
+    cursor = bdb.sql_execute('''
+        SELECT COUNT(*) FROM main.sqlite_master
+            WHERE type = 'table' AND name = ? COLLATE NOCASE
+    ''', (table,))
+    return cursor_value(cursor) != 0
+
+def _fresh_p(bdb, table):
+    # Statistics hold only while all the triggers that forget them are
+    # on the table: a table dropped and created afresh has none.
+    cursor = bdb.sql_execute('''
+        SELECT COUNT(*) FROM sqlite_master
+            WHERE type = 'trigger' AND name IN (%s)
+                AND tbl_name = ? COLLATE NOCASE
+    ''' % (','.join('?' for _ in _TRIGGER_EVENTS),),
+        [_trigger_name(table, event) for event in _TRIGGER_EVENTS] +
+        [table])
+    if cursor_value(cursor) != len(_TRIGGER_EVENTS):
+        return False
+    # A column added since has no statistics either.
+    cursor = bdb.sql_execute('''
+        SELECT COUNT(*) FROM bayesdb_column_stats WHERE tabname = ?
+    ''', (table,))
+    return cursor_value(cursor) == _table_ncols(bdb, table)
+
+def _table_ncols(bdb, table):
+    cursor = bdb.sql_execute(
+        'PRAGMA table_info(%s)' % (sqlite3_quote_name(table),))
+    return len(cursor.fetchall())
+
+def _trigger_name(table, event):
+    return 'bayesdb_column_stats_%s_%s' % (event, casefold(table))
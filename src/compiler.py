@@ -30,7 +30,11 @@ To compile a parsed BQL query:
 
 import StringIO
 import contextlib
+import itertools
 import json
+import numpy
+
+from collections import namedtuple
 
 import bayeslite.ast as ast
 import bayeslite.bqlfn as bqlfn
@@ -64,22 +68,43 @@ class Output(object):
         self._select = []               # map of output index -> input index
         self._winders = []              # list of pre-query (sql, bindings)
         self._unwinders = []            # list of post-query (sql, bindings)
+        self._evaluated = False         # true if subqueries were evaluated
+        self._mutinf_stderrs = []       # MI estimates with standard errors
 
     def subquery(self):
-        """Return an output accumulator for a subquery."""
-        return Output(self._n_numpar, self._nampar_map, self._bindings)
+        """Return an output accumulator for a subquery.
+
+        The subquery is evaluated in compiling the query, so the
+        output holds only for the bindings it was compiled with.
+        """
+        self._evaluated = True
+        subout = Output(self._n_numpar, self._nampar_map, self._bindings)
+        subout._mutinf_stderrs = self._mutinf_stderrs
+        return subout
+
+    def reusable(self):
+        """True if the output holds for any bindings, not just its own.
+
+        Use :meth:`getbindings` to select other bindings for it.
+        """
+        return not (self._evaluated or self._winders or self._unwinders)
 
     def getvalue(self):
         """Return the accumulated output."""
         return self._stringio.getvalue()
 
-    def getbindings(self):
+    def getbindings(self, bindings=None):
         """Return a selection of bindings fit for the accumulated output.
 
         If there were subqueries, or if this is accumulating output
         for a subquery, this may not use all bindings.
+
+        If `bindings` is given, select from it instead of from the
+        bindings the output was compiled with.
         """
-        if isinstance(self._bindings, dict):
+        if bindings is None:
+            bindings = self._bindings
+        if isinstance(bindings, dict):
             # User supplied named bindings.
             # - Grow a set of parameters we don't expect (unknown).
             # - Shrink a set of parameters we do expect (missing).
@@ -93,7 +118,7 @@ class Output(object):
             # to find its user-supplied input position, and (c) use
             # renumber to find its output position for passage to
             # sqlite3.
-            for name in self._bindings:
+            for name in bindings:
                 name_folded = casefold(name)
                 if name_folded not in self._nampar_map:
                     unknown.add(name)
@@ -103,7 +128,7 @@ class Output(object):
                 m = self._renumber[n]
                 j = m - 1
                 assert bindings_list[j] is None
-                bindings_list[j] = self._bindings[name]
+                bindings_list[j] = bindings[name]
 
             # Make sure we saw all parameters we expected and none we
             # didn't expect.
@@ -115,9 +140,9 @@ class Output(object):
             # If the query contained any numbered parameters, which
             # will manifest as higher values of n_numpar without more
             # entries in nampar_map, we can't execute the query.
-            if len(self._bindings) < self._n_numpar:
+            if len(bindings) < self._n_numpar:
                 missing_numbers = set(range(1, self._n_numpar + 1))
-                for name in self._bindings:
+                for name in bindings:
                     missing_numbers.remove(self._nampar_map[casefold(name)])
                 raise ValueError('Missing parameter numbers: %s' %
                     (missing_numbers,))
@@ -125,23 +150,23 @@ class Output(object):
             # All set.
             return bindings_list
 
-        elif isinstance(self._bindings, tuple) or \
-             isinstance(self._bindings, list):
+        elif isinstance(bindings, tuple) or \
+             isinstance(bindings, list):
             # User supplied numbered bindings.  Make sure there aren't
             # too few or too many, and then select a list of the ones
             # we want.
-            if len(self._bindings) < self._n_numpar:
+            if len(bindings) < self._n_numpar:
                 raise ValueError('Too few parameter bindings: %d < %d' %
-                    (len(self._bindings), self._n_numpar))
-            if len(self._bindings) > self._n_numpar:
+                    (len(bindings), self._n_numpar))
+            if len(bindings) > self._n_numpar:
                 raise ValueError('Too many parameter bindings: %d > %d' %
-                    (len(self._bindings), self._n_numpar))
+                    (len(bindings), self._n_numpar))
             assert len(self._select) <= self._n_numpar
-            return [self._bindings[j] for j in self._select]
+            return [bindings[j] for j in self._select]
 
         else:
             # User supplied bindings we didn't understand.
-            raise TypeError('Invalid query bindings: %s' % (self._bindings,))
+            raise TypeError('Invalid query bindings: %s' % (bindings,))
 
     def getwindings(self):
         return self._winders, self._unwinders
@@ -195,13 +220,15 @@ def bayesdb_wind(bdb, winders, unwinders):
     """
     if 0 < len(winders) or 0 < len(unwinders):
         with bdb.savepoint():
-            for (sql, bindings) in winders:
-                bdb.sql_execute(sql, bindings)
+            with bdb._profile('wind'):
+                for (sql, bindings) in winders:
+                    bdb.sql_execute(sql, bindings)
             try:
                 yield
             finally:
-                for (sql, bindings) in reversed(unwinders):
-                    bdb.sql_execute(sql, bindings)
+                with bdb._profile('unwind'):
+                    for (sql, bindings) in reversed(unwinders):
+                        bdb.sql_execute(sql, bindings)
     else:
         yield
 
@@ -212,9 +239,94 @@ def compile_query(bdb, query, out):
     :param query: abstract syntax tree of a query
     :param Output out: output accumulator
     """
+    out._mutinf_stderrs = _mutinf_stderrs(query)
     _compile_query(bdb, query, BQLCompiler_None(), out)
 
+def _mutinf_stderrs(phrase):
+    # Mutual information estimates whose standard errors `phrase` asks
+    # for, so that the estimates, if it asks for them too, can share
+    # the samples the standard errors come from.
+    if isinstance(phrase, ast.ExpBQLMutInf) and phrase.stderr:
+        return [phrase._replace(stderr=False)]
+    if isinstance(phrase, (tuple, list)):
+        return [mutinf for child in phrase for mutinf in _mutinf_stderrs(child)]
+    return []
+
+def resolve_modelnos(bdb, population, generator, modelnos):
+    """Resolve a query's model subset to a list of model numbers.
+
+    `modelnos` is a list of model numbers, which is returned as is,
+    an :class:`~bayeslite.ast.ModelSubset`, or ``None`` for the
+    default set by :meth:`~bayeslite.BayesDB.set_default_models`, if
+    any.  Returns ``None`` to mean all models.
+    """
+    if modelnos is not None and not isinstance(modelnos, ast.ModelSubset):
+        return modelnos
+    if modelnos is None and not bdb._default_models:
+        return None
+    if not core.bayesdb_has_population(bdb, population):
+        raise BQLError(bdb, 'No such population: %s' % (population,))
+    population_id = core.bayesdb_get_population(bdb, population)
+    if generator is not None:
+        if not core.bayesdb_has_generator(bdb, population_id, generator):
+            raise BQLError(bdb, 'No such generator: %s' % (generator,))
+        generator_id = core.bayesdb_get_generator(
+            bdb, population_id, generator)
+    else:
+        generator_ids = core.bayesdb_population_generators(
+            bdb, population_id)
+        if len(generator_ids) != 1:
+            if modelnos is None:
+                return None
+            raise BQLError(bdb, 'Population %s has %d generators,'
+                ' specify one with MODELED BY to choose models' %
+                (population, len(generator_ids)))
+        generator_id, = generator_ids
+    subset = modelnos
+    if subset is None:
+        subset = bdb._default_models.get(generator_id)
+        if subset is None:
+            return None
+    return _model_subset(bdb, generator_id, subset)
+
+def _model_subset(bdb, generator_id, subset):
+    if subset.k <= 0:
+        raise BQLError(bdb, 'Number of models must be positive: %d' %
+            (subset.k,))
+    cursor = bdb.sql_execute('''
+        SELECT modelno FROM bayesdb_generator_model
+            WHERE generator_id = ?
+            ORDER BY modelno ASC
+    ''', (generator_id,))
+    modelnos = [modelno for (modelno,) in cursor]
+    if len(modelnos) <= subset.k:
+        return None
+    if subset.method == ast.MODELSUBSET_TOP:
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        try:
+            logscores = metamodel.model_logscores(bdb, generator_id)
+        except NotImplementedError:
+            raise BQLError(bdb, 'Metamodel %s cannot rank models by logscore'
+                % (metamodel.name(),))
+        ranked = sorted(modelnos,
+            key=lambda modelno: (-logscores.get(modelno, float('-inf')),
+                modelno))
+        return sorted(ranked[:subset.k])
+    elif subset.method == ast.MODELSUBSET_RANDOM:
+        # Partial Fisher-Yates shuffle of the first k model numbers.
+        uniform = bdb.substream(generator_id).weakrandom_uniform
+        for i in xrange(subset.k):
+            j = i + uniform(len(modelnos) - i)
+            modelnos[i], modelnos[j] = modelnos[j], modelnos[i]
+        return sorted(modelnos[:subset.k])
+    else:
+        assert False, 'Invalid model subset: %r' % (subset,)
+
 def _compile_query(bdb, query, bql_compiler, out):
+    if 'modelnos' in query._fields:
+        query = query._replace(modelnos=resolve_modelnos(
+            bdb, query.population, query.generator, query.modelnos))
+
     if isinstance(query, ast.SimulateModelsExp):
         # First expand any subquery columns.
         if any(isinstance(selcol, ast.SelColSub) for selcol in query.columns):
@@ -408,7 +520,8 @@ def compile_infer_explicit(bdb, infer, named, out):
                 first = False
             else:
                 out.write(', ')
-            compile_expression(bdb, order.expression, bql_compiler, out)
+            compile_order_expression(bdb, order.expression, columns, 0,
+                bql_compiler, out)
             if order.sense == ast.ORD_ASC:
                 pass
             elif order.sense == ast.ORD_DESC:
@@ -460,11 +573,6 @@ def compile_infer_auto(bdb, infer, out):
 
 def compile_estimate(bdb, estimate, out):
     assert isinstance(estimate, ast.Estimate)
-    out.write('SELECT')
-    if estimate.quantifier == ast.SELQUANT_DISTINCT:
-        out.write(' DISTINCT')
-    else:
-        assert estimate.quantifier == ast.SELQUANT_ALL
     if not core.bayesdb_has_population(bdb, estimate.population):
         raise BQLError(bdb, 'No such population: %s' % (estimate.population,))
     population_id = core.bayesdb_get_population(bdb, estimate.population)
@@ -481,13 +589,25 @@ def compile_estimate(bdb, estimate, out):
     named = True
     columns = expand_select_columns(
         bdb, estimate.columns, named, bql_compiler, out)
+    sample = None
+    if estimate.sample is not None:
+        sample = _estimate_sample(bdb, population_id, estimate.sample, out)
+        if any(isinstance(selcol, ast.SelColExp) and
+                _contains_aggregate(selcol.expression)
+                for selcol in columns):
+            compile_estimate_sample_aggregates(bdb, estimate, columns,
+                population_id, sample, bql_compiler, out)
+            return
+    out.write('SELECT')
+    if estimate.quantifier == ast.SELQUANT_DISTINCT:
+        out.write(' DISTINCT')
+    else:
+        assert estimate.quantifier == ast.SELQUANT_ALL
     compile_select_columns(bdb, columns, named, bql_compiler, out)
     table_name = core.bayesdb_population_table(bdb, population_id)
     qt = sqlite3_quote_name(table_name)
     out.write(' FROM %s' % (qt,))
-    if estimate.condition is not None:
-        out.write(' WHERE ')
-        compile_expression(bdb, estimate.condition, bql_compiler, out)
+    compile_sample_where(bdb, sample, estimate.condition, bql_compiler, out)
     if estimate.grouping is not None:
         assert 0 < len(estimate.grouping.keys)
         first = True
@@ -511,7 +631,8 @@ def compile_estimate(bdb, estimate, out):
                 first = False
             else:
                 out.write(', ')
-            compile_expression(bdb, order.expression, bql_compiler, out)
+            compile_order_expression(bdb, order.expression, columns, 0,
+                bql_compiler, out)
             if order.sense == ast.ORD_ASC:
                 pass
             elif order.sense == ast.ORD_DESC:
@@ -525,6 +646,196 @@ def compile_estimate(bdb, estimate, out):
             out.write(' OFFSET ')
             compile_expression(bdb, estimate.limit.offset, bql_compiler, out)
 
+# Row sample of an ESTIMATE: `nsample` of the table's `npopulation`
+# rows, whose rowids are those of sample `sample_id` in the temporary
+# table bayesdb_sample, or all of them if `sample_id` is None.
+_EstimateSample = namedtuple('_EstimateSample', [
+    'nsample',
+    'npopulation',
+    'sample_id',
+])
+
+# Samples share one temporary table, which is never dropped: dropping
+# a table fails while any other statement is still active, which would
+# leave it behind, but deleting a sample's rows does not.
+_SAMPLE_TABLE = 'bayesdb_sample'
+_SAMPLE_IDS = itertools.count(1)
+
+# Rowids per INSERT into a sample's temporary table, within SQLite's
+# limit on host parameters.
+_SAMPLE_INSERT_CHUNK = 500
+
+# Aggregates whose population values can be estimated from a uniform
+# row sample, with a standard error.
+_SAMPLE_AGGREGATES = ('avg', 'count', 'sum', 'total')
+
+_SQL_AGGREGATES = (
+    'avg', 'count', 'group_concat', 'max', 'min', 'sum', 'total',
+)
+
+# Aggregates that are scalar functions when given more than one operand.
+_SQL_AGGREGATES_1 = ('max', 'min')
+
+def estimate_sample_size(bdb, sample, npopulation):
+    """Return the number of rows `sample` draws from `npopulation`."""
+    if sample.unit == ast.SAMPLE_ROWS:
+        return min(sample.size, npopulation)
+    elif sample.unit == ast.SAMPLE_PERCENT:
+        if not (0 <= sample.size <= 100):
+            raise BQLError(bdb, 'Invalid sample percentage: %r' %
+                (sample.size,))
+        return int(round(npopulation * sample.size / 100.))
+    else:
+        assert False, 'Invalid sample unit: %r' % (sample.unit,)
+
+def _estimate_sample(bdb, population_id, sample, out):
+    table_name = core.bayesdb_population_table(bdb, population_id)
+    qt = sqlite3_quote_name(table_name)
+    cursor = bdb.sql_execute('''
+        SELECT COUNT(*), MIN(_rowid_), MAX(_rowid_) FROM %s
+    ''' % (qt,))
+    npopulation, lo, hi = cursor.next()
+    nsample = estimate_sample_size(bdb, sample, npopulation)
+    if nsample == npopulation:
+        return _EstimateSample(nsample, npopulation, None)
+    # Draw without replacement from the query's substream.  Rowids
+    # of a table with no gaps need not be read.
+    prng = bdb.substream_np_prng()
+    if hi - lo + 1 == npopulation:
+        rowids = lo + prng.choice(npopulation, nsample, replace=False)
+    else:
+        cursor = bdb.sql_execute('SELECT _rowid_ FROM %s' % (qt,))
+        rowids = prng.choice(
+            numpy.fromiter((rowid for (rowid,) in cursor), dtype=numpy.int64,
+                count=npopulation),
+            nsample, replace=False)
+    rowids = rowids.tolist()
+    sample_id = next(_SAMPLE_IDS)
+    qst = sqlite3_quote_name(_SAMPLE_TABLE)
+    out.winder('''
+        CREATE TEMP TABLE IF NOT EXISTS %s (
+            sample_id INTEGER NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY(sample_id, row_id)
+        ) WITHOUT ROWID
+    ''' % (qst,), ())
+    for i in xrange(0, nsample, _SAMPLE_INSERT_CHUNK):
+        chunk = rowids[i:i + _SAMPLE_INSERT_CHUNK]
+        out.winder('INSERT INTO temp.%s VALUES %s' %
+            (qst, ', '.join(['(%d, ?)' % (sample_id,)] * len(chunk))), chunk)
+    out.unwinder('DELETE FROM temp.%s WHERE sample_id = %d' %
+        (qst, sample_id), ())
+    return _EstimateSample(nsample, npopulation, sample_id)
+
+def _contains_aggregate(exp):
+    if isinstance(exp, ast.ExpAppStar):
+        return True
+    if isinstance(exp, ast.ExpApp) and \
+            casefold(exp.operator) in _SQL_AGGREGATES and \
+            not (casefold(exp.operator) in _SQL_AGGREGATES_1 and
+                len(exp.operands) != 1):
+        return True
+    if isinstance(exp, list) or \
+            (isinstance(exp, tuple) and not hasattr(exp, '_fields')):
+        return any(_contains_aggregate(e) for e in exp)
+    if isinstance(exp, tuple):
+        # Aggregates in subqueries apply to the subqueries' rows.
+        return any(_contains_aggregate(getattr(exp, field))
+            for field in exp._fields if field != 'query')
+    return False
+
+def compile_sample_where(bdb, sample, condition, bql_compiler, out):
+    if sample is not None and sample.sample_id is not None:
+        out.write(' WHERE _rowid_ IN'
+            ' (SELECT row_id FROM temp.%s WHERE sample_id = %d)' %
+            (sqlite3_quote_name(_SAMPLE_TABLE), sample.sample_id))
+        if condition is not None:
+            out.write(' AND (')
+            compile_expression(bdb, condition, bql_compiler, out)
+            out.write(')')
+    elif condition is not None:
+        out.write(' WHERE ')
+        compile_expression(bdb, condition, bql_compiler, out)
+
+def compile_estimate_sample_aggregates(bdb, estimate, columns, population_id,
+        sample, bql_compiler, out):
+    # Estimate each aggregate over the population, with its standard
+    # error, from the aggregates over the sample, evaluating each
+    # operand once per sampled row in a subquery.
+    if estimate.grouping is not None or estimate.order is not None:
+        raise BQLError(bdb, 'SAMPLE does not support GROUP BY or ORDER BY'
+            ' with aggregates')
+    aggregates = []
+    for selcol in columns:
+        if isinstance(selcol, ast.SelColExp):
+            exp = selcol.expression
+            if isinstance(exp, ast.ExpAppStar) and \
+                    casefold(exp.operator) == 'count':
+                aggregates.append(('count', None, selcol.name))
+                continue
+            if isinstance(exp, ast.ExpApp) and not exp.distinct and \
+                    casefold(exp.operator) in _SAMPLE_AGGREGATES and \
+                    len(exp.operands) == 1:
+                aggregates.append(
+                    (casefold(exp.operator), exp.operands[0], selcol.name))
+                continue
+        raise BQLError(bdb, 'SAMPLE with aggregates supports only'
+            ' AVG, COUNT, SUM, and TOTAL of whole columns')
+    nsample = sample.nsample
+    npopulation = sample.npopulation
+    # An empty sample counts and totals nothing.
+    scale = repr(float(npopulation) / nsample) if 0 < nsample else '0.'
+    out.write('SELECT ')
+    for i, (kind, operand, name) in enumerate(aggregates):
+        if 0 < i:
+            out.write(', ')
+        v = '"_v%d"' % (i,)
+        if operand is None:
+            count, total, total2 = 'COUNT(*)', 'NULL', 'NULL'
+        else:
+            count = 'COUNT(%s)' % (v,)
+            total = 'TOTAL(%s)' % (v,)
+            total2 = 'TOTAL(%s * %s)' % (v, v)
+        if kind == 'avg':
+            out.write('AVG(%s)' % (v,))
+            estimator = 'mean'
+        elif kind == 'count':
+            out.write('(%s * %s)' % (count, scale))
+            # COUNT(x) totals the indicator of x's being non-null.
+            estimator = 'count'
+        else:
+            out.write('(%s(%s) * %s)' % (kind.upper(), v, scale))
+            estimator = 'total'
+        if name is None:
+            name = kind
+        out.write(' AS %s' % (sqlite3_quote_name(name),))
+        out.write(', bql_sample_stderr(\'%s\', %d, %d, %s, %s, %s)' %
+            (estimator, nsample, npopulation, count, total, total2))
+        out.write(' AS %s' % (sqlite3_quote_name(name + '_stderr'),))
+    out.write(' FROM (SELECT ')
+    first = True
+    for i, (_kind, operand, _name) in enumerate(aggregates):
+        if operand is None:
+            continue
+        if not first:
+            out.write(', ')
+        first = False
+        compile_expression(bdb, operand, bql_compiler, out)
+        out.write(' AS "_v%d"' % (i,))
+    if first:
+        out.write('1')
+    table_name = core.bayesdb_population_table(bdb, population_id)
+    qt = sqlite3_quote_name(table_name)
+    out.write(' FROM %s' % (qt,))
+    compile_sample_where(bdb, sample, estimate.condition, bql_compiler, out)
+    out.write(')')
+    if estimate.limit is not None:
+        out.write(' LIMIT ')
+        compile_expression(bdb, estimate.limit.limit, bql_compiler, out)
+        if estimate.limit.offset is not None:
+            out.write(' OFFSET ')
+            compile_expression(bdb, estimate.limit.offset, bql_compiler, out)
+
 def compile_estimate_by(bdb, estby, out):
     assert isinstance(estby, ast.EstBy)
     out.write('SELECT')
@@ -602,6 +913,24 @@ def compile_select_column(bdb, selcol, i, named, bql_compiler, out):
     else:
         assert False, 'Invalid select column: %s' % (repr(selcol),)
 
+def compile_order_expression(bdb, exp, columns, ncolumns0, bql_compiler,
+        out):
+    """Compile ORDER BY `exp`, reusing a result column if it is one.
+
+    sqlite3 would otherwise call a BQL function once for the result
+    column and again for the sort key.  `ncolumns0` is the number of
+    result columns that precede `columns`.
+    """
+    if ast.is_bql(exp):
+        for i, selcol in enumerate(columns):
+            if not isinstance(selcol, ast.SelColExp):
+                # Can't count the result columns past * or PREDICT.
+                break
+            if selcol.expression == exp:
+                out.write('%d' % (ncolumns0 + i + 1,))
+                return
+    compile_expression(bdb, exp, bql_compiler, out)
+
 @contextlib.contextmanager
 def subquery_columns(bdb, subquery, out):
     # XXX We need some kind of type checking to guarantee that
@@ -793,6 +1122,9 @@ def compile_simulate_models_1(
     assert isinstance(selcol, ast.SelColExp)
     assert isinstance(selcol.expression, ast.ExpBQLMutInf)
     exp = selcol.expression
+    if exp.stderr:
+        raise BQLError(bdb, 'Standard error of mutual information'
+            ' is not supported in SIMULATE.')
     def map_var(var):
         if not core.bayesdb_has_variable(
                 bdb, population_id, generator_id, var):
@@ -831,6 +1163,9 @@ def compile_simulate_models_1(
     if exp.nsamples is not None:
         out.write(' AND nsamples = ')
         compile_expression(bdb, exp.nsamples, bql_compiler, out)
+    if exp.tolerance is not None:
+        out.write(' AND tolerance = ')
+        compile_expression(bdb, exp.tolerance, bql_compiler, out)
 
 def compile_simulate_constraints(
         bdb, constraints, population_id, generator_id, out):
@@ -921,7 +1256,8 @@ def compile_estcols(bdb, estcols, out):
                 first = False
             else:
                 out.write(', ')
-            compile_expression(bdb, order.expression, bql_compiler, out)
+            compile_order_expression(bdb, order.expression,
+                estcols.columns, 0, bql_compiler, out)
             if order.sense == ast.ORD_ASC:
                 pass
             elif order.sense == ast.ORD_DESC:
@@ -956,6 +1292,7 @@ def compile_estpaircols(bdb, estpaircols, out):
     out.write('SELECT'
         ' %d AS population_id, v0.name AS name0, v1.name AS name1' %
         (population_id,))
+    paircols = [ast.SelColExp(exp, name) for exp, name in estpaircols.columns]
     if len(estpaircols.columns) == 1 and estpaircols.columns[0][1] is None:
         # XXX Compatibility with existing queries.
         expression = estpaircols.columns[0][0]
@@ -1005,7 +1342,8 @@ def compile_estpaircols(bdb, estpaircols, out):
                 first = False
             else:
                 out.write(', ')
-            compile_expression(bdb, order.expression, bql_compiler, out)
+            compile_order_expression(bdb, order.expression, paircols, 3,
+                bql_compiler, out)
             if order.sense == ast.ORD_ASC:
                 pass
             elif order.sense == ast.ORD_DESC:
@@ -1059,7 +1397,8 @@ def compile_estpairrow(bdb, estpairrow, out):
                 first = False
             else:
                 out.write(', ')
-            compile_expression(bdb, order.expression, bql_compiler, out)
+            compile_order_expression(bdb, order.expression, columns, 2,
+                bql_compiler, out)
             if order.sense == ast.ORD_ASC:
                 pass
             elif order.sense == ast.ORD_DESC:
@@ -1076,6 +1415,8 @@ def compile_estpairrow(bdb, estpairrow, out):
 class IBQLCompiler(object):
     def implicit_reference_var_colno_exp(self, bdb):
         raise NotImplementedError
+    def invariant_bql_p(self, bdb, bql):
+        raise NotImplementedError
     def compile_bql(self, bdb, bql, out):
         raise NotImplementedError
 
@@ -1084,6 +1425,10 @@ class BQLCompiler_None(IBQLCompiler):
     def implicit_reference_var_colno_exp(self, bdb):
         raise BQLError(bdb, 'No implicit BQL population variable')
 
+    @override(IBQLCompiler)
+    def invariant_bql_p(self, bdb, bql):
+        return False
+
     @override(IBQLCompiler)
     def compile_bql(self, bdb, bql, out):
         # XXX Report source location.
@@ -1102,6 +1447,11 @@ class BQLCompiler_Const(IBQLCompiler):
     def implicit_reference_var_colno_exp(self, bdb):
         raise BQLError(bdb, 'No implicit BQL population variable')
 
+    @override(IBQLCompiler)
+    def invariant_bql_p(self, bdb, bql):
+        # There is only one row anyway.
+        return False
+
     @override(IBQLCompiler)
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
@@ -1157,6 +1507,17 @@ class BQLCompiler_1Row(BQLCompiler_Const):
     def implicit_reference_var_colno_exp(self, bdb):
         raise BQLError(bdb, 'No implicit BQL population variable')
 
+    @override(IBQLCompiler)
+    def invariant_bql_p(self, bdb, bql):
+        # Functions of columns alone, which BQLCompiler_Const handles.
+        return isinstance(bql, (
+            ast.ExpBQLProbDensity,
+            ast.ExpBQLDepProb,
+            ast.ExpBQLMutInf,
+            ast.ExpBQLCorrel,
+            ast.ExpBQLCorrelPval,
+        )) and invariant_bql_arguments_p(bql)
+
     @override(IBQLCompiler)
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
@@ -1248,12 +1609,18 @@ class BQLCompiler_1Row(BQLCompiler_Const):
             if bql.ofcondition is not None:
                 raise BQLError(bdb, 'Similarity as 1-row function needs one '
                     'row not two rows.')
-            out.write('bql_row_similarity(%d, %s, %s' %
+            table_name = core.bayesdb_population_table(bdb, population_id)
+            qt = sqlite3_quote_name(table_name)
+            # If the target is the same at every row, compute the
+            # similarities of all rows to it at once.
+            if invariant_row_condition_p(table_name, bql.tocondition):
+                out.write('bql_row_similarity_batch')
+            else:
+                out.write('bql_row_similarity')
+            out.write('(%d, %s, %s' %
                 (population_id, nullor(generator_id), nullorq(modelnos)))
             out.write(', _rowid_, ')
             with compiling_paren(bdb, out, '(', ')'):
-                table_name = core.bayesdb_population_table(bdb, population_id)
-                qt = sqlite3_quote_name(table_name)
                 out.write('SELECT _rowid_ FROM %s WHERE ' % (qt,))
                 compile_expression(bdb, bql.tocondition, self, out)
             assert len(bql.column) == 1
@@ -1339,6 +1706,11 @@ class BQLCompiler_2Row(IBQLCompiler):
     def implicit_reference_var_colno_exp(self, bdb):
         raise BQLError(bdb, 'No implicit BQL population variable')
 
+    @override(IBQLCompiler)
+    def invariant_bql_p(self, bdb, bql):
+        return isinstance(bql, ast.ExpBQLProbDensity) and \
+            invariant_bql_arguments_p(bql)
+
     @override(IBQLCompiler)
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
@@ -1397,6 +1769,12 @@ class BQLCompiler_1Col(BQLCompiler_Const):
     def implicit_reference_var_colno_exp(self, bdb):
         return self.colno_exp
 
+    @override(IBQLCompiler)
+    def invariant_bql_p(self, bdb, bql):
+        # Everything else is a function of the implicit column.
+        return isinstance(bql, ast.ExpBQLProbDensity) and \
+            invariant_bql_arguments_p(bql)
+
     @override(IBQLCompiler)
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
@@ -1455,6 +1833,11 @@ class BQLCompiler_2Col(BQLCompiler_Const):
     def implicit_reference_var_colno_exp(self, bdb):
         raise BQLError(bdb, 'Nonunique implicit BQL population variable')
 
+    @override(IBQLCompiler)
+    def invariant_bql_p(self, bdb, bql):
+        return isinstance(bql, ast.ExpBQLProbDensity) and \
+            invariant_bql_arguments_p(bql)
+
     @override(IBQLCompiler)
     def compile_bql(self, bdb, bql, out):
         assert ast.is_bql(bql)
@@ -1527,8 +1910,8 @@ def compile_mutinf_2col_2(
         for c in bql.columns0]
     colnos1 = [core.bayesdb_variable_number(bdb, population_id, generator_id, c)
         for c in bql.columns1]
-    out.write('bql_column_mutual_information(%d, %s, %s, ' %
-        (population_id, nullor(generator_id), nullorq(modelnos)))
+    out.write('%s(%d, %s, %s, ' % (compile_mutinf_function(bql, out),
+        population_id, nullor(generator_id), nullorq(modelnos)))
     out.write('\'%s\', \'%s\'' %
         (json.dumps(colnos0), json.dumps(colnos1)))
     compile_mutinf_extra(
@@ -1544,8 +1927,8 @@ def compile_mutinf_2col_1(
         raise BQLError(bdb, 'Mutual information needs at most one column.')
     colnos0 = [core.bayesdb_variable_number(bdb, population_id, generator_id, c)
         for c in bql.columns0]
-    out.write('bql_column_mutual_information(%d, %s, %s, '
-        % (population_id, nullor(generator_id), nullorq(modelnos)))
+    out.write('%s(%d, %s, %s, ' % (compile_mutinf_function(bql, out),
+        population_id, nullor(generator_id), nullorq(modelnos)))
     out.write('\'%s\', %s'
         % (json.dumps(colnos0), sql_json_singleton(colno1_exp)))
     compile_mutinf_extra(
@@ -1559,14 +1942,29 @@ def compile_mutinf_2col_0(
         raise BQLError(bdb, 'Mutual information needs no columns.')
     if bql.columns1 is not None:
         raise BQLError(bdb, 'Mutual information needs no columns.')
-    out.write('bql_column_mutual_information(%d, %s, %s, '
-        % (population_id, nullor(generator_id), nullorq(modelnos)))
+    out.write('%s(%d, %s, %s, ' % (compile_mutinf_function(bql, out),
+        population_id, nullor(generator_id), nullorq(modelnos)))
     out.write('%s, %s'
         % (sql_json_singleton(colno0_exp), sql_json_singleton(colno1_exp)))
     compile_mutinf_extra(
         bdb, population_id, generator_id, bql, bql_compiler, out)
     out.write(')')
 
+def compile_mutinf_function(bql, out):
+    if bql.stderr:
+        return 'bql_column_mutual_information_stderr'
+    elif compile_mutinf_adaptive_p(bql, out):
+        return 'bql_column_mutual_information_adaptive'
+    else:
+        return 'bql_column_mutual_information'
+
+def compile_mutinf_adaptive_p(bql, out):
+    # An estimate whose standard error the query asks for must come
+    # from the same batches of samples, which the adaptive functions
+    # share within a query.
+    return bql.stderr or bql.tolerance is not None or \
+        bql in out._mutinf_stderrs
+
 def compile_mutinf_extra(
         bdb, population_id, generator_id, bql, bql_compiler, out):
     out.write(', ')
@@ -1574,6 +1972,12 @@ def compile_mutinf_extra(
         compile_expression(bdb, bql.nsamples, bql_compiler, out)
     else:
         out.write('NULL')
+    if compile_mutinf_adaptive_p(bql, out):
+        out.write(', ')
+        if bql.tolerance is not None:
+            compile_expression(bdb, bql.tolerance, bql_compiler, out)
+        else:
+            out.write('NULL')
     if bql.constraints:
         compile_constraints(
             bdb, population_id, generator_id, bql.constraints,
@@ -1880,7 +2284,85 @@ def compile_expression(bdb, exp, bql_compiler, out):
             out.write(' ')
     else:
         assert ast.is_bql(exp)
-        bql_compiler.compile_bql(bdb, exp, out)
+        if bql_compiler.invariant_bql_p(bdb, exp):
+            # Same value at every row or column: as an uncorrelated
+            # scalar subquery, sqlite3 evaluates it only once per
+            # query rather than once per row.
+            with compiling_paren(bdb, out, '(SELECT ', ')'):
+                bql_compiler.compile_bql(bdb, exp, out)
+        else:
+            bql_compiler.compile_bql(bdb, exp, out)
+
+def invariant_bql_arguments_p(bql):
+    """True if the arguments of `bql` do not vary with row or column.
+
+    Only literals, parameters, and operators on them qualify: column
+    references, subqueries, and functions such as RANDOM() may vary.
+    """
+    if isinstance(bql, ast.ExpBQLProbDensity):
+        return all(invariant_expression_p(exp)
+            for _col, exp in bql.targets + bql.constraints)
+    elif isinstance(bql, ast.ExpBQLMutInf):
+        return all(invariant_expression_p(exp)
+            for exp in [bql.nsamples, bql.tolerance] +
+                [exp for _col, exp in bql.constraints or []]
+            if exp is not None)
+    elif isinstance(bql, (
+            ast.ExpBQLDepProb, ast.ExpBQLCorrel, ast.ExpBQLCorrelPval)):
+        return True
+    else:
+        return False
+
+def invariant_expression_p(exp):
+    if isinstance(exp, (ast.ExpLit, ast.ExpNumpar, ast.ExpNampar)):
+        return True
+    elif isinstance(exp, ast.ExpOp):
+        return all(invariant_expression_p(e) for e in exp.operands)
+    elif isinstance(exp, (ast.ExpCast, ast.ExpCollate)):
+        return invariant_expression_p(exp.expression)
+    else:
+        return False
+
+# Built-in SQLite scalar functions whose value depends only on their
+# operands, so that they may appear in a condition fixed for a query.
+# Anything else -- random(), changes(), user-defined functions -- may
+# yield a different value each time it is called.
+_SQL_DETERMINISTIC = (
+    'abs', 'char', 'coalesce', 'glob', 'hex', 'ifnull', 'instr', 'length',
+    'like', 'lower', 'ltrim', 'max', 'min', 'nullif', 'printf', 'quote',
+    'replace', 'round', 'rtrim', 'substr', 'trim', 'typeof', 'unicode',
+    'upper',
+)
+
+def invariant_row_condition_p(table, exp):
+    """True if ``SELECT ... FROM <table> WHERE <exp>`` is uncorrelated.
+
+    That is, if in a query of `table` it selects the same rows at
+    every row.  Column references in `exp` name columns of the inner
+    `table`, unless qualified by another table; subqueries, BQL
+    functions, and functions not in `_SQL_DETERMINISTIC` may vary.
+    """
+    if isinstance(exp, (ast.ExpLit, ast.ExpNumpar, ast.ExpNampar)):
+        return True
+    elif isinstance(exp, ast.ExpCol):
+        return exp.table is None or casefold(exp.table) == casefold(table)
+    elif isinstance(exp, ast.ExpOp):
+        return all(invariant_row_condition_p(table, e) for e in exp.operands)
+    elif isinstance(exp, ast.ExpApp):
+        return casefold(exp.operator) in _SQL_DETERMINISTIC and \
+            all(invariant_row_condition_p(table, e) for e in exp.operands)
+    elif isinstance(exp, (ast.ExpCast, ast.ExpCollate)):
+        return invariant_row_condition_p(table, exp.expression)
+    elif isinstance(exp, ast.ExpInExp):
+        return all(invariant_row_condition_p(table, e)
+            for e in [exp.expression] + list(exp.expressions))
+    elif isinstance(exp, ast.ExpCase):
+        return all(invariant_row_condition_p(table, e)
+            for e in [exp.key, exp.otherwise] +
+                [e for when in exp.whens for e in when]
+            if e is not None)
+    else:
+        return False
 
 def compile_op(bdb, op, bql_compiler, out):
     fmt = operator_fmts[op.operator]
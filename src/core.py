@@ -417,7 +417,7 @@ def bayesdb_generator_metamodel(bdb, id):
             name = bayesdb_generator_name(bdb, id)
             raise ValueError('Metamodel of generator %s not registered: %s' %
                 (repr(name), repr(row[0])))
-        return bdb.metamodels[row[0]]
+        return bdb._profile_metamodel(bdb.metamodels[row[0]])
 
 def bayesdb_generator_table(bdb, id):
     """Return the name of the table of the generator with id `id`."""
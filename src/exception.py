@@ -30,6 +30,11 @@ class BayesDBException(BayesLiteException):
         self.bayesdb = bayesdb
         super(BayesDBException, self).__init__(*args, **kwargs)
 
+    def __reduce__(self):
+        # The BayesDB instance can't be pickled, e.g. to pass the
+        # exception back from a worker process, so leave it behind.
+        return (self.__class__, (None,) + self.args)
+
 class BQLError(BayesDBException):
     """Errors in interpreting or executing BQL on a particular database."""
     # XXX Consider separating the "no such foo" and "foo already exists" errors
@@ -39,6 +44,13 @@ class BQLError(BayesDBException):
     # use really means as an error: need to look more closely.
     pass
 
+class BQLTimeoutError(BQLError):
+    """A BQL query exceeded its deadline or was interrupted.
+
+    Any effects of the query are rolled back.
+    """
+    pass
+
 class BQLParseError(BayesLiteException):
     """Errors in parsing BQL.
 
@@ -52,6 +64,9 @@ class BQLParseError(BayesLiteException):
         assert 0 < len(errors)
         self.errors = errors
 
+    def __reduce__(self):
+        return (self.__class__, (self.errors,))
+
     def __str__(self):
         if len(self.errors) == 1:
             return self.errors[0]
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2017, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Explanations of what BQL queries will cost before they run.
+
+``EXPLAIN <query>`` compiles the query without running it and returns
+rows of the form ``(kind, detail, rows, generators, models, calls,
+samples)``:
+
+- ``('sql', <sql>, ...)``: the SQL the query compiles to;
+- ``('plan', <step>, ...)``: sqlite3's query plan for it, one row per
+  step;
+- ``('bqlfn', <name>, ...)``: one row per call of a BQL function in
+  the SQL, with the number of rows or pairs of columns it is
+  evaluated at, the number of generators and models each evaluation
+  consults, the number of model evaluations in all (`calls`), and the
+  number of Monte Carlo samples they draw in all, or ``NULL`` if they
+  draw none or the metamodel chooses how many;
+- ``('total', NULL, ...)``: the sums of `calls` and `samples`, or
+  ``NULL`` if a function that draws samples does not say how many.
+
+Row counts come from the column statistics catalog if it has them,
+without computing them, or else from ``COUNT(*)``.  They are upper
+bounds: they ignore ``WHERE`` and ``LIMIT``, and count calls in
+subqueries as if they were evaluated at every row of the query.
+Compiling ``SIMULATE`` runs the simulation, so it is not compiled:
+its explanation has only the ``bqlfn`` and ``total`` rows, and a
+query with ``SIMULATE`` in a subquery cannot be explained.
+"""
+
+import json
+import re
+
+import bayeslite.ast as ast
+import bayeslite.bqlfn as bqlfn
+import bayeslite.colstats as colstats
+import bayeslite.compiler as compiler
+import bayeslite.core as core
+
+from bayeslite.sqlite3_util import sqlite3_quote_name
+from bayeslite.util import casefold
+from bayeslite.util import cursor_value
+
+DESCRIPTION = [(name, None) for name in [
+    'kind', 'detail', 'rows', 'generators', 'models', 'calls', 'samples',
+]]
+
+# BQL functions that consult models, with the index of the argument
+# giving the number of samples each model draws, or None.
+_MODEL_FUNCTIONS = {
+    'bql_column_dependence_probability': None,
+    'bql_column_mutual_information': 5,
+    'bql_column_mutual_information_adaptive': 5,
+    'bql_column_mutual_information_stderr': 5,
+    'bql_column_value_probability': None,
+    'bql_pdf_joint': None,
+    'bql_predict': 6,
+    'bql_predict_confidence': 5,
+    'bql_row_column_predictive_probability': None,
+    'bql_row_predictive_relevance': None,
+    'bql_row_similarity': None,
+    'bql_row_similarity_batch': None,
+}
+
+# BQL functions that compute their values at all rows in one batch,
+# once per query.
+_BATCH_FUNCTIONS = ('bql_row_similarity_batch',)
+
+# BQL functions that consult one generator of the population, chosen
+# at random, unless the query names one.
+_RANDOM_GENERATOR_FUNCTIONS = ('bql_predict', 'bql_predict_confidence')
+
+# BQL functions of the data alone.
+_DATA_FUNCTIONS = ('bql_column_correlation', 'bql_column_correlation_pvalue')
+
+# A call of a BQL function, with `(SELECT ' before it if it may be the
+# whole of an uncorrelated scalar subquery, which is evaluated once.
+_CALL_RE = re.compile(r'(\(SELECT )?\b(bql_[a-z_]+)\(')
+
+def bayesdb_explain(bdb, query, out, bindings):
+    """Return rows explaining the BQL query `query`.
+
+    `out` is the compiler output for `query` with `bindings`, or
+    ``None`` for a ``SIMULATE`` query.
+    """
+    if isinstance(query, ast.Simulate):
+        return _explain_simulate(bdb, query, bindings)
+    sql = out.getvalue()
+    sql_bindings = out.getbindings()
+    rows = [('sql', sql.strip(), None, None, None, None, None)]
+    winders, unwinders = out.getwindings()
+    with bdb.savepoint():
+        with compiler.bayesdb_wind(bdb, winders, unwinders):
+            cursor = bdb.sql_execute('EXPLAIN QUERY PLAN %s' % (sql,),
+                sql_bindings)
+            for _selectid, _order, _from, detail in cursor:
+                rows.append(('plan', detail, None, None, None, None, None))
+    nevaluations = _query_evaluations(bdb, query)
+    for match in _CALL_RE.finditer(sql):
+        name = match.group(2)
+        if name not in _MODEL_FUNCTIONS and name not in _DATA_FUNCTIONS:
+            continue
+        args, end = _call_arguments(sql, match.end())
+        once = (match.group(1) is not None and sql[end:end + 1] == ')') or \
+            name in _BATCH_FUNCTIONS
+        if name in _MODEL_FUNCTIONS:
+            rows.append(_explain_call(bdb, name, args, sql_bindings,
+                1 if once else nevaluations))
+        else:
+            rows.append(('bqlfn', name, 1 if once else nevaluations,
+                None, None, None, None))
+    rows.append(_total(rows))
+    return rows
+
+def contains_simulate(phrase):
+    """True if the AST `phrase` has a ``SIMULATE`` query anywhere in it."""
+    if isinstance(phrase, ast.Simulate):
+        return True
+    if isinstance(phrase, (tuple, list)):
+        return any(contains_simulate(child) for child in phrase)
+    return False
+
+def _explain_call(bdb, name, args, bindings, nevaluations):
+    population_id = int(args[0])
+    generator_id = _argument_value(args[1], bindings)
+    modelnos = _argument_value(args[2], bindings)
+    if generator_id is None:
+        generator_ids = core.bayesdb_population_generators(bdb, population_id)
+    else:
+        generator_ids = [generator_id]
+    nmodels = [
+        len(json.loads(modelnos)) if modelnos is not None
+            else len(core.bayesdb_generator_modelnos(bdb, g))
+        for g in generator_ids
+    ]
+    if name in _RANDOM_GENERATOR_FUNCTIONS:
+        ngenerators = min(1, len(generator_ids))
+        models = max(nmodels) if nmodels else 0
+    else:
+        ngenerators = len(generator_ids)
+        models = sum(nmodels)
+    nsamples = None
+    if _MODEL_FUNCTIONS[name] is not None:
+        nsamples = _argument_value(args[_MODEL_FUNCTIONS[name]], bindings)
+        if nsamples is None and name != 'bql_column_mutual_information' \
+                and name.startswith('bql_column_mutual_information'):
+            # Same budget as the adaptive estimator's.
+            if _argument_value(args[6], bindings) is None:
+                nsamples = 2*bqlfn.MUTINF_BATCH_SAMPLES
+            else:
+                nsamples = bqlfn.MUTINF_MAX_SAMPLES
+    calls = None
+    samples = None
+    if nevaluations is not None:
+        calls = nevaluations * models
+        if nsamples is not None:
+            samples = calls * nsamples
+    return ('bqlfn', name, nevaluations, ngenerators, models, calls, samples)
+
+def _explain_simulate(bdb, simulate, bindings):
+    population_id = core.bayesdb_get_population(bdb, simulate.population)
+    if simulate.generator is None:
+        generator_ids = core.bayesdb_population_generators(bdb, population_id)
+    else:
+        generator_ids = [core.bayesdb_get_generator(
+            bdb, population_id, simulate.generator)]
+    nmodels = [len(core.bayesdb_generator_modelnos(bdb, g))
+        for g in generator_ids]
+    if isinstance(simulate.modelnos, ast.ModelSubset):
+        nmodels = [min(simulate.modelnos.k, n) for n in nmodels]
+    elif simulate.modelnos is not None:
+        nmodels = [len(simulate.modelnos) for _ in nmodels]
+    nsamples = None
+    if isinstance(simulate.nsamples, ast.ExpLit) and \
+            isinstance(simulate.nsamples.value, ast.LitInt):
+        nsamples = simulate.nsamples.value.value
+    elif isinstance(simulate.nsamples, ast.ExpNumpar) and \
+            isinstance(bindings, (tuple, list)):
+        nsamples = bindings[simulate.nsamples.number - 1]
+    # Each sample is drawn from one model.
+    rows = [('bqlfn', 'bayesdb_simulate', 1, len(generator_ids),
+        sum(nmodels), nsamples, nsamples)]
+    rows.append(_total(rows))
+    return rows
+
+def _total(rows):
+    calls = [row[5] for row in rows if row[0] == 'bqlfn' and row[3]]
+    samples = [row[6] for row in rows if row[0] == 'bqlfn' and row[3]
+        and (row[1] == 'bayesdb_simulate' or
+            _MODEL_FUNCTIONS.get(row[1]) is not None)]
+    return ('total', None, None, None, None,
+        None if None in calls else sum(calls),
+        None if None in samples else sum(samples))
+
+def _query_evaluations(bdb, query):
+    """Return the number of times `query` evaluates each BQL function.
+
+    That is the number of rows, columns, or pairs of them it ranges
+    over, or ``None`` if unknown.
+    """
+    if isinstance(query, (ast.EstBy, ast.SimulateModels,
+            ast.SimulateModelsExp)):
+        return 1
+    if not hasattr(query, 'population'):
+        return None
+    population_id = core.bayesdb_get_population(bdb, query.population)
+    if isinstance(query, ast.Estimate):
+        nrows = _table_rows(bdb, population_id)
+        if query.sample is None:
+            return nrows
+        return compiler.estimate_sample_size(bdb, query.sample, nrows)
+    elif isinstance(query, (ast.InferAuto, ast.InferExplicit)):
+        return _table_rows(bdb, population_id)
+    elif isinstance(query, ast.EstPairRow):
+        return _table_rows(bdb, population_id)**2
+    nvars = len(core.bayesdb_variable_numbers(bdb, population_id, None))
+    if isinstance(query, ast.EstCols):
+        return nvars
+    elif isinstance(query, ast.EstPairCols):
+        if query.subcolumns is not None and all(
+                isinstance(collist, ast.ColListLit)
+                for collist in query.subcolumns):
+            nvars = len(set(casefold(column)
+                for collist in query.subcolumns
+                for column in collist.columns))
+        return nvars**2
+    return None
+
+def _table_rows(bdb, population_id):
+    table = core.bayesdb_population_table(bdb, population_id)
+    # Counting is much cheaper than computing the statistics.
+    stats = colstats.bayesdb_column_stats(bdb, table, 0, compute=False)
+    if stats is not None:
+        return stats.count + stats.nulls
+    qt = sqlite3_quote_name(table)
+    return cursor_value(bdb.sql_execute('SELECT COUNT(*) FROM %s' % (qt,)))
+
+def _call_arguments(sql, start):
+    """Return the SQL text of the arguments of the call at `start`.
+
+    `start` is just past the opening parenthesis.  Returns the list of
+    arguments and the index just past the closing parenthesis.
+    """
+    args = []
+    depth = 0
+    quote = None
+    arg_start = start
+    for i in xrange(start, len(sql)):
+        c = sql[i]
+        if quote is not None:
+            # A doubled quote inside a quoted string reopens it.
+            if c == quote:
+                quote = None
+        elif c in '\'"':
+            quote = c
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            if depth == 0:
+                args.append(sql[arg_start:i].strip())
+                return args, i + 1
+            depth -= 1
+        elif c == ',' and depth == 0:
+            args.append(sql[arg_start:i].strip())
+            arg_start = i + 1
+    assert False, 'Unterminated call in compiled SQL: %r' % (sql[start:],)
+
+def _argument_value(arg, bindings):
+    """Return the value of the constant argument `arg`, or ``None``.
+
+    ``None`` also stands for an argument not constant in the query.
+    """
+    if re.match(r'^-?[0-9]+$', arg):
+        return int(arg)
+    if re.match(r'^\?[0-9]+$', arg):
+        return bindings[int(arg[1:]) - 1]
+    if arg.startswith('\'') and arg.endswith('\''):
+        return arg[1:-1].replace('\'\'', '\'')
+    return None
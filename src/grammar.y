@@ -239,6 +239,8 @@ command(regress)        ::= K_REGRESS column_name(target)
                                 modelledby_opt(metamodel)
                                 usingmodel_opt(modelnos).
 
+command(explain)        ::= K_EXPLAIN query(q).
+
 /*
  * Queries
  */
@@ -269,6 +271,7 @@ estimate(e)             ::= K_ESTIMATE select_quant(quant) select_columns(cols)
                                 from_est(tabs)
                                 modelledby_opt(generator)
                                 usingmodel_opt(modelnos)
+                                sample_opt(sample)
                                 where(cond)
                                 group_by(grouping)
                                 order_by(ord)
@@ -385,6 +388,15 @@ modelledby_opt(some)    ::= K_MODELED|K_MODELLED K_BY generator_name(gen).
  */
 usingmodel_opt(none)    ::= .
 usingmodel_opt(some)    ::= K_USING model_token modelset(modelnos).
+usingmodel_opt(top)     ::= K_USING K_TOP L_INTEGER(k) model_token
+                                K_BY K_LOGSCORE.
+usingmodel_opt(random)  ::= K_USING L_INTEGER(k) K_RANDOM model_token.
+
+sample_opt(none)        ::= .
+sample_opt(rows)        ::= K_SAMPLE L_INTEGER(n) K_ROWS.
+sample_opt(percent_int) ::= K_SAMPLE L_INTEGER(p) K_PERCENT.
+sample_opt(percent_float)
+                        ::= K_SAMPLE L_FLOAT(p) K_PERCENT.
 
 /* XXX Allow all kinds of joins.  */
 select_tables(one)      ::= select_table(t).
@@ -661,7 +673,15 @@ bqlfn(predrel_both)              ::= K_PREDICTIVE K_RELEVANCE
 bqlfn(depprob)          ::= K_DEPENDENCE K_PROBABILITY ofwith(cols).
 
 bqlfn(mutinf)           ::= K_MUTUAL K_INFORMATION ofwithmulti(cols)
-                                mi_given_opt(constraints) nsamples_opt(nsamp).
+                                mi_given_opt(constraints) nsamples_opt(nsamp)
+                                tolerance_opt(tol).
+/*
+ * STANDARD ERROR comes last so that STANDARD never starts an
+ * expression, and a column named `standard' still parses as one.
+ */
+bqlfn(mutinf_stderr)    ::= K_MUTUAL K_INFORMATION ofwithmulti(cols)
+                                mi_given_opt(constraints) nsamples_opt(nsamp)
+                                tolerance_opt(tol) K_STANDARD K_ERROR.
 bqlfn(prob_est)         ::= K_PROBABILITY K_OF T_LROUND expression(e) T_RROUND.
 
 predrel_of_opt(none)    ::= .
@@ -712,6 +732,9 @@ ofwith(bql_const)       ::= K_OF column_name(col1) K_WITH column_name(col2).
 nsamples_opt(none)      ::= .
 nsamples_opt(some)      ::= K_USING primary(nsamples) K_SAMPLES.
 
+tolerance_opt(none)     ::= .
+tolerance_opt(some)     ::= K_TOLERANCE primary(tol).
+
 column_lists(one)       ::= column_list(collist).
 column_lists(many)      ::= column_lists(collists)
                                 T_COMMA|K_AND column_list(collist).
@@ -813,10 +836,12 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_DROP
         K_ELSE
         K_END
+        K_ERROR
         K_ESCAPE
         K_ESTIMATE
         K_EXISTS
         K_EXISTING
+        K_EXPLAIN
         K_EXPLICIT
         K_FOR
         K_FROM
@@ -840,6 +865,7 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_LATENT
         K_LIKE
         K_LIMIT
+        K_LOGSCORE
         K_MATCH
         K_METAMODEL
         K_MINUTE
@@ -857,11 +883,13 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_OR
         K_ORDER
         K_PAIRWISE
+        K_PERCENT
         K_POPULATION
         K_PREDICT
         K_PREDICTIVE
         K_PROBABILITY
         K_PVALUE
+        K_RANDOM
         K_REGEXP
         K_REGRESS
         K_RELEVANCE
@@ -869,6 +897,7 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_ROLLBACK
         K_ROW
         K_ROWS
+        K_SAMPLE
         K_SAMPLES
         K_SCHEMA
         K_SECOND
@@ -877,6 +906,7 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_SET
         K_SIMILARITY
         K_SIMULATE
+        K_STANDARD
         K_STATTYPE
         K_STATTYPES
         K_TABLE
@@ -885,6 +915,8 @@ typearg(negative)       ::= T_MINUS L_INTEGER(i).
         K_THE
         K_THEN
         K_TO
+        K_TOLERANCE
+        K_TOP
         K_UNSET
         K_USING
         K_VALUE
@@ -22,6 +22,7 @@ for clarity and maintainability over speed.
 """
 
 import math
+import numpy
 
 EMAX = 1
 while True:
@@ -54,49 +55,73 @@ def ieee_exp(x):
     except OverflowError:
         return float("inf")
 
-def logsumexp(array):
-    if len(array) == 0:
-        return float('-inf')
-    m = max(array)
+def logsumexp(array, axis=0):
+    """Log of the sum of the exponentials of `array` along `axis`.
+
+    Computed without overflow for large inputs.  For a one-dimensional
+    sequence, the result is a float; otherwise it is an array with
+    `axis` reduced, so that, e.g., an array of models by rows yields
+    one result per row.  An empty sum is -inf.
+    """
+    if _short_p(array, axis):
+        return _logsumexp_short(array)
+    array = numpy.asarray(array, dtype=float)
+    if array.ndim == 0:
+        array = array.reshape((1,))
+    if array.shape[axis] == 0:
+        return _unwrap(numpy.full(_reduced_shape(array, axis), -numpy.inf))
+    m = numpy.max(array, axis=axis, keepdims=True)
 
     # m = +inf means addends are all +inf, hence so are sum and log.
     # m = -inf means addends are all zero, hence so is sum, and log is
     # -inf.  But if +inf and -inf are among the inputs, or if input is
-    # NaN, let the usual computation yield a NaN.
-    if math.isinf(m) and min(array) != -m and \
-       all(not math.isnan(a) for a in array):
-        return m
+    # NaN, let the usual computation yield a NaN.  (numpy.max
+    # propagates NaN, so m is not infinite if any input is NaN.)
+    infinite = numpy.isinf(m) & \
+        (numpy.min(array, axis=axis, keepdims=True) != -m)
+    return _unwrap(_logsumexp_from(array, axis, m, infinite))
 
-    # Since m = max{a_0, a_1, ...}, it follows that a <= m for all a,
-    # so a - m <= 0; hence exp(a - m) is guaranteed not to overflow.
-    return m + math.log(sum(math.exp(a - m) for a in array))
+def logmeanexp(array, axis=0):
+    """Log of the mean of the exponentials of `array` along `axis`.
 
-def logmeanexp(array):
-    inf = float('inf')
-    if len(array) == 0:
-        # logsumexp will DTRT, but math.log(len(array)) will fail.
-        return -inf
+    Like :func:`logsumexp`, reducing `axis`.  An empty mean is -inf.
+    """
+    if _short_p(array, axis):
+        return _logmeanexp_short(array)
+    array = numpy.asarray(array, dtype=float)
+    if array.ndim == 0:
+        array = array.reshape((1,))
+    n = array.shape[axis]
+    if n == 0:
+        # logsumexp will DTRT, but math.log(n) will fail.
+        return _unwrap(numpy.full(_reduced_shape(array, axis), -numpy.inf))
+    m = numpy.max(array, axis=axis, keepdims=True)
 
     # Treat -inf values as log 0 -- they contribute zero to the sum in
     # logsumexp, but one to the count.
     #
-    # If we pass -inf values through to logsumexp, and there are also
-    # +inf values, then we get NaN -- but if we had averaged exp(-inf)
-    # = 0 and exp(+inf) = +inf, we would sensibly get +inf, whose log
-    # is still +inf, not NaN.  So strip -inf values first.
+    # If we passed -inf values through to logsumexp, and there were
+    # also +inf values, then we would get NaN -- but if we had averaged
+    # exp(-inf) = 0 and exp(+inf) = +inf, we would sensibly get +inf,
+    # whose log is still +inf, not NaN.  So ignore -inf values in the
+    # test for an infinite result: it is infinite exactly when the
+    # maximum is, unless NaN is among the inputs.
     #
-    # Can't say `a > -inf' because that excludes NaNs, but we want to
-    # include them so they propagate.
-    noninfs = [a for a in array if not a == -inf]
-
     # probs = map(exp, logprobs)
     # log(mean(probs)) = log(sum(probs) / len(probs))
     #   = log(sum(probs)) - log(len(probs))
     #   = log(sum(map(exp, logprobs))) - log(len(logprobs))
     #   = logsumexp(logprobs) - log(len(logprobs))
-    return logsumexp(noninfs) - math.log(len(array))
+    infinite = numpy.isinf(m)
+    return _unwrap(_logsumexp_from(array, axis, m, infinite) - math.log(n))
+
+def logavgexp_weighted(log_W, log_A, axis=0):
+    """Log of the weighted average of exp(log_A) with weights exp(log_W).
 
-def logavgexp_weighted(log_W, log_A):
+    Reduces `axis` like :func:`logsumexp`.  `log_W` is broadcast
+    against `log_A`, so one column of weights by model may be used for
+    an array of models by rows.
+    """
     # Given log W_0, log W_1, ..., log W_{n-1} and log A_0, log A_1,
     # ... log A_{n-1}, compute
     #
@@ -109,9 +134,71 @@ def logavgexp_weighted(log_W, log_A):
     #     - logsumexp (log W_0, ..., log W_{n-1})
     #
     # XXX Pathological cases -- infinities, NaNs.
-    assert len(log_W) == len(log_A)
-    return logsumexp([log_w + log_a for log_w, log_a in zip(log_W, log_A)]) \
-        - logsumexp(log_W)
+    log_W = numpy.asarray(log_W, dtype=float)
+    log_A = numpy.asarray(log_A, dtype=float)
+    assert log_W.shape[axis] == log_A.shape[axis]
+    log_WA = log_W + log_A
+    log_W = numpy.broadcast_to(log_W, log_WA.shape)
+    return logsumexp(log_WA, axis=axis) - logsumexp(log_W, axis=axis)
+
+# Length up to which a one-dimensional sequence is reduced in Python,
+# which is faster than converting it to an array.
+_SHORT_LENGTH = 256
+
+def _short_p(array, axis):
+    if axis not in (0, -1):
+        return False
+    if isinstance(array, numpy.ndarray):
+        return array.ndim == 1 and len(array) <= _SHORT_LENGTH
+    if not isinstance(array, (list, tuple)) or \
+            len(array) > _SHORT_LENGTH:
+        return False
+    return len(array) == 0 or \
+        not isinstance(array[0], (list, tuple, numpy.ndarray))
+
+def _logsumexp_short(array):
+    if len(array) == 0:
+        return float('-inf')
+    m = max(array)
+
+    # Infinities and NaNs as in logsumexp.  (max does not propagate
+    # NaN, so check for it explicitly.)
+    if math.isinf(m) and min(array) != -m and \
+       all(not math.isnan(a) for a in array):
+        return float(m)
+    return float(m + math.log(sum(math.exp(a - m) for a in array)))
+
+def _logmeanexp_short(array):
+    inf = float('inf')
+    if len(array) == 0:
+        return -inf
+    # Strip -inf values as in logmeanexp, which ignores them in the
+    # test for an infinite result.  Can't say `a > -inf' because that
+    # excludes NaNs, but we want to include them so they propagate.
+    noninfs = [a for a in array if not a == -inf]
+    return _logsumexp_short(noninfs) - math.log(len(array))
+
+def _logsumexp_from(array, axis, m, infinite):
+    # Since m = max{a_0, a_1, ...}, it follows that a <= m for all a,
+    # so a - m <= 0; hence exp(a - m) is guaranteed not to overflow.
+    # Where the result is infinite anyway, subtract zero instead of m
+    # to avoid spurious NaNs from inf - inf.
+    m0 = numpy.where(infinite, 0., m)
+    with numpy.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        r = m0 + numpy.log(numpy.sum(numpy.exp(array - m0), axis=axis,
+            keepdims=True))
+    r = numpy.where(infinite, m, r)
+    return numpy.squeeze(r, axis=axis)
+
+def _reduced_shape(array, axis):
+    shape = list(array.shape)
+    del shape[axis]
+    return tuple(shape)
+
+def _unwrap(r):
+    if numpy.ndim(r) == 0:
+        return float(r)
+    return r
 
 def continuants(contfrac):
     """Continuants of a continued fraction.
@@ -246,13 +333,19 @@ def gamma_below(a, x):
     To derive the power series, multiply (8.7.1) by ``x^a``, expand
     ``\Gamma(a + k + 1)`` into ``\Gamma(a) a(a + 1)...(a + k)``, and
     factor ``a \Gamma(a)`` out of the sum.
+
+    SciPy computes it instead if it is available.  If a or x is an
+    array, the result is an array of gamma_below evaluated elementwise.
     """
-    assert 0. < a               # XXX NaN?
-    assert 0. <= x              # XXX NaN?
+    if numpy.ndim(a) != 0 or numpy.ndim(x) != 0:
+        return _gamma_array(_gamma_below, 'gammainc', a, x)
+    return _gamma_scalar(_gamma_below, 'gammainc', a, x)
+
+def _gamma_below(a, x):
     if x == 0.:
         return 0.
     if x > max(1., a):
-        return 1. - gamma_above(a, x)
+        return 1. - _gamma_above(a, x)
 
     # m = exp [a log x - x - log Gamma(a)] = x^a e^-x / Gamma(a)
     w = a*math.log(x) - x - math.lgamma(a)
@@ -302,11 +395,17 @@ def gamma_above(a, x):
     For x <= max(1, a), this is computed by ``1 - gamma_below(a, x)``.
 
     [1] Abramowitz & Stegun, p. 263, 6.5.31
+
+    SciPy computes it instead if it is available.  If a or x is an
+    array, the result is an array of gamma_above evaluated elementwise.
     """
-    assert 0. < a               # XXX NaN?
-    assert 0. <= x              # XXX NaN?
+    if numpy.ndim(a) != 0 or numpy.ndim(x) != 0:
+        return _gamma_array(_gamma_above, 'gammaincc', a, x)
+    return _gamma_scalar(_gamma_above, 'gammaincc', a, x)
+
+def _gamma_above(a, x):
     if x <= max(1., a):
-        return 1. - gamma_below(a, x)
+        return 1. - _gamma_below(a, x)
 
     # m = \exp [a \log x - x - \log \Gamma(a)] = x^a e^{-x} / \Gamma(a)
     w = a*math.log(x) - x - math.lgamma(a)
@@ -325,3 +424,37 @@ def gamma_above(a, x):
             i += 1
 
     return m*limit(convergents(contfrac()))
+
+def _gamma_scalar(gamma, name, a, x):
+    assert 0. < a               # XXX NaN?
+    assert 0. <= x              # XXX NaN?
+    special = _scipy_special()
+    if special is None:
+        return gamma(a, x)
+    return float(getattr(special, name)(a, x))
+
+def _gamma_array(gamma, name, a, x):
+    a, x = numpy.broadcast_arrays(
+        numpy.asarray(a, dtype=float), numpy.asarray(x, dtype=float))
+    assert numpy.all(0. < a)    # XXX NaN?
+    assert numpy.all(0. <= x)   # XXX NaN?
+    special = _scipy_special()
+    if special is None:
+        return numpy.vectorize(gamma, otypes=[float])(a, x)
+    return getattr(special, name)(a, x)
+
+# scipy.special, or False if it is missing.  Importing it is slow, so
+# it is imported on first use rather than with bayeslite, but only
+# once: retrying a failed import would cost every call as much again.
+_SCIPY_SPECIAL = None
+
+def _scipy_special():
+    global _SCIPY_SPECIAL
+    if _SCIPY_SPECIAL is None:
+        try:
+            import scipy.special
+        except ImportError:
+            _SCIPY_SPECIAL = False
+        else:
+            _SCIPY_SPECIAL = scipy.special
+    return _SCIPY_SPECIAL or None
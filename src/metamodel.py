@@ -44,6 +44,8 @@ from bayeslite.util import cursor_value
 
 builtin_metamodels = []
 builtin_metamodel_names = set()
+builtin_metamodel_constructors = {}
+lazy_builtin_metamodels = {}
 
 def bayesdb_builtin_metamodel(metamodel):
     name = metamodel.name()
@@ -51,10 +53,81 @@ def bayesdb_builtin_metamodel(metamodel):
     builtin_metamodels.append(metamodel)
     builtin_metamodel_names.add(name)
 
+def bayesdb_builtin_metamodel_lazy(name, constructor):
+    """Make the metamodel returned by `constructor()` a builtin.
+
+    The metamodel is constructed, and registered in a BayesDB, only
+    when it is first used there, so that importing bayeslite and
+    opening a BayesDB need not import its dependencies.
+    """
+    assert name not in builtin_metamodel_names
+    builtin_metamodel_constructors[name] = constructor
+    builtin_metamodel_names.add(name)
+
 def bayesdb_register_builtin_metamodels(bdb):
     """Register all builtin metamodels in `bdb`."""
     for metamodel in builtin_metamodels:
         bayesdb_register_metamodel(bdb, metamodel)
+    for name in builtin_metamodel_constructors:
+        if name in bdb.metamodels:
+            raise ValueError('Metamodel already registered: %s' % (name,))
+        bdb.metamodels.lazy.add(name)
+
+def _lazy_builtin_metamodel(name):
+    # Construct each lazy builtin metamodel only once, and share it
+    # among all BayesDBs like the other builtin metamodels.
+    if name not in lazy_builtin_metamodels:
+        metamodel = builtin_metamodel_constructors[name]()
+        assert metamodel.name() == name
+        lazy_builtin_metamodels[name] = metamodel
+    return lazy_builtin_metamodels[name]
+
+class BayesDBMetamodels(dict):
+    """Dictionary of metamodels registered in a BayesDB, by name.
+
+    Names in `lazy` are of builtin metamodels that count as registered
+    but are constructed and registered only when first looked up.  A
+    name stays in `lazy` until its registration is committed, since
+    rolling back the transaction that registered it also rolls back
+    the metamodel's tables.
+    """
+
+    def __init__(self, bdb):
+        super(BayesDBMetamodels, self).__init__()
+        self._bdb = bdb
+        self.lazy = set()
+        self._pending = set()   # registered in an uncommitted transaction
+
+    def __contains__(self, name):
+        return super(BayesDBMetamodels, self).__contains__(name) or \
+            name in self.lazy
+
+    def __missing__(self, name):
+        if name not in self.lazy:
+            raise KeyError(name)
+        bdb = self._bdb
+        metamodel = _lazy_builtin_metamodel(name)
+        if name not in self._pending or \
+                bayesdb_metamodel_version(bdb, name) is None:
+            with bdb.savepoint():
+                metamodel.register(bdb)
+            self._pending.add(name)
+        if bdb._sqlite3.getautocommit():
+            # Committed: nothing can roll the registration back now.
+            self.lazy.remove(name)
+            self._pending.remove(name)
+            self[name] = metamodel
+        return metamodel
+
+    def __delitem__(self, name):
+        if name in self.lazy:
+            self.lazy.remove(name)
+            self._pending.discard(name)
+        else:
+            super(BayesDBMetamodels, self).__delitem__(name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
 
 def bayesdb_register_metamodel(bdb, metamodel):
     """Register `metamodel` in `bdb`, creating any necessary tables.
@@ -115,6 +188,13 @@ class IBayesDBMetamodel(object):
         """
         raise NotImplementedError
 
+    def forget_pool(self, pool):
+        """Forget any state shared by the readers of `pool`.
+
+        Called by :meth:`bayeslite.BayesDBPool.close`.
+        """
+        pass
+
     def create_generator(self, bdb, table, schema, **kwargs):
         """Create a generator for a table with the given schema.
 
@@ -200,6 +280,16 @@ class IBayesDBMetamodel(object):
         """
         raise NotImplementedError
 
+    def model_logscores(self, bdb, generator_id):
+        """Return a dict mapping each model number to its log score.
+
+        The log score is the model's most recent log joint density of
+        latent state and data, as used to rank models in ``USING TOP
+        <k> MODELS BY LOGSCORE``.  Models with no score yet map to
+        negative infinity.
+        """
+        raise NotImplementedError
+
     def column_dependence_probability(self, bdb, generator_id, modelnos, colno0,
             colno1):
         """Compute ``DEPENDENCE PROBABILITY OF <col0> WITH <col1>``."""
@@ -215,6 +305,16 @@ class IBayesDBMetamodel(object):
         """Compute ``SIMILARITY TO <target_row>`` for given `rowid`."""
         raise NotImplementedError
 
+    def row_similarities(self, bdb, generator_id, modelnos, target_rowid,
+            colnos):
+        """Compute ``SIMILARITY TO <target_row>`` for all rows at once.
+
+        Returns a dict mapping rowids to similarities, or ``None`` if
+        there is no faster way than :meth:`row_similarity` one row at
+        a time.  Rows missing from the dict are computed that way.
+        """
+        return None
+
     def predictive_relevance(self, bdb, generator_id, modelnos, rowid_target,
             rowid_query, hypotheticals, colno):
         """Compute predictive relevance, also known as relevance probability.
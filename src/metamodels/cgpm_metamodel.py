@@ -17,12 +17,14 @@
 import itertools
 import json
 import math
+import threading
 
 from collections import Counter
 from collections import defaultdict
 
 from cgpm.crosscat.engine import Engine
 
+import bayeslite.colstats as colstats
 import bayeslite.core as core
 
 from bayeslite.exception import BQLError
@@ -40,6 +42,12 @@ import cgpm_alter.parse
 import cgpm_analyze.parse
 import cgpm_schema.parse
 
+# Number of consecutive table rows to load at once for constraints.
+_TABLE_ROW_CHUNK = 256
+
+# Number of engine stamps for which readers in a pool share engines.
+_ENGINE_SNAPSHOTS = 2
+
 CGPM_SCHEMA_1 = '''
 INSERT INTO bayesdb_metamodel (name, version) VALUES ('cgpm', 1);
 
@@ -112,6 +120,8 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         # import, creates a single CGPM_Metamodel object to be used throughout
         # the python session).
         self._cache = dict()
+        # Readers of a pool share a cache in different threads.
+        self._cache_lock = threading.Lock()
 
     def name(self):
         return 'cgpm'
@@ -139,12 +149,21 @@ class CGPM_Metamodel(IBayesDBMetamodel):
                 raise BQLError(bdb, 'CGPM already installed'
                     ' with unknown schema version: %d' % (version,))
 
+    def forget_pool(self, pool):
+        with self._cache_lock:
+            self._cache.pop(pool, None)
+
     def set_multiprocess(self, switch):
         old = self._multiprocess
         self._multiprocess = switch
         return old
 
     def create_generator(self, bdb, generator_id, schema_tokens, **kwargs):
+        # Forget the schema and engine snapshots cached for a generator
+        # whose creation with the same id was rolled back: this one's
+        # engine stamps will repeat its.
+        self._del_cache_entry(bdb, generator_id, None)
+
         schema_ast = cgpm_schema.parse.parse(schema_tokens)
         schema = _create_schema(bdb, generator_id, schema_ast, **kwargs)
 
@@ -172,12 +191,8 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         ''', (population_id,))
         for colno, name, stattype in vars_cursor:
             if _is_categorical(stattype):
-                qn = sqlite3_quote_name(name)
-                cursor = bdb.sql_execute('''
-                    SELECT DISTINCT %s
-                    FROM %s WHERE %s IS NOT NULL
-                ''' % (qn, qt, qn))
-                for code, (value,) in enumerate(cursor):
+                values = _category_values(bdb, table, colno)
+                for code, value in enumerate(values):
                     bdb.sql_execute('''
                         INSERT INTO bayesdb_cgpm_category
                             (generator_id, colno, value, code)
@@ -192,7 +207,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
                 bdb.sql_execute('SELECT COUNT(*) FROM %s' % (qt,)))
             cursor = bdb.sql_execute(
                 'SELECT _rowid_ FROM %s ORDER BY _rowid_ ASC' % (qt,))
-            uniform = bdb._prng.weakrandom_uniform
+            uniform = bdb.substream(generator_id).weakrandom_uniform
             # https://en.wikipedia.org/wiki/Reservoir_sampling
             samples = []
             for i, row in enumerate(cursor):
@@ -213,7 +228,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
             ''', (generator_id, table_rowid, cgpm_rowid))
 
     def drop_generator(self, bdb, generator_id):
-        # Remove the cache for this generator_id.
+        # Forget the schema and engine snapshots cached for it.
         self._del_cache_entry(bdb, generator_id, None)
 
         # Delete categories.
@@ -255,12 +270,8 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         # Update variable value mapping if categorical.
         if _is_categorical(stattype):
             table_name = core.bayesdb_population_table(bdb, population_id)
-            qt = sqlite3_quote_name(table_name)
-            qv = sqlite3_quote_name(varname)
-            cursor = bdb.sql_execute('''
-                SELECT DISTINCT %s FROM %s WHERE %s IS NOT NULL
-            ''' % (qv, qt, qv))
-            for code, (value,) in enumerate(cursor):
+            values = _category_values(bdb, table_name, colno)
+            for code, value in enumerate(values):
                 bdb.sql_execute('''
                     INSERT INTO bayesdb_cgpm_category
                         (generator_id, colno, value, code)
@@ -364,7 +375,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
                 WHERE generator_id = ?
             ''', (generator_id,))
             # Delete the engine from the cache.
-            self._del_cache_entry(bdb, generator_id, 'engine')
+            self._del_cache_entry(bdb, generator_id, 'snapshots')
         # Drop some models.
         else:
             engine = self._engine(bdb, generator_id)
@@ -631,6 +642,10 @@ class CGPM_Metamodel(IBayesDBMetamodel):
             if rowids_user:
                 raise BQLError(bdb, 'No ROWS in Loom.')
 
+        # Give up now if the query is already over, before the engine
+        # is mutated in place.
+        bdb.check_deadline()
+
         # Run transitions on baseline variables.
         if vars_target_baseline:
             if optimized and optimized.backend == 'loom':
@@ -680,6 +695,16 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         # Serialize the engine.
         self._serialize_engine(bdb, generator_id, engine, True)
 
+    def model_logscores(self, bdb, generator_id):
+        engine = self._engine(bdb, generator_id)
+        cursor = bdb.sql_execute('''
+            SELECT modelno, cgpm_modelno FROM bayesdb_cgpm_modelno
+                WHERE generator_id = ?
+        ''', (generator_id,))
+        return dict(
+            (modelno, engine.states[cgpm_modelno].logpdf_score())
+            for modelno, cgpm_modelno in cursor)
+
 
     def column_dependence_probability(
             self, bdb, generator_id, modelnos, colno0, colno1):
@@ -756,6 +781,54 @@ class CGPM_Metamodel(IBayesDBMetamodel):
 
         return arithmetic_mean(similarity_list)
 
+    def row_similarities(
+            self, bdb, generator_id, modelnos, target_rowid, colnos):
+        # Retrieve the modelnos.
+        cgpm_modelnos = self._get_modelnos(bdb, generator_id, modelnos)
+
+        # Map the individual indexing.
+        cgpm_target_rowid = self._cgpm_rowid(bdb, generator_id, target_rowid)
+        if cgpm_target_rowid == -1:
+            return None
+
+        # Get the engine and the index of its row clusters.
+        snapshot = self._snapshot(bdb, generator_id)
+        engine = snapshot['engine']
+        if cgpm_modelnos is None:
+            cgpm_modelnos = range(len(engine.states))
+        individuals = self._cgpm_rowids(bdb, generator_id).items()
+        cgpm_rowids = [cgpm_rowid for _table_rowid, cgpm_rowid in individuals]
+
+        # As in engine.row_similarity, the similarity in each state is
+        # the fraction of colnos in whose view the rows share a
+        # cluster, so count the target's fellow cluster members.
+        counts = Counter()
+        for stateno in cgpm_modelnos:
+            for colno in colnos:
+                row_cluster, cluster_rows = self._row_clusters(
+                    snapshot, stateno, colno, cgpm_rowids)
+                counts.update(cluster_rows[row_cluster[cgpm_target_rowid]])
+        n = float(len(cgpm_modelnos) * len(colnos))
+        return dict((table_rowid, counts[cgpm_rowid] / n)
+            for table_rowid, cgpm_rowid in individuals)
+
+    def _row_clusters(self, snapshot, stateno, colno, cgpm_rowids):
+        # Index the cluster of each row in the view of colno, and the
+        # rows of each cluster.  The index is good for as long as the
+        # engine's stamp stays the same, so keep it in its snapshot.
+        with self._cache_lock:
+            index = snapshot.setdefault('row_clusters', {})
+            if (stateno, colno) in index:
+                return index[stateno, colno]
+        view = snapshot['engine'].states[stateno].view_for(colno)
+        row_cluster = dict((r, view.Zr(r)) for r in cgpm_rowids)
+        cluster_rows = defaultdict(list)
+        for r, k in row_cluster.iteritems():
+            cluster_rows[k].append(r)
+        with self._cache_lock:
+            return index.setdefault((stateno, colno),
+                (row_cluster, cluster_rows))
+
     def predictive_relevance(
             self, bdb, generator_id, modelnos, rowid_target, rowid_query,
             hypotheticals, colno):
@@ -973,7 +1046,7 @@ class CGPM_Metamodel(IBayesDBMetamodel):
                     'columns have all null values: %s' % repr(nulls))
 
         return Engine(
-            gpmcc_data, num_states=n, rng=bdb.np_prng,
+            gpmcc_data, num_states=n, rng=bdb.substream_np_prng(generator_id),
             multiprocess=self._multiprocess, outputs=outputs, cctypes=cctypes,
             distargs=distargs)
 
@@ -992,7 +1065,8 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         cls = self._cgpm_registry[name]
         cgpm_vars = cgpm_ext['outputs'] + cgpm_ext['inputs']
         cgpm_data = self._data(bdb, generator_id, cgpm_vars)
-        cgpm = cls(outputs, inputs, rng=bdb.np_prng, *args, **kwds)
+        cgpm = cls(outputs, inputs, rng=bdb.substream_np_prng(generator_id),
+            *args, **kwds)
         for cgpm_rowid, row in enumerate(cgpm_data):
             # CGPMs do not uniformly handle null values or missing
             # values sensibly yet, so until we have that sorted
@@ -1040,14 +1114,23 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         return schema
 
     def _engine(self, bdb, generator_id):
-        # Retrieve the cache.
+        return self._snapshot(bdb, generator_id)['engine']
+
+    def _snapshot(self, bdb, generator_id):
+        """Return the cached snapshot of the engine of `generator_id`.
 
+        The snapshot is a dictionary of the engine at the stamp `bdb`
+        sees, under ``'engine'``, and of data derived from it.  Readers
+        in a pool share snapshots, and may see different stamps.
+        """
         # Probe the cache.
-        cached_engine = self._engine_latest(bdb, generator_id)
-        if cached_engine is not None:
-            return cached_engine
+        stamp = self._engine_stamp(bdb, generator_id)
+        with self._cache_lock:
+            snapshots = self._get_cache_entry(bdb, generator_id, 'snapshots')
+            if snapshots is not None and stamp in snapshots:
+                return snapshots[stamp]
 
-        # Not cached or mismatched stamps. Load the engine from the database.
+        # Not cached. Load the engine from the database.
         cursor = bdb.sql_execute('''
             SELECT engine_json, engine_stamp FROM bayesdb_cgpm_generator
                 WHERE generator_id = ?
@@ -1061,33 +1144,36 @@ class CGPM_Metamodel(IBayesDBMetamodel):
 
         # Deserialize the engine.
         engine = Engine.from_metadata(
-            json.loads(engine_json), rng=bdb.np_prng,
+            json.loads(engine_json), rng=bdb.substream_np_prng(generator_id),
             multiprocess=self._multiprocess)
 
-        # Cache the engine with its stamp.
-        self._set_cache_entry(bdb, generator_id, 'engine', engine)
-        self._set_cache_entry(bdb, generator_id, 'stamp', engine_stamp)
-
-        return engine
-
-    def _engine_latest(self, bdb, generator_id):
-        # Check whether there is a cached_engine.
-        cached_engine = self._get_cache_entry(bdb, generator_id, 'engine')
-        if cached_engine is None:
-            return None
-        # Check whether cached_engine is latest version on disk.
-        cached_stamp = self._get_cache_entry(bdb, generator_id, 'stamp')
-        latest_stamp = self._engine_stamp(bdb, generator_id)
-        assert cached_stamp <= latest_stamp
-        # Return the cached_engine if stamps match, else None
-        return cached_engine if cached_stamp == latest_stamp else None
+        # Cache the engine with its stamp, unless another reader just
+        # did.
+        return self._cache_engine(bdb, generator_id, engine_stamp, engine,
+            False)
+
+    def _cache_engine(self, bdb, generator_id, stamp, engine, replace):
+        # Keep the engines of the latest few stamps, for readers on
+        # older snapshots of the database.  If `replace` is true, the
+        # engine replaces all others.
+        with self._cache_lock:
+            snapshots = self._get_cache_entry(bdb, generator_id, 'snapshots')
+            if snapshots is None or replace:
+                snapshots = {}
+                self._set_cache_entry(
+                    bdb, generator_id, 'snapshots', snapshots)
+            if stamp not in snapshots:
+                snapshots[stamp] = {'engine': engine}
+                for old in sorted(snapshots)[:-_ENGINE_SNAPSHOTS]:
+                    del snapshots[old]
+            return snapshots[stamp]
 
     def _engine_stamp(self, bdb, generator_id):
         cursor = bdb.sql_execute('''
             SELECT engine_stamp FROM bayesdb_cgpm_generator
                 WHERE generator_id = ?
         ''', (generator_id,))
-        return cursor_value(cursor)
+        return cursor_value(cursor, nullok=True)
 
     def _serialize_engine(self, bdb, generator_id, engine, cache):
         # Write the engine to JSON.
@@ -1109,23 +1195,23 @@ class CGPM_Metamodel(IBayesDBMetamodel):
             'generator_id': generator_id,
         })
 
-        # Add it to the cache.
+        # Add it to the cache, in place of any older engine, which
+        # may be the same object modified.
         if cache:
-            self._set_cache_entry(bdb, generator_id, 'engine', engine)
-            self._set_cache_entry(bdb, generator_id, 'stamp', engine_stamp_new)
+            self._cache_engine(
+                bdb, generator_id, engine_stamp_new, engine, True)
 
 
     def _retrieve_cache(self, bdb,):
-        if bdb in self._cache:
-            return self._cache[bdb]
-        self._cache[bdb] = dict()
-        return self._cache[bdb]
+        # Read-only handles in a pool share the engines they load.
+        # Queries only read engines; the pool's writer, which
+        # modifies them, has a cache of its own.
+        key = bdb if bdb.pool is None else bdb.pool
+        return self._cache.setdefault(key, dict())
 
     def _set_cache_entry(self, bdb, generator_id, key, value):
         cache = self._retrieve_cache(bdb)
-        if generator_id not in cache:
-            cache[generator_id] = dict()
-        cache[generator_id][key] = value
+        cache.setdefault(generator_id, dict())[key] = value
 
     def _get_cache_entry(self, bdb, generator_id, key):
         # Returns None if the generator_id or key do not exist.
@@ -1146,12 +1232,29 @@ class CGPM_Metamodel(IBayesDBMetamodel):
                 del cache[generator_id][key]
 
     def _cgpm_rowid(self, bdb, generator_id, table_rowid, nullok=True):
+        cgpm_rowids = self._cgpm_rowids(bdb, generator_id)
+        if table_rowid not in cgpm_rowids:
+            if not nullok:
+                raise ValueError('No such individual: %r' % (table_rowid,))
+            return -1
+        return cgpm_rowids[table_rowid]
+
+    def _cgpm_rowids(self, bdb, generator_id):
+        # Map table rowids to cgpm rowids.  The individuals are the rows
+        # incorporated into the engine, so keep the map in the engine's
+        # snapshot, and read it afresh whenever the stamp changes.
+        snapshot = self._snapshot(bdb, generator_id)
+        with self._cache_lock:
+            if 'individuals' in snapshot:
+                return snapshot['individuals']
         cursor = bdb.sql_execute('''
-            SELECT cgpm_rowid FROM bayesdb_cgpm_individual
-                WHERE generator_id = ? AND table_rowid = ?
-        ''', (generator_id, table_rowid))
-        cgpm_rowid = cursor_value(cursor, nullok=nullok)
-        return cgpm_rowid if cgpm_rowid is not None else -1
+            SELECT table_rowid, cgpm_rowid FROM bayesdb_cgpm_individual
+                WHERE generator_id = ?
+        ''', (generator_id,))
+        individuals = dict(cursor)
+        # Keep the map another reader may just have stored.
+        with self._cache_lock:
+            return snapshot.setdefault('individuals', individuals)
 
     def _to_numeric(self, bdb, generator_id, colno, value):
         """Convert value in bayeslite to equivalent cgpm format."""
@@ -1248,32 +1351,60 @@ class CGPM_Metamodel(IBayesDBMetamodel):
         # INSERT INTO or SUBSAMPLE), then retrieve all values for rowid as the
         # constraints. Note that we do not need to populate constraints if the
         # rowid is already observed, which is done by cgpm.
-        table = core.bayesdb_generator_table(bdb, generator_id)
-        qt = sqlite3_quote_name(table)
-        # Does the rowid exist in the base table?
-        exists = bdb.sql_execute('''
-            SELECT 1 FROM %s WHERE oid = ?
-        ''' % (qt,), (rowid,)).fetchall()
         # Is the rowid incorporated into the cgpm?
-        incorporated = bdb.sql_execute('''
-            SELECT 1 FROM bayesdb_cgpm_individual
-            WHERE generator_id = ? AND table_rowid = ?
-            LIMIT 1
-        ''', (generator_id, rowid,)).fetchall()
-        # Populate values if necessary.
-        table_constraints = []
-        if exists and (not incorporated):
+        if rowid in self._cgpm_rowids(bdb, generator_id):
+            return []
+        # Does the rowid exist in the base table?
+        table_row = self._table_row(bdb, generator_id, rowid)
+        if table_row is None:
+            return []
+        variable_numbers, row_values = table_row
+        return [
+            (varno, val)
+            for varno, val in zip(variable_numbers, row_values)
+            if val is not None
+        ]
+
+    def _table_row(self, bdb, generator_id, rowid):
+        """Return the population's variable numbers and values in `rowid`.
+
+        Returns None if there is no such row in the table.  Within a
+        query, which is likely to ask for many rows in order, rows are
+        loaded a chunk of consecutive rowids at a time, and the latest
+        chunk is remembered until the next is loaded or the query is
+        done.
+        """
+        if rowid is None:
+            return None
+        if bdb._query.qid is None:
+            memo = {}
+            start, end = rowid, rowid + 1
+        else:
+            memo = bdb._query.memo
+            start = rowid - (rowid % _TABLE_ROW_CHUNK)
+            end = start + _TABLE_ROW_CHUNK
+        key = ('cgpm_table_rows', generator_id)
+        if key not in memo:
             population_id = core.bayesdb_generator_population(bdb, generator_id)
-            row_values = core.bayesdb_population_row_values(
-                bdb, population_id, rowid)
+            table = core.bayesdb_population_table(bdb, population_id)
             variable_numbers = core.bayesdb_variable_numbers(
                 bdb, population_id, None)
-            table_constraints = [
-                (varno, val)
-                for varno, val in zip(variable_numbers, row_values)
-                if val is not None
-            ]
-        return table_constraints
+            variable_names = core.bayesdb_variable_names(
+                bdb, population_id, None)
+            qt = sqlite3_quote_name(table)
+            qcns = ','.join(map(sqlite3_quote_name, variable_names))
+            sql = '''
+                SELECT oid, %s FROM %s WHERE ? <= oid AND oid < ?
+            ''' % (qcns, qt)
+            memo[key] = (variable_numbers, sql, None, {})
+        variable_numbers, sql, loaded, rows = memo[key]
+        if start != loaded:
+            rows = dict((row[0], row[1:])
+                for row in bdb.sql_execute(sql, (start, end)))
+            memo[key] = (variable_numbers, sql, start, rows)
+        if rowid not in rows:
+            return None
+        return (variable_numbers, rows[rowid])
 
     def _get_modelnos(self, bdb, generator_id, modelnos):
         if modelnos is None:
@@ -1794,12 +1925,30 @@ def _retrieve_analyze_variables(bdb, generator_id, ast):
     return (variable_numbers, rowids, subproblems, optimized, quiet)
 
 
+def _category_values(bdb, table, colno):
+    values = colstats.bayesdb_column_distinct_values(bdb, table, colno)
+    if values is None:
+        qt = sqlite3_quote_name(table)
+        qn = sqlite3_quote_name(
+            core.bayesdb_table_column_name(bdb, table, colno))
+        cursor = bdb.sql_execute('''
+            SELECT DISTINCT %s FROM %s WHERE %s IS NOT NULL
+        ''' % (qn, qt, qn))
+        values = [value for (value,) in cursor]
+    return values
+
 def _default_categorical(bdb, generator_id, var):
     table = core.bayesdb_generator_table(bdb, generator_id)
-    qt = sqlite3_quote_name(table)
-    qv = sqlite3_quote_name(var)
-    cursor = bdb.sql_execute('SELECT COUNT(DISTINCT %s) FROM %s' % (qv, qt))
-    k = cursor_value(cursor)
+    colno = core.bayesdb_table_column_number(bdb, table, var)
+    stats = colstats.bayesdb_column_stats(bdb, table, colno)
+    if stats is not None and stats.ndistinct is not None:
+        k = stats.ndistinct
+    else:
+        qt = sqlite3_quote_name(table)
+        qv = sqlite3_quote_name(var)
+        cursor = bdb.sql_execute(
+            'SELECT COUNT(DISTINCT %s) FROM %s' % (qv, qt))
+        k = cursor_value(cursor)
     return 'categorical', {'k': k}
 
 def _default_numerical(bdb, generator_id, var):
@@ -23,12 +23,19 @@ interface for Crosscat.
 """
 
 import apsw
+import contextlib
+import copy
+import functools
+import importlib
 import itertools
 import json
 import math
+import multiprocessing
 import struct
+import threading
 import time
 
+import bayeslite.colstats as colstats
 import bayeslite.core as core
 import bayeslite.guess as guess
 import bayeslite.metamodel as metamodel
@@ -37,6 +44,7 @@ import crosscat_generator_schema
 import crosscat_theta_validator
 
 from bayeslite.exception import BQLError
+from bayeslite.sharedarray import SharedArray
 from bayeslite.sqlite3_util import sqlite3_quote_name
 from bayeslite.stats import arithmetic_mean
 from bayeslite.util import casefold
@@ -221,12 +229,17 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
     with names that begin with ``bayesdb_crosscat_``.
     """
 
-    def __init__(self, crosscat, subsample=None):
+    def __init__(self, crosscat, subsample=None, multiprocess=None):
         if subsample is None:
             subsample = False
         self._crosscat = crosscat
         self._subsample = subsample
+        self._multiprocess = multiprocess
         self._theta_validator = crosscat_theta_validator.Validator()
+        # Thetas shared by the readers of each pool, keyed by pool,
+        # generator id, and modelno.
+        self._shared_thetas = {}
+        self._shared_lock = threading.Lock()
 
     def _crosscat_cache_nocreate(self, bdb):
         if bdb.cache is None:
@@ -295,9 +308,35 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 for value, (_name, colno, _stattype) in zip(row, columns)]
             for row in cursor]
 
-    def _crosscat_thetas(self, bdb, generator_id, modelno):
-        if modelno is not None:
-            return {modelno: self._crosscat_theta(bdb, generator_id, modelno)}
+    @contextlib.contextmanager
+    def _crosscat_process_pool(self, n, M_c, T):
+        """Yield a pool of processes for work on `n` models, or None.
+
+        There is a pool only if multiprocessing is on and there are
+        several models.  The workers share `T` in a memory-mapped file
+        rather than each getting a copy of it with every model.
+        """
+        if not self._multiprocess or n <= 1:
+            yield None
+            return
+        nprocs = min(n, multiprocessing.cpu_count())
+        do_initialize = getattr(self._crosscat, 'do_initialize', None)
+        do_analyze = getattr(self._crosscat, 'do_analyze', None)
+        with SharedArray(T, dtype=float) as data:
+            pool = multiprocessing.Pool(nprocs,
+                initializer=_crosscat_process_init,
+                initargs=(do_initialize, do_analyze, M_c, data))
+            try:
+                yield pool
+            finally:
+                pool.terminate()
+                pool.join()
+
+    def _crosscat_thetas(self, bdb, generator_id, modelnos):
+        if modelnos is not None:
+            return dict(
+                (modelno, self._crosscat_theta(bdb, generator_id, modelno))
+                for modelno in modelnos)
         sql = '''
             SELECT modelno FROM bayesdb_crosscat_theta
                 WHERE generator_id = ?
@@ -324,7 +363,8 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             raise BQLError(bdb, 'No such crosscat model for generator %s: %d' %
                 (repr(generator), modelno))
         else:
-            theta = json.loads(row[0])
+            theta = self._crosscat_shared_theta(
+                bdb, generator_id, modelno, row[0])
             if cc_cache is not None:
                 if generator_id in cc_cache.thetas:
                     assert modelno not in cc_cache.thetas[generator_id]
@@ -333,18 +373,41 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                     cc_cache.thetas[generator_id] = {modelno: theta}
             return theta
 
-    def _crosscat_latent_stata(self, bdb, generator_id, modelno):
-        thetas = self._crosscat_thetas(bdb, generator_id, modelno)
+    def forget_pool(self, pool):
+        with self._shared_lock:
+            for key in self._shared_thetas.keys():
+                if key[0] is pool:
+                    del self._shared_thetas[key]
+
+    def _crosscat_shared_theta(self, bdb, generator_id, modelno, theta_json):
+        # Readers in a pool see the writer's commits as they happen, so
+        # what they share is good only while the JSON it was parsed
+        # from is unchanged.  Comparing the JSON is much cheaper than
+        # parsing it.
+        if bdb.pool is None:
+            return json.loads(theta_json)
+        key = (bdb.pool, generator_id, modelno)
+        with self._shared_lock:
+            shared = self._shared_thetas.get(key)
+        if shared is not None and shared[0] == theta_json:
+            return shared[1]
+        theta = json.loads(theta_json)
+        with self._shared_lock:
+            self._shared_thetas[key] = (theta_json, theta)
+        return theta
+
+    def _crosscat_latent_stata(self, bdb, generator_id, modelnos):
+        thetas = self._crosscat_thetas(bdb, generator_id, modelnos)
         return ((thetas[modelno]['X_L'], thetas[modelno]['X_D'])
             for modelno in sorted(thetas.iterkeys()))
 
-    def _crosscat_latent_state(self, bdb, generator_id, modelno):
+    def _crosscat_latent_state(self, bdb, generator_id, modelnos):
         return [statum[0] for statum
-            in self._crosscat_latent_stata(bdb, generator_id, modelno)]
+            in self._crosscat_latent_stata(bdb, generator_id, modelnos)]
 
-    def _crosscat_latent_data(self, bdb, generator_id, modelno):
+    def _crosscat_latent_data(self, bdb, generator_id, modelnos):
         return [statum[1] for statum
-            in self._crosscat_latent_stata(bdb, generator_id, modelno)]
+            in self._crosscat_latent_stata(bdb, generator_id, modelnos)]
 
     def _crosscat_get_row(self, bdb, generator_id, rowid, X_L_list, X_D_list):
         [row_id], X_L_list, X_D_list = \
@@ -566,6 +629,11 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             raise BQLError(bdb, 'Crosscat already installed'
                 ' with unknown schema version: %d' % (version,))
 
+    def set_multiprocess(self, switch):
+        old = self._multiprocess
+        self._multiprocess = switch
+        return old
+
     def create_generator(self, bdb, generator_id, schema, **kwargs):
         parsed_schema = crosscat_generator_schema.parse(
             schema, subsample_default=self._subsample)
@@ -778,46 +846,69 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
             'row_initialization': 'from_the_prior',
         }
         M_c = self._crosscat_metadata(bdb, generator_id)
-        X_L_list, X_D_list = self._crosscat.initialize(
-            seed=crosscat_seed(bdb),
-            M_c=M_c,
-            M_r=None,           # XXX
-            T=self._crosscat_data(bdb, generator_id, M_c),
-            n_chains=len(modelnos),
-            initialization=model_config['initialization'],
-            row_initialization=model_config['row_initialization'],
-        )
-        if len(modelnos) == 1:  # XXX Ugh.  Fix crosscat so it doesn't do this.
-            X_L_list = [X_L_list]
-            X_D_list = [X_D_list]
-        # Ensure dependent columns if necessary.
-        dep_constraints = [(crosscat_cc_colno(bdb, generator_id, colno1),
-                crosscat_cc_colno(bdb, generator_id, colno2), dep)
-            for colno1, colno2, dep in
-                crosscat_gen_column_dependencies(bdb, generator_id)]
-        if 0 < len(dep_constraints):
-            X_L_list, X_D_list = self._crosscat.ensure_col_dep_constraints(
-                seed=crosscat_seed(bdb),
-                M_c=M_c,
-                M_r=None,
-                T=self._crosscat_data(bdb, generator_id, M_c),
-                X_L=X_L_list,
-                X_D=X_D_list,
-                dep_constraints=dep_constraints,
-            )
+        T = self._crosscat_data(bdb, generator_id, M_c)
+        # With many models, initializing and validating them in a pool
+        # of processes pays for starting it.
+        with self._crosscat_process_pool(len(modelnos), M_c, T) as pool:
+            if pool is not None and \
+                    hasattr(self._crosscat, 'get_initialize_arg_tuples'):
+                X_L_list, X_D_list = _crosscat_initialize_parallel(pool,
+                    self._crosscat,
+                    seed=crosscat_seed(bdb, generator_id),
+                    M_c=M_c,
+                    T=T,
+                    n_chains=len(modelnos),
+                    initialization=model_config['initialization'],
+                    row_initialization=model_config['row_initialization'],
+                )
+            else:
+                X_L_list, X_D_list = self._crosscat.initialize(
+                    seed=crosscat_seed(bdb, generator_id),
+                    M_c=M_c,
+                    M_r=None,           # XXX
+                    T=T,
+                    n_chains=len(modelnos),
+                    initialization=model_config['initialization'],
+                    row_initialization=model_config['row_initialization'],
+                )
+                # XXX Ugh.  Fix crosscat so it doesn't do this.
+                if len(modelnos) == 1:
+                    X_L_list = [X_L_list]
+                    X_D_list = [X_D_list]
+            # Ensure dependent columns if necessary.
+            dep_constraints = [(crosscat_cc_colno(bdb, generator_id, colno1),
+                    crosscat_cc_colno(bdb, generator_id, colno2), dep)
+                for colno1, colno2, dep in
+                    crosscat_gen_column_dependencies(bdb, generator_id)]
+            if 0 < len(dep_constraints):
+                X_L_list, X_D_list = \
+                    self._crosscat.ensure_col_dep_constraints(
+                        seed=crosscat_seed(bdb, generator_id),
+                        M_c=M_c,
+                        M_r=None,
+                        T=T,
+                        X_L=X_L_list,
+                        X_D=X_D_list,
+                        dep_constraints=dep_constraints,
+                    )
+            thetas = [{
+                'X_L': X_L,
+                'X_D': X_D,
+                'iterations': 0,
+                'model_config': model_config,
+            } for X_L, X_D in zip(X_L_list, X_D_list)]
+            # Validating is most of the work of initializing.
+            if pool is not None:
+                pool.map(_crosscat_process_validate, thetas)
+            else:
+                for theta in thetas:
+                    self._theta_validator.validate(theta)
         insert_theta_sql = '''
             INSERT INTO bayesdb_crosscat_theta
                 (generator_id, modelno, theta_json)
                 VALUES (:generator_id, :modelno, :theta_json)
         '''
-        for modelno, (X_L, X_D) in zip(modelnos, zip(X_L_list, X_D_list)):
-            theta = {
-                'X_L': X_L,
-                'X_D': X_D,
-                'iterations': 0,
-                'model_config': model_config,
-            }
-            self._theta_validator.validate(theta)
+        for modelno, theta in zip(modelnos, thetas):
             bdb.sql_execute(insert_theta_sql, {
                 'generator_id': generator_id,
                 'modelno': modelno,
@@ -874,6 +965,21 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
         # analysis?
         M_c = self._crosscat_metadata(bdb, generator_id)
         T = self._crosscat_data(bdb, generator_id, M_c)
+        # With many models, analyze them in a pool of processes that
+        # lasts the whole analysis.
+        nmodels = 0
+        if self._multiprocess:
+            if modelnos is None:
+                nmodels = len(core.bayesdb_generator_modelnos(bdb,
+                    generator_id))
+            else:
+                nmodels = len(modelnos)
+        with self._crosscat_process_pool(nmodels, M_c, T) as pool:
+            self._crosscat_analyze(bdb, generator_id, modelnos, iterations,
+                max_seconds, ckpt_iterations, ckpt_seconds, M_c, T, pool)
+
+    def _crosscat_analyze(self, bdb, generator_id, modelnos, iterations,
+            max_seconds, ckpt_iterations, ckpt_seconds, M_c, T, pool):
         update_iterations_sql = '''
             UPDATE bayesdb_generator_model
                 SET iterations = iterations + :iterations
@@ -934,9 +1040,14 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 # actually performed.
                 iterations_in_ckpt = 0
                 while True:
+                    bdb.check_deadline()
                     X_L_list_0 = X_L_list
-                    X_L_list, X_D_list, diagnostics = self._crosscat.analyze(
-                        seed=crosscat_seed(bdb),
+                    analyze = self._crosscat.analyze
+                    if pool is not None and hasattr(self._crosscat, 'mapper'):
+                        analyze = functools.partial(
+                            _crosscat_analyze_parallel, pool, self._crosscat)
+                    X_L_list, X_D_list, diagnostics = analyze(
+                        seed=crosscat_seed(bdb, generator_id),
                         M_c=M_c,
                         T=T,
                         do_diagnostics=True,
@@ -1020,9 +1131,29 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 if ckpt_seconds is not None:
                     ckpt_deadline = time.time() + ckpt_seconds
 
+    def model_logscores(self, bdb, generator_id):
+        # Latest checkpoint's logscore for each model; models never
+        # analyzed have no diagnostics and rank last.
+        sql = '''
+            SELECT m.modelno, d.logscore
+                FROM bayesdb_generator_model AS m
+                LEFT OUTER JOIN bayesdb_crosscat_diagnostics AS d
+                    ON d.generator_id = m.generator_id
+                        AND d.modelno = m.modelno
+                        AND d.checkpoint = (
+                            SELECT MAX(checkpoint)
+                                FROM bayesdb_crosscat_diagnostics
+                                WHERE generator_id = m.generator_id
+                                    AND modelno = m.modelno
+                        )
+                WHERE m.generator_id = ?
+        '''
+        return dict(
+            (modelno, float('-inf') if logscore is None else logscore)
+            for modelno, logscore in bdb.sql_execute(sql, (generator_id,)))
+
     def column_dependence_probability(self, bdb, generator_id, modelnos,
             colno0, colno1):
-        modelno = self.get_modelno(bdb, modelnos)
         if colno0 == colno1:
             return 1
         cc_colno0 = crosscat_cc_colno(bdb, generator_id, colno0)
@@ -1030,7 +1161,7 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
         count = 0
         nmodels = 0
         for X_L, X_D in self._crosscat_latent_stata(bdb, generator_id,
-                modelno):
+                modelnos):
             nmodels += 1
             assignments = X_L['column_partition']['assignments']
             if assignments[cc_colno0] != assignments[cc_colno1]:
@@ -1040,7 +1171,6 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
 
     def column_mutual_information(self, bdb, generator_id, modelnos, colnos0,
             colnos1, constraints=None, numsamples=None):
-        modelno = self.get_modelno(bdb, modelnos)
         if numsamples is None:
             numsamples = 100
         # XXX Raise error about ignored constraints.
@@ -1050,12 +1180,12 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 'mutual information: %s, %s' % (colnos0, colnos1))
         colno0 = colnos0[0]
         colno1 = colnos1[0]
-        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
-        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelnos)
+        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelnos)
         cc_colno0 = crosscat_cc_colno(bdb, generator_id, colno0)
         cc_colno1 = crosscat_cc_colno(bdb, generator_id, colno1)
         r = self._crosscat.mutual_information(
-            seed=crosscat_seed(bdb),
+            seed=crosscat_seed(bdb, generator_id),
             M_c=self._crosscat_metadata(bdb, generator_id),
             X_L_list=X_L_list,
             X_D_list=X_D_list,
@@ -1071,9 +1201,8 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
 
     def row_similarity(self, bdb, generator_id, modelnos, rowid, target_rowid,
             colnos):
-        modelno = self.get_modelno(bdb, modelnos)
-        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
-        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelnos)
+        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelnos)
         [given_row_id, target_row_id], X_L_list, X_D_list = \
             self._crosscat_get_rows(bdb, generator_id, [rowid, target_rowid],
                 X_L_list, X_D_list)
@@ -1087,21 +1216,55 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                 for colno in colnos],
         )
 
+    def row_similarities(self, bdb, generator_id, modelnos, target_rowid,
+            colnos):
+        # Similarity of two rows in a model is whether they share a
+        # cluster in the view of each column, so count, for every
+        # subsampled row at once, the memberships it shares with the
+        # target row's clusters.  Rows outside the subsample, which
+        # must be inserted into the models first, are left to
+        # row_similarity.
+        cursor = bdb.sql_execute('''
+            SELECT sql_rowid, cc_row_id FROM bayesdb_crosscat_subsample
+                WHERE generator_id = ?
+        ''', (generator_id,))
+        row_ids = dict(cursor)
+        if target_rowid not in row_ids:
+            return None
+        target_row_id = row_ids[target_rowid]
+        cc_colnos = [crosscat_cc_colno(bdb, generator_id, colno)
+            for colno in colnos]
+        counts = {}
+        nmemberships = 0
+        for X_L, X_D in self._crosscat_latent_stata(
+                bdb, generator_id, modelnos):
+            assignments = X_L['column_partition']['assignments']
+            for cc_colno in cc_colnos:
+                Z = X_D[assignments[cc_colno]]
+                cluster = Z[target_row_id]
+                for row_id, z in enumerate(Z):
+                    if z == cluster:
+                        counts[row_id] = counts.get(row_id, 0) + 1
+                nmemberships += 1
+        if nmemberships == 0:
+            return None
+        return dict((rowid, counts.get(row_id, 0) / float(nmemberships))
+            for rowid, row_id in row_ids.iteritems())
+
     def predict_confidence(self, bdb, generator_id, modelnos, rowid, colno,
             numsamples=None):
-        modelno = self.get_modelno(bdb, modelnos)
         if numsamples is None:
             numsamples = 100    # XXXWARGHWTF
         M_c = self._crosscat_metadata(bdb, generator_id)
         row = core.bayesdb_generator_row_values(bdb, generator_id, rowid)
-        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
-        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelnos)
+        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelnos)
         row_id, X_L_list, X_D_list = \
             self._crosscat_get_row(bdb, generator_id, rowid, X_L_list,
                 X_D_list)
         cc_colno = crosscat_cc_colno(bdb, generator_id, colno)
         code, confidence = self._crosscat.impute_and_confidence(
-            seed=crosscat_seed(bdb),
+            seed=crosscat_seed(bdb, generator_id),
             M_c=M_c,
             X_L=X_L_list,
             X_D=X_D_list,
@@ -1120,7 +1283,6 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
 
     def simulate_joint(self, bdb, generator_id, modelnos, rowid, targets,
             constraints, num_samples=1, accuracy=None):
-        modelno = self.get_modelno(bdb, modelnos)
         M_c = self._crosscat_metadata(bdb, generator_id)
         # An invalid constraint value should result in a BQL error.
         if constraints is None:
@@ -1133,15 +1295,15 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
                     # Constraint that has no code
                     raise BQLError(bdb,
                         'Unknown constraints: %s' % (repr(constraints)),)
-        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
-        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelnos)
+        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelnos)
         Q, Y, X_L_list, X_D_list = self._crosscat_remap_two(
             bdb, generator_id, X_L_list, X_D_list,
             [(rowid, t) for t in targets],
             [(rowid, c, v) for (c, v) in constraints],
         )
         raw_outputs = self._crosscat.simple_predictive_sample(
-            seed=crosscat_seed(bdb),
+            seed=crosscat_seed(bdb, generator_id),
             M_c=M_c,
             X_L=X_L_list,
             X_D=X_D_list,
@@ -1155,7 +1317,6 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
 
     def logpdf_joint(self, bdb, generator_id, modelnos, rowid, targets,
             constraints,):
-        modelno = self.get_modelno(bdb, modelnos)
         M_c = self._crosscat_metadata(bdb, generator_id)
         try:
             for colno, value in constraints:
@@ -1169,8 +1330,8 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
         except KeyError:
             # Probability of value that has no code
             return float('-inf')
-        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelno)
-        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelno)
+        X_L_list = self._crosscat_latent_state(bdb, generator_id, modelnos)
+        X_D_list = self._crosscat_latent_data(bdb, generator_id, modelnos)
         Q, Y, X_L_list, X_D_list = self._crosscat_remap_two(
             bdb, generator_id, X_L_list, X_D_list,
             [(rowid, c, v) for (c, v) in targets],
@@ -1185,13 +1346,6 @@ class CrosscatMetamodel(metamodel.IBayesDBMetamodel):
         )
         return r
 
-    def get_modelno(self, bdb, modelnos):
-        if modelnos is None:
-            return None
-        if len(modelnos) > 1:
-            raise BQLError(bdb, 'CrossCat accepts only 1 model number.')
-        return modelnos[0]
-
 class CrosscatCache(object):
     def __init__(self):
         self.metadata = {}
@@ -1225,14 +1379,23 @@ def create_metadata_cyclic(_bdb, _generator_id, _colno):
 
 def create_metadata_categorical(bdb, generator_id, colno):
     table = core.bayesdb_generator_table(bdb, generator_id)
-    column_name = core.bayesdb_table_column_name(bdb, table, colno)
-    qt = sqlite3_quote_name(table)
-    qcn = sqlite3_quote_name(column_name)
-    sql = '''
-        SELECT DISTINCT CAST(%s AS TEXT)
-            FROM %s WHERE %s IS NOT NULL ORDER BY %s
-    ''' % (qcn, qt, qcn, qcn)
-    cursor = bdb.sql_execute(sql)
+    stats = colstats.bayesdb_column_stats(bdb, table, colno)
+    if stats is not None and stats.ndistinct is not None:
+        cursor = bdb.sql_execute('''
+            SELECT DISTINCT CAST(value AS TEXT)
+                FROM bayesdb_column_stats_value
+                WHERE tabname = ? AND colno = ?
+                ORDER BY value
+        ''', (table, colno))
+    else:
+        column_name = core.bayesdb_table_column_name(bdb, table, colno)
+        qt = sqlite3_quote_name(table)
+        qcn = sqlite3_quote_name(column_name)
+        sql = '''
+            SELECT DISTINCT CAST(%s AS TEXT)
+                FROM %s WHERE %s IS NOT NULL ORDER BY %s
+        ''' % (qcn, qt, qcn, qcn)
+        cursor = bdb.sql_execute(sql)
     codes = [row[0] for row in cursor]
     assert all(isinstance(value, unicode) for value in codes)
     ncodes = len(codes)
@@ -1341,8 +1504,70 @@ def crosscat_gen_column_dependencies(bdb, generator_id):
     '''
     return bdb.sql_execute(sql, (generator_id,)).fetchall()
 
-def crosscat_seed(bdb):
+def _crosscat_initialize_parallel(pool, crosscat, seed, M_c, T, n_chains,
+        initialization, row_initialization):
+    """Initialize `n_chains` Crosscat models in `pool`.
+
+    The models are the same as `crosscat.initialize` would give with
+    the same arguments: each gets the seed the engine would give it.
+    """
+    # Not `import crosscat...', which would find this module.
+    make_get_next_seed = importlib.import_module('crosscat.LocalEngine') \
+        .make_get_next_seed
+    # XXX Rely on the engine's arguments for its do_initialize: the
+    # seed, M_c, M_r, T, and then the rest, of which the workers need
+    # only the seed, M_r, and the rest.
+    arg_tuples = crosscat.get_initialize_arg_tuples(M_c, None, T,
+        initialization, row_initialization, n_chains,
+        (), (), (), (), 31, make_get_next_seed(seed))
+    arg_tuples = [(args[0], args[2]) + tuple(args[4:])
+        for args in arg_tuples]
+    chain_tuples = pool.map(_crosscat_process_initialize, arg_tuples)
+    X_L_list, X_D_list = zip(*chain_tuples)
+    return list(X_L_list), list(X_D_list)
+
+def _crosscat_analyze_parallel(pool, crosscat, **kwargs):
+    """Analyze Crosscat models in `pool` as `crosscat.analyze` would.
+
+    The keyword arguments are as for `crosscat.analyze`, and the seeds,
+    results, and diagnostics are the same as it would give.
+    """
+    # XXX Rely on the engine's analyze calling its mapper with its
+    # do_analyze and arguments: the seed, X_L, X_D, M_c, T, and then
+    # the rest, of which the workers need all but M_c and T.
+    def mapper(_do_analyze, arg_tuples):
+        arg_tuples = [tuple(args[0:3]) + tuple(args[5:])
+            for args in arg_tuples]
+        return pool.map(_crosscat_process_analyze, arg_tuples)
+    engine = copy.copy(crosscat)
+    engine.mapper = mapper
+    return engine.analyze(**kwargs)
+
+# State of each process in a pool for Crosscat models.
+_crosscat_process_state = None
+
+def _crosscat_process_init(do_initialize, do_analyze, M_c, data):
+    global _crosscat_process_state
+    validator = crosscat_theta_validator.Validator()
+    _crosscat_process_state = \
+        (do_initialize, do_analyze, M_c, data.array(), validator)
+
+def _crosscat_process_initialize(args):
+    do_initialize, _do_analyze, M_c, T, _validator = _crosscat_process_state
+    seed, M_r = args[0:2]
+    return do_initialize((seed, M_c, M_r, T) + tuple(args[2:]))
+
+def _crosscat_process_analyze(args):
+    _do_initialize, do_analyze, M_c, T, _validator = _crosscat_process_state
+    return do_analyze(tuple(args[0:3]) + (M_c, T) + tuple(args[3:]))
+
+def _crosscat_process_validate(theta):
+    _do_initialize, _do_analyze, _M_c, _T, validator = \
+        _crosscat_process_state
+    validator.validate(theta)
+
+def crosscat_seed(bdb, generator_id):
     # XXX Pass a 32-byte seed from weakprng once Crosscat supports
     # that.  Crosscat Github issue #93:
     # https://github.com/probcomp/crosscat/issues/93
-    return bdb.py_prng.randrange(2**32)
+    return bdb.substream(generator_id).weakrandom32()
@@ -25,8 +25,10 @@ interface for the NIG-Normal model.
 """
 
 import math
+import numpy
 import random
 
+import bayeslite.colstats as colstats
 import bayeslite.core as core
 import bayeslite.metamodel as metamodel
 
@@ -310,15 +312,16 @@ class NIGNormalMetamodel(metamodel.IBayesDBMetamodel):
         # Note: The constraints are irrelevant for the same reason as
         # in simulate_joint.
         (all_mus, all_sigmas) = self._all_mus_sigmas(bdb, generator_id)
-        def model_log_pdf(modelno):
-            mus = all_mus[modelno]
-            sigmas = all_sigmas[modelno]
-            def logpdf_1((colno, x)):
-                return self._logpdf_1(bdb, generator_id, mus, sigmas, colno, x)
-            return sum(map(logpdf_1, targets))
         # XXX Ignore modelnos and aggregate over all of them.
-        modelwise = [model_log_pdf(m) for m in sorted(all_mus.keys())]
-        return logmeanexp(modelwise)
+        all_modelnos = sorted(all_mus.keys())
+        # Array of log densities by model and target.
+        logpdfs = numpy.array([
+            self._logpdf_1(bdb, generator_id, all_mus[m], all_sigmas[m],
+                colno, x)
+            for m in all_modelnos
+            for colno, x in targets
+        ]).reshape((len(all_modelnos), len(targets)))
+        return logmeanexp(numpy.sum(logpdfs, axis=1))
 
     def _logpdf_1(self, bdb, generator_id, mus, sigmas, colno, x):
         if colno < 0:
@@ -438,6 +441,10 @@ def logpdf_gaussian(x, mu, sigma):
 
 def data_suff_stats(bdb, table, column_name):
     # This is incorporate/remove in bulk, reading from the database.
+    colno = core.bayesdb_table_column_number(bdb, table, column_name)
+    stats = colstats.bayesdb_column_stats(bdb, table, colno)
+    if stats is not None and stats.nulls == 0:
+        return (stats.count, stats.sum, stats.sumsq)
     qt = sqlite3_quote_name(table)
     qcn = sqlite3_quote_name(column_name)
     # TODO Do this computation inside the database?
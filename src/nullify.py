@@ -14,17 +14,61 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+from .colstats import bayesdb_column_stats_forget
 from .sqlite3_util import sqlite3_quote_name
+from .util import cursor_value
+
+# Columns per UPDATE, well under sqlite3's expression depth limit.
+_COLUMN_BATCH = 100
 
 
 def bayesdb_nullify(bdb, table, value, columns=None):
+    """Replace `value` by NULL in `columns` of `table`.
+
+    `value` may be a single value or a list, tuple, or set of values,
+    all of which are replaced.  If `columns` is None, all columns of
+    `table` are nullified.  Returns the number of cells nullified.
+
+    The table is rewritten in one UPDATE per batch of columns, after a
+    query to count the cells it will nullify.
+    """
     qt = sqlite3_quote_name(table)
     if columns is None:
         cursor = bdb.sql_execute('PRAGMA table_info(%s)' % (qt,))
         columns = [row[1] for row in cursor]
-    changes = bdb._sqlite3.totalchanges()
-    for column in columns:
-        qc = sqlite3_quote_name(column)
-        bdb.sql_execute('UPDATE %s SET %s = NULL WHERE %s = ?' % (qt, qc, qc),
-            (value,))
-    return bdb._sqlite3.totalchanges() - changes
+    if isinstance(value, (list, tuple, set, frozenset)):
+        values = list(value)
+    else:
+        values = [value]
+    if len(columns) == 0 or len(values) == 0:
+        return 0
+    # Refer to each value by number so that the number of parameters
+    # does not grow with the number of columns.
+    qvs = ', '.join('?%d' % (i + 1,) for i in xrange(len(values)))
+    count = 0
+    with bdb.savepoint():
+        # sqlite3 limits the depth of the OR and + expressions, so
+        # nullify the columns in batches.
+        for i in xrange(0, len(columns), _COLUMN_BATCH):
+            batch = columns[i:i + _COLUMN_BATCH]
+            count += _nullify_batch(bdb, table, batch, qvs, values)
+    return count
+
+def _nullify_batch(bdb, table, columns, qvs, values):
+    qt = sqlite3_quote_name(table)
+    qcs = [sqlite3_quote_name(column) for column in columns]
+    matches = ['%s IN (%s)' % (qc, qvs) for qc in qcs]
+    count_sql = 'SELECT COALESCE(SUM(%s), 0) FROM %s WHERE %s' % (
+        ' + '.join('COALESCE(%s, 0)' % (match,) for match in matches),
+        qt, ' OR '.join(matches))
+    update_sql = 'UPDATE %s SET %s WHERE %s' % (
+        qt,
+        ', '.join('%s = CASE WHEN %s THEN NULL ELSE %s END' %
+            (qc, match, qc) for qc, match in zip(qcs, matches)),
+        ' OR '.join(matches))
+    count = cursor_value(bdb.sql_execute(count_sql, values))
+    if count != 0:
+        # Spare every row the triggers that forget column statistics.
+        bayesdb_column_stats_forget(bdb, table)
+        bdb.sql_execute(update_sql, values)
+    return count
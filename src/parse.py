@@ -113,6 +113,136 @@ def bql_string_complete_p(string):
         return True
     return (not nonsemi) or (semantics.phrase is not None)
 
+class BQLIncrementalParser(object):
+    """Parser of BQL phrases in text that arrives a piece at a time.
+
+    Feed it text as it comes, and it yields each phrase as soon as the
+    text closes it, without scanning or parsing again what came
+    before::
+
+        parser = BQLIncrementalParser()
+        for line in f:
+            for phrase, string in parser.feed(line):
+                ...
+        for phrase, string in parser.close():
+            ...
+
+    `phrase` is the parsed AST and `string` is its text.  A syntax
+    error raises :exc:`~bayeslite.BQLParseError` at once, and the
+    parser starts afresh with the next text fed to it.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._semantics = BQLSemantics()
+        self._parser = grammar.Parser(self._semantics)
+        # Text from the start of the phrase in progress, and how much
+        # of it has been scanned.
+        self._buffer = ''
+        self._start = 0
+        self._scanned = 0
+        self._nonsemi = False
+        self._n_numpar = 0
+        self._nampar_map = {}
+
+    def incomplete(self):
+        """True if a phrase has begun but not been closed."""
+        return self._nonsemi or self._buffer[self._scanned:].strip() != ''
+
+    def feed(self, text):
+        """Add `text` and yield ``(phrase, string)`` for each phrase closed.
+
+        Phrases not yet yielded when the caller stops iterating are
+        yielded by the next call to :meth:`feed` or :meth:`close`.
+        """
+        self._buffer = self._buffer[self._start:] + text
+        self._scanned -= self._start
+        self._start = 0
+        return self._parse(False)
+
+    def close(self):
+        """End the text and yield ``(phrase, string)`` for what is left.
+
+        Like the end of a string for :func:`parse_bql_string`, the end
+        of the text closes the last phrase.  The parser is then ready
+        for new text.
+        """
+        return self._parse(True)
+
+    def _parse(self, final):
+        semantics = self._semantics
+        stream = _TextSoFar(self._buffer)
+        stream.seek(self._scanned)
+        scanner = scan.BQLScanner(stream, '(string)')
+        base = self._scanned
+        scanner.n_numpar = self._n_numpar
+        scanner.nampar_map = self._nampar_map
+        while True:
+            n_numpar = scanner.n_numpar
+            nampar_map = dict(scanner.nampar_map)
+            token = scanner.read()
+            end = base + scanner.cur_pos
+            if not final and stream.exhausted and \
+                    token[0] != grammar.T_SEMI:
+                # The scanner looked for the end of the token in text
+                # yet to come, so scan it again then.  Whitespace and
+                # comments before a line break are done with, though.
+                if token[0] == 0 and scanner.state_name == '' and \
+                        self._buffer.endswith('\n'):
+                    self._scanned = len(self._buffer)
+                self._n_numpar = n_numpar
+                self._nampar_map = nampar_map
+                return
+            self._scanned = end
+            semantics.context.append(token)
+            if token[0] == -1:      # error
+                semantics.syntax_error(token)
+            else:
+                if token[0] == 0:   # EOF
+                    # Implicit ; at EOF.
+                    self._parser.feed((grammar.T_SEMI, ''))
+                self._parser.feed(token)
+            if token[0] not in (0, grammar.T_SEMI):
+                self._nonsemi = True
+            if 0 < len(semantics.errors) or semantics.failed:
+                errors = semantics.errors or ['parse failed mysteriously!']
+                self._reset()
+                raise BQLParseError(errors)
+            if semantics.phrase is not None:
+                phrase = semantics.phrase
+                if 0 < scanner.n_numpar:
+                    phrase = ast.Parametrized(phrase, scanner.n_numpar,
+                        scanner.nampar_map)
+                string = self._buffer[self._start:end].strip()
+                # Start the next phrase afresh, with its own parameters
+                # and its own context for error messages.
+                semantics.phrase = None
+                semantics.context = []
+                self._start = end
+                self._nonsemi = False
+                scanner.n_numpar = self._n_numpar = 0
+                scanner.nampar_map = self._nampar_map = {}
+                yield phrase, string
+            elif not self._nonsemi:
+                # Empty phrase.
+                self._start = end
+            if token[0] == 0:       # EOF
+                self._reset()
+                return
+
+class _TextSoFar(StringIO.StringIO):
+    """Stream of text that notes when a reader has run out of it."""
+
+    exhausted = False
+
+    def read(self, n=-1):
+        data = StringIO.StringIO.read(self, n)
+        if not data:
+            self.exhausted = True
+        return data
+
 class BQLSemantics(object):
     def __init__(self):
         self.phrase = None
@@ -330,6 +460,9 @@ class BQLSemantics(object):
             modelnos):
         return ast.Regress(target, givens, nsamp, pop, metamodel, modelnos)
 
+    def p_command_explain(self, q):
+        return ast.Explain(q)
+
     def p_simulate_s(self, cols, population, generator, modelnos, constraints,
             lim, acc):
         for c in cols:
@@ -383,11 +516,11 @@ class BQLSemantics(object):
     def p_select_s(self, quant, cols, tabs, cond, grouping, ord, lim):
         return ast.Select(quant, cols, tabs, cond, grouping, ord, lim)
 
-    def p_estimate_e(self, quant, cols, tabs, generator, modelnos, cond,
-            grouping, ord, lim):
+    def p_estimate_e(self, quant, cols, tabs, generator, modelnos, sample,
+            cond, grouping, ord, lim):
         constructor = tabs
-        return constructor(quant, cols, generator, modelnos, cond, grouping,
-            ord, lim)
+        return constructor(quant, cols, generator, modelnos, sample, cond,
+            grouping, ord, lim)
 
     def p_estcol_e(self):
         self.errors.append("deprecated `ESTIMATE COLUMNS'"
@@ -452,21 +585,32 @@ class BQLSemantics(object):
     def p_from_sel_opt_nonempty(self, tables):  return tables
 
     def p_from_est_row(self, name):
-        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
-            return ast.Estimate(quant, cols, name, generator, modelnos, cond,
-                grouping, ord, lim)
+        def c(quant, cols, generator, modelnos, sample, cond, grouping, ord,
+                lim):
+            return ast.Estimate(quant, cols, name, generator, modelnos, sample,
+                cond, grouping, ord, lim)
         return c
     def p_from_est_pairrow(self, name):
-        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+        def c(quant, cols, generator, modelnos, sample, cond, grouping, ord,
+                lim):
+            if sample is not None:
+                self.errors.append('SAMPLE in ESTIMATE ... FROM PAIRWISE')
             return ast.EstPairRow(cols, name, generator, modelnos, cond, ord,
                 lim)
         return c
     def p_from_est_col(self, name):
-        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+        def c(quant, cols, generator, modelnos, sample, cond, grouping, ord,
+                lim):
+            if sample is not None:
+                self.errors.append('SAMPLE in ESTIMATE ... FROM COLUMNS OF')
             return ast.EstCols(cols, name, generator, modelnos, cond, ord, lim)
         return c
     def p_from_est_paircol(self, name, subcols):
-        def c(quant, cols, generator, modelnos, cond, grouping, ord, lim):
+        def c(quant, cols, generator, modelnos, sample, cond, grouping, ord,
+                lim):
+            if sample is not None:
+                self.errors.append(
+                    'SAMPLE in ESTIMATE ... FROM PAIRWISE COLUMNS OF')
             return ast.EstPairCols(cols, name, subcols, generator, modelnos,
                 cond, ord, lim)
         return c
@@ -476,6 +620,18 @@ class BQLSemantics(object):
 
     def p_usingmodel_opt_none(self):            return None
     def p_usingmodel_opt_some(self, modelnos):  return modelnos
+    def p_usingmodel_opt_top(self, k):
+        return ast.ModelSubset(ast.MODELSUBSET_TOP, k)
+    def p_usingmodel_opt_random(self, k):
+        return ast.ModelSubset(ast.MODELSUBSET_RANDOM, k)
+
+    def p_sample_opt_none(self):                return None
+    def p_sample_opt_rows(self, n):
+        return ast.Sample(ast.SAMPLE_ROWS, n)
+    def p_sample_opt_percent_int(self, p):
+        return ast.Sample(ast.SAMPLE_PERCENT, p)
+    def p_sample_opt_percent_float(self, p):
+        return ast.Sample(ast.SAMPLE_PERCENT, p)
 
     def p_select_tables_one(self, t):           return [t]
     def p_select_tables_many(self, ts, t):      ts.append(t); return ts
@@ -651,8 +807,12 @@ class BQLSemantics(object):
 
     def p_bqlfn_depprob(self, cols):            return ast.ExpBQLDepProb(*cols)
 
-    def p_bqlfn_mutinf(self, cols, constraints, nsamp):
-        return ast.ExpBQLMutInf(cols[0], cols[1], constraints, nsamp)
+    def p_bqlfn_mutinf(self, cols, constraints, nsamp, tol):
+        return ast.ExpBQLMutInf(
+            cols[0], cols[1], constraints, nsamp, tol, False)
+    def p_bqlfn_mutinf_stderr(self, cols, constraints, nsamp, tol):
+        return ast.ExpBQLMutInf(
+            cols[0], cols[1], constraints, nsamp, tol, True)
     def p_bqlfn_prob_est(self, e):              return ast.ExpBQLProbEst(e)
 
     def p_predrel_of_opt_none(self):            return None
@@ -701,6 +861,9 @@ class BQLSemantics(object):
     def p_nsamples_opt_none(self):              return None
     def p_nsamples_opt_some(self, nsamples):    return nsamples
 
+    def p_tolerance_opt_none(self):             return None
+    def p_tolerance_opt_some(self, tol):        return tol
+
     def p_column_lists_one(self, collist):
         return [collist]
     def p_column_lists_many(self, collists, collist):
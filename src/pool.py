@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Concurrent read-only BQL queries on one BayesDB file.
+
+A :class:`BayesDBPool` holds one writer handle and several read-only
+handles on the same file, which it puts in SQLite's write-ahead log
+mode so that readers and the writer do not block one another::
+
+    with BayesDBPool('foo.bdb', nreaders=4) as pool:
+        analysis = threading.Thread(target=pool.writer.execute,
+            args=('ANALYZE foo_cc FOR 10 MINUTES WAIT',))
+        analysis.start()
+        results = [pool.submit('ESTIMATE ... FROM foo LIMIT ?', (k,))
+            for k in xrange(100)]
+        for result in results:
+            print result.get()
+        analysis.join()
+
+Each query a reader runs sees the database as of the last commit by
+the writer before the query started.  A BayesDB handle may be used by
+only one thread at a time, so use the writer from only one thread.
+"""
+
+import Queue
+import contextlib
+import multiprocessing
+import multiprocessing.pool
+
+from bayeslite.bayesdb import bayesdb_open
+
+# Milliseconds a handle waits for another to release a lock.
+_BUSY_TIMEOUT = 10000
+
+class BayesDBPool(object):
+    """Pool of BayesDB handles on one file for concurrent queries.
+
+    `pool.writer` is a BayesDB handle for modifying the database,
+    e.g. with ``ANALYZE``.  Read-only BQL queries submitted to the pool
+    run on one of `nreaders` read-only handles, in threads, or in
+    worker processes if `processes` is true.  Readers in threads share
+    metamodels and the latent state they load from the database;
+    readers in processes run truly in parallel.
+
+    `builtin_metamodels`, `seed`, `version`, and `storage_profile` are
+    as for :func:`~bayeslite.bayesdb_open`.  The journal mode is always
+    ``'wal'``.
+    """
+
+    def __init__(self, pathname, nreaders=None, processes=None,
+            builtin_metamodels=None, seed=None, version=None,
+            storage_profile=None):
+        if nreaders is None:
+            nreaders = multiprocessing.cpu_count()
+        if not 0 < nreaders:
+            raise ValueError('Need at least one reader: %r' % (nreaders,))
+        self.pathname = pathname
+        self.writer = bayesdb_open(pathname=pathname,
+            builtin_metamodels=builtin_metamodels, seed=seed,
+            version=version, storage_profile=storage_profile)
+        self.writer._sqlite3.setbusytimeout(_BUSY_TIMEOUT)
+        mode = self.writer.sql_execute('PRAGMA journal_mode = WAL')
+        if mode.fetchvalue() != 'wal':
+            self.writer.close()
+            raise ValueError('Cannot share database: %r' % (pathname,))
+        args = (pathname, builtin_metamodels, seed, storage_profile)
+        self._processes = bool(processes)
+        self._readers = Queue.Queue()
+        if processes:
+            self._workers = multiprocessing.Pool(nreaders,
+                initializer=_process_init, initargs=args)
+        else:
+            for _ in xrange(nreaders):
+                reader = _open_reader(*args)
+                reader.pool = self
+                self._readers.put(reader)
+            self._workers = multiprocessing.pool.ThreadPool(nreaders)
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def close(self):
+        """Close all handles in the pool.  Further use is not allowed."""
+        self._workers.terminate()
+        self._workers.join()
+        handles = []
+        while True:
+            try:
+                handles.append(self._readers.get_nowait())
+            except Queue.Empty:
+                break
+        handles.append(self.writer)
+        # Metamodels outlive the pool, so they must let go of what its
+        # readers shared.
+        metamodels = []
+        for bdb in handles:
+            for metamodel in bdb.metamodels.values():
+                if metamodel not in metamodels:
+                    metamodels.append(metamodel)
+        for metamodel in metamodels:
+            metamodel.forget_pool(self)
+        for bdb in handles:
+            bdb.close()
+
+    @contextlib.contextmanager
+    def reader(self):
+        """Context for using a read-only handle from the pool.
+
+        Waits until a reader is free, and returns it to the pool on
+        exit.  Only readers in threads can be used this way.
+        """
+        if self._processes:
+            raise ValueError('Readers are in worker processes.')
+        reader = self._readers.get()
+        try:
+            yield reader
+        finally:
+            self._readers.put(reader)
+
+    def execute(self, string, bindings=None, timeout=None):
+        """Execute a read-only BQL query on a free reader.
+
+        Returns the list of all result rows.  `string`, `bindings`,
+        and `timeout` are as for :meth:`~bayeslite.BayesDB.execute`.
+        """
+        if self._processes:
+            return self.submit(string, bindings, timeout).get()
+        return self._thread_execute(string, bindings, timeout)
+
+    def submit(self, string, bindings=None, timeout=None):
+        """Submit a read-only BQL query to run on the next free reader.
+
+        Returns an object whose ``get`` method waits for the query
+        and returns the list of all result rows, or raises its
+        exception.
+        """
+        if self._processes:
+            return self._workers.apply_async(_process_execute,
+                (string, bindings, timeout))
+        return self._workers.apply_async(self._thread_execute,
+            (string, bindings, timeout))
+
+    def _thread_execute(self, string, bindings, timeout):
+        with self.reader() as reader:
+            return reader.execute(string, bindings, timeout).fetchall()
+
+def _open_reader(pathname, builtin_metamodels, seed, storage_profile):
+    reader = bayesdb_open(pathname=pathname,
+        builtin_metamodels=builtin_metamodels, seed=seed, readonly=True,
+        storage_profile=storage_profile)
+    reader._sqlite3.setbusytimeout(_BUSY_TIMEOUT)
+    return reader
+
+# The reader of each worker process.
+_process_reader = None
+
+def _process_init(*args):
+    global _process_reader
+    _process_reader = _open_reader(*args)
+
+def _process_execute(string, bindings, timeout):
+    return _process_reader.execute(string, bindings, timeout).fetchall()
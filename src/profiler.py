@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Profiling where the time of BQL queries goes.
+
+Install a profiler with :meth:`~bayeslite.BayesDB.profile`, run some
+queries, and remove it with :meth:`~bayeslite.BayesDB.unprofile`::
+
+    profiler = BayesDBProfiler()
+    bdb.profile(profiler)
+    bdb.execute('ESTIMATE SIMILARITY TO (rowid = 1) FROM p').fetchall()
+    bdb.unprofile(profiler)
+    for qid, query, phase, name, calls, total, self in profiler.report():
+        print qid, phase, name, calls, total, self
+
+The profiler records, for each BQL query id, the time spent in each
+phase of the query:
+
+``parse``
+    parsing the BQL string;
+``compile``
+    compiling the BQL AST to SQL;
+``wind``, ``unwind``
+    executing the SQL that sets up and tears down temporary tables;
+``sql``
+    executing SQL and stepping through its results, with name
+    ``execute`` or ``step``;
+``bqlfn``
+    each BQL function, such as ``bql_row_similarity``, called from
+    SQL;
+``metamodel``
+    each metamodel method, named ``<metamodel>.<method>``.
+
+Phases nest -- BQL functions run while stepping through SQL results,
+and metamodel methods run inside BQL functions.  The `total` time of a
+phase includes the time of phases nested inside it; the `self` time
+does not, so the `self` times of a query add up to the time spent in
+it.  Time spent outside any query, e.g. in
+:meth:`~bayeslite.BayesDB.sql_execute` called directly, is recorded
+under query id ``None``.
+
+When the profiler is removed, its report is also stored in the
+temporary table ``bayesdb_profile``, which can be queried like any
+other table::
+
+    SELECT phase, name, SUM(self) FROM bayesdb_profile
+        GROUP BY phase, name ORDER BY SUM(self) DESC
+"""
+
+import time
+
+from bayeslite.sqlite3_util import sqlite3_quote_name
+
+class BayesDBProfiler(object):
+    """Profiler recording the time of each phase of each BQL query."""
+
+    def __init__(self):
+        self.queries = {}
+        self._stats = {}
+        self._stack = []
+
+    def start(self, qid, query, bindings):
+        """Called when the query with id `qid` is started."""
+        self.queries[qid] = query
+
+    def measure(self, qid, phase, name=None):
+        """Return a context manager timing `phase` of query `qid`."""
+        return _ProfilerMeasure(self, (qid, phase, name))
+
+    def metamodel(self, qid_fn, metamodel):
+        """Return `metamodel` with its methods timed.
+
+        `qid_fn` is a function returning the id of the query in
+        progress when a method is called.
+        """
+        return _ProfiledMetamodel(self, qid_fn, metamodel)
+
+    def report(self):
+        """Return a list of profile records, slowest first.
+
+        Each record is a tuple ``(qid, query, phase, name, calls,
+        total, self)`` giving the number of calls to `phase` (or to
+        BQL function or metamodel method `name` in it) for the query
+        with id `qid`, and the total time and self time in seconds.
+        """
+        records = [
+            (qid, self.queries.get(qid), phase, name, s[0], s[1], s[2])
+            for (qid, phase, name), s in self._stats.iteritems()
+        ]
+        records.sort(key=lambda r: -r[6])
+        return records
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.queries.clear()
+        self._stats.clear()
+
+    def save(self, bdb, table=None):
+        """Store the report in the temporary table `table` in `bdb`.
+
+        `table` defaults to ``bayesdb_profile``.  Any rows already in
+        it are replaced.
+        """
+        if table is None:
+            table = 'bayesdb_profile'
+        qt = sqlite3_quote_name(table)
+        with bdb.savepoint():
+            bdb.sql_execute('''
+                CREATE TEMP TABLE IF NOT EXISTS %s (
+                    qid     INTEGER,
+                    query   TEXT,
+                    phase   TEXT NOT NULL,
+                    name    TEXT,
+                    calls   INTEGER NOT NULL,
+                    total   REAL NOT NULL,
+                    self    REAL NOT NULL
+                )
+            ''' % (qt,))
+            bdb.sql_execute('DELETE FROM %s' % (qt,))
+            sql = 'INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?, ?)' % (qt,)
+            for record in self.report():
+                bdb.sql_execute(sql, record)
+
+    def _enter(self, key):
+        self._stack.append([key, time.time(), 0.])
+
+    def _exit(self, key):
+        key_, start, nested = self._stack.pop()
+        assert key_ == key
+        elapsed = time.time() - start
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = [0, 0., 0.]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - nested
+        if 0 < len(self._stack):
+            self._stack[-1][2] += elapsed
+
+class _ProfilerMeasure(object):
+    def __init__(self, profiler, key):
+        self._profiler = profiler
+        self._key = key
+    def __enter__(self):
+        self._profiler._enter(self._key)
+    def __exit__(self, *_exc_info):
+        self._profiler._exit(self._key)
+        return False
+
+class _ProfiledMetamodel(object):
+    def __init__(self, profiler, qid_fn, metamodel):
+        self._profiler = profiler
+        self._qid_fn = qid_fn
+        self._metamodel = metamodel
+    def __getattr__(self, attr):
+        value = getattr(self._metamodel, attr)
+        if attr.startswith('_') or not callable(value):
+            return value
+        name = '%s.%s' % (self._metamodel.name(), attr)
+        def method(*args, **kwargs):
+            with self._profiler.measure(self._qid_fn(), 'metamodel', name):
+                return value(*args, **kwargs)
+        return method
@@ -16,6 +16,7 @@
 
 import csv
 
+import bayeslite.colstats as colstats
 import bayeslite.core as core
 
 from bayeslite.sqlite3_util import sqlite3_quote_name
@@ -111,6 +112,8 @@ def bayesdb_read_csv(bdb, table, f, header=False,
         # execute a cursor, which also binds and steps the statement.
         sql = 'INSERT INTO %s (%s) VALUES (%s)' % \
             (qt, ','.join(qcns), ','.join('?' for _qcn in qcns))
+        # Spare every row the triggers that forget column statistics.
+        colstats.bayesdb_column_stats_forget(bdb, table)
         for row in reader:
             if len(row) < ncols:
                 raise IOError('Line %d: Too few columns: %d < %d' %
@@ -16,6 +16,7 @@
 
 """Reading data from pandas dataframes."""
 
+import bayeslite.colstats as colstats
 import bayeslite.core as core
 
 from bayeslite.sqlite3_util import sqlite3_quote_name
@@ -82,5 +83,7 @@ def bayesdb_read_pandas_df(bdb, table, df, create=False, ifnotexists=False,
         qicns = map(sqlite3_quote_name, insert_column_names)
         sql = 'INSERT INTO %s (%s) VALUES (%s)' % \
             (qt, ','.join(qicns), ','.join('?' for _qicn in qicns))
+        # Spare every row the triggers that forget column statistics.
+        colstats.bayesdb_column_stats_forget(bdb, table)
         for key, i in zip(key_index, df.index):
             bdb.sql_execute(sql, (key,) + tuple(df.ix[i]))
@@ -65,10 +65,12 @@ keywords = {
     "drop": grammar.K_DROP,
     "else": grammar.K_ELSE,
     "end": grammar.K_END,
+    "error": grammar.K_ERROR,
     "escape": grammar.K_ESCAPE,
     "estimate": grammar.K_ESTIMATE,
     "existing": grammar.K_EXISTING,
     "exists": grammar.K_EXISTS,
+    "explain": grammar.K_EXPLAIN,
     "explicit": grammar.K_EXPLICIT,
     "for": grammar.K_FOR,
     "from": grammar.K_FROM,
@@ -92,6 +94,7 @@ keywords = {
     "latent": grammar.K_LATENT,
     "like": grammar.K_LIKE,
     "limit": grammar.K_LIMIT,
+    "logscore": grammar.K_LOGSCORE,
     "match": grammar.K_MATCH,
     "metamodel": grammar.K_METAMODEL,
     "minute": grammar.K_MINUTE,
@@ -109,11 +112,13 @@ keywords = {
     "or": grammar.K_OR,
     "order": grammar.K_ORDER,
     "pairwise": grammar.K_PAIRWISE,
+    "percent": grammar.K_PERCENT,
     "population": grammar.K_POPULATION,
     "predict": grammar.K_PREDICT,
     "predictive": grammar.K_PREDICTIVE,
     "probability": grammar.K_PROBABILITY,
     "pvalue": grammar.K_PVALUE,
+    "random": grammar.K_RANDOM,
     "regexp": grammar.K_REGEXP,
     "regress": grammar.K_REGRESS,
     "relevance": grammar.K_RELEVANCE,
@@ -121,6 +126,7 @@ keywords = {
     "rollback": grammar.K_ROLLBACK,
     "row": grammar.K_ROW,
     "rows": grammar.K_ROWS,
+    "sample": grammar.K_SAMPLE,
     "samples": grammar.K_SAMPLES,
     "schema": grammar.K_SCHEMA,
     "second": grammar.K_SECOND,
@@ -129,6 +135,7 @@ keywords = {
     "set": grammar.K_SET,
     "similarity": grammar.K_SIMILARITY,
     "simulate": grammar.K_SIMULATE,
+    "standard": grammar.K_STANDARD,
     "stattype": grammar.K_STATTYPE,
     "stattypes": grammar.K_STATTYPES,
     "table": grammar.K_TABLE,
@@ -137,6 +144,8 @@ keywords = {
     "the": grammar.K_THE,
     "then": grammar.K_THEN,
     "to": grammar.K_TO,
+    "tolerance": grammar.K_TOLERANCE,
+    "top": grammar.K_TOP,
     "unset": grammar.K_UNSET,
     "using": grammar.K_USING,
     "value": grammar.K_VALUE,
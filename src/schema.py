@@ -19,7 +19,7 @@ from bayeslite.util import cursor_value
 
 APPLICATION_ID = 0x42594442
 STALE_VERSIONS = (1,)
-USABLE_VERSIONS = (5, 6, 7, 8, 9, 10,)
+USABLE_VERSIONS = (5, 6, 7, 8, 9, 10, 11,)
 
 LATEST_VERSION = USABLE_VERSIONS[-1]
 
@@ -185,6 +185,33 @@ INSERT INTO bayesdb_rowid_tokens VALUES ('rowid');
 INSERT INTO bayesdb_rowid_tokens VALUES ('oid');
 '''
 
+bayesdb_schema_10to11 = '''
+PRAGMA user_version = 11;
+
+CREATE TABLE bayesdb_column_stats (
+    tabname     TEXT COLLATE NOCASE NOT NULL,
+    colno       INTEGER NOT NULL CHECK (0 <= colno),
+    count       INTEGER NOT NULL CHECK (0 <= count),
+    nulls       INTEGER NOT NULL CHECK (0 <= nulls),
+    ndistinct   INTEGER CHECK (0 <= ndistinct),
+    min,
+    max,
+    sum         REAL NOT NULL,
+    sumsq       REAL NOT NULL,
+    PRIMARY KEY(tabname, colno)
+);
+
+CREATE TABLE bayesdb_column_stats_value (
+    tabname     TEXT COLLATE NOCASE NOT NULL,
+    colno       INTEGER NOT NULL,
+    rank        INTEGER NOT NULL CHECK (0 <= rank),
+    value       NOT NULL,
+    count       INTEGER NOT NULL CHECK (0 < count),
+    PRIMARY KEY(tabname, colno, rank),
+    FOREIGN KEY(tabname, colno) REFERENCES bayesdb_column_stats(tabname, colno)
+);
+'''
+
 
 ### BayesDB SQLite setup
 
@@ -230,8 +257,15 @@ def bayesdb_install_schema(bdb, version=None, compatible=None):
         raise IOError('Unknown bayeslite db version: %d' % (user_version,))
     if user_version not in USABLE_VERSIONS:
         raise IOError('Unsupported bayeslite db version: %d' % (user_version,))
-    if install or not compatible:
-        _upgrade_schema(bdb, user_version, desired_version=version)
+    desired_version = LATEST_VERSION if version is None else version
+    if not install and (compatible or bdb.readonly or
+            desired_version <= user_version):
+        # Fast path: nothing to upgrade, or no upgrading a read-only
+        # database.  Skip the integrity checks, which read the whole
+        # database.
+        bdb.sql_execute('PRAGMA foreign_keys = ON')
+        return
+    _upgrade_schema(bdb, user_version, desired_version=version)
     bdb.sql_execute('PRAGMA foreign_keys = ON')
     bdb.sql_execute('PRAGMA integrity_check')
     bdb.sql_execute('PRAGMA foreign_key_check')
@@ -271,6 +305,10 @@ def _upgrade_schema(bdb, current_version=None, desired_version=None):
         with bdb.transaction():
             bdb.sql_execute(bayesdb_schema_9to10)
         current_version = 10
+    if current_version == 10 and current_version < desired_version:
+        with bdb.transaction():
+            bdb.sql_execute(bayesdb_schema_10to11)
+        current_version = 11
     bdb.sql_execute('PRAGMA integrity_check')
     bdb.sql_execute('PRAGMA foreign_key_check')
 
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Arrays shared with worker processes through a memory-mapped file.
+
+A :class:`SharedArray` writes an array once to a temporary file.
+Handing it to a worker process, by pickling or by forking, conveys
+only the name of the file, and each worker maps the file into memory
+read-only when it first asks for the array, so all the workers share
+one copy of the pages::
+
+    with SharedArray(T) as data:
+        pool = multiprocessing.Pool(initializer=init, initargs=(data,))
+        ...
+
+    def init(data):
+        global T
+        T = data.array()
+"""
+
+import numpy
+import os
+import tempfile
+
+class SharedArray(object):
+    """Read-only array in a file to share among processes.
+
+    The process that creates it owns the file, and deletes it on
+    :meth:`close`.
+    """
+
+    def __init__(self, array, dtype=None):
+        fd, self.pathname = tempfile.mkstemp(prefix='bayeslite',
+            suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.save(f, numpy.asarray(array, dtype=dtype))
+        except:
+            os.unlink(self.pathname)
+            raise
+        self._owner = os.getpid()
+        self._array = None
+
+    def __getstate__(self):
+        return {'pathname': self.pathname, '_owner': None, '_array': None}
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def array(self):
+        """Return the array, mapped read-only from the file."""
+        if self._array is None:
+            self._array = numpy.load(self.pathname, mmap_mode='r')
+        return self._array
+
+    def close(self):
+        """Delete the file, if this process owns it.
+
+        Processes that have already mapped the array keep it.
+        """
+        self._array = None
+        if self._owner == os.getpid():
+            self._owner = None
+            os.unlink(self.pathname)
@@ -15,6 +15,7 @@
 #   limitations under the License.
 
 import itertools
+import json
 
 import bayeslite.ast as ast
 import bayeslite.core as core
@@ -84,6 +85,9 @@ def simulate_models_rows(bdb, simulation):
             raise BQLError(bdb,
                 'PROBABILITY DENSITY OF simulation still unsupported.')
         elif isinstance(exp, ast.ExpBQLMutInf):
+            if exp.stderr:
+                raise BQLError(bdb, 'Standard error of mutual information'
+                    ' is not supported in SIMULATE.')
             colnos0 = [retrieve_variable(c) for c in exp.columns0]
             colnos1 = [retrieve_variable(c) for c in exp.columns1]
             constraint_args = ()
@@ -97,9 +101,17 @@ def simulate_models_rows(bdb, simulation):
             #
             # XXX fsaad@20170625: Setting modelnos = None arbitrarily, figure
             # out how to set the modelnos argument.
-            mi_lists = bqlfn._bql_column_mutual_information(
-                bdb, population_id, generator_id, None, colnos0, colnos1,
-                nsamples, *constraint_args)
+            if exp.tolerance is None:
+                mi_lists = bqlfn._bql_column_mutual_information(
+                    bdb, population_id, generator_id, None, colnos0, colnos1,
+                    nsamples, *constraint_args)
+            else:
+                tolerance = retrieve_literal(exp.tolerance)
+                mi_lists, _stderr = \
+                    bqlfn._bql_column_mutual_information_adaptive(
+                        bdb, population_id, generator_id, None,
+                        json.dumps(colnos0), json.dumps(colnos1),
+                        nsamples, tolerance, *constraint_args)
             return list(itertools.chain.from_iterable(mi_lists))
         else:
             raise BQLError(bdb,
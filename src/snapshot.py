@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Snapshots of the models of one generator.
+
+A snapshot is a small BayesDB file holding just what it takes to
+query one generator's models: the schema of its table, its population,
+and the generator with its metamodel's state -- category codes and
+latent states, e.g. Crosscat thetas or CGPM engines -- but none of the
+table's data unless asked, and no diagnostics or session history::
+
+    bayesdb_export_models(bdb, 'foo_cc', 'foo_cc.snapshot')
+
+A snapshot can be served directly, read-only and memory-mapped::
+
+    bdb = bayesdb_open(pathname='foo_cc.snapshot', readonly=True,
+        storage_profile='serve')
+
+or imported into another BayesDB, e.g. one with the same table, to
+replace an older version of the generator::
+
+    bayesdb_import_models(bdb, 'foo_cc.snapshot', replace=True)
+
+Queries about rows of the table need the rows the models were
+analyzed with: either export with ``data=True``, or import into a
+BayesDB whose table has the same rows.
+"""
+
+import contextlib
+import os
+
+import apsw
+
+import bayeslite.core as core
+
+from bayeslite.metamodel import bayesdb_metamodel_version
+from bayeslite.quote import bql_quote_name
+from bayeslite.sqlite3_util import sqlite3_quote_name
+from bayeslite.util import casefold
+from bayeslite.util import cursor_value
+
+SNAPSHOT_VERSION = 1
+
+# Name under which a snapshot is attached to the BayesDB.
+_SNAPSHOT = 'bayesdb_snapshot'
+
+# Tables of history or statistics not needed to query the models.
+_SNAPSHOT_OMIT = (
+    'bayesdb_column_stats',
+    'bayesdb_column_stats_value',
+    'bayesdb_crosscat_diagnostics',
+    'bayesdb_session',
+    'bayesdb_session_entries',
+)
+
+snapshot_schema_1 = '''
+CREATE TABLE bayesdb_snapshot_info (
+    version     INTEGER NOT NULL,
+    generator   TEXT COLLATE NOCASE NOT NULL,
+    data        BOOLEAN NOT NULL
+);
+'''
+
+def bayesdb_export_models(bdb, generator, pathname, data=False):
+    """Write a snapshot of the models of `generator` to `pathname`.
+
+    The file must not already exist.  If `data` is true, the snapshot
+    includes the rows of the generator's table too.
+    """
+    if os.path.exists(pathname):
+        raise ValueError('File already exists: %r' % (pathname,))
+    generator_id = core.bayesdb_get_generator(bdb, None, generator)
+    population_id = core.bayesdb_generator_population(bdb, generator_id)
+    table = core.bayesdb_generator_table(bdb, generator_id)
+    schema_sql = '''
+        SELECT type, name, tbl_name, sql FROM sqlite_master
+            WHERE type IN ('table', 'index') AND sql IS NOT NULL
+                AND (tbl_name LIKE 'bayesdb\\_%' ESCAPE '\\'
+                    OR tbl_name = ? COLLATE NOCASE)
+            ORDER BY rowid ASC
+    '''
+    schema = bdb.sql_execute(schema_sql, (table,)).fetchall()
+    tables = [name for type_, name, _tbl_name, _sql in schema
+        if type_ == 'table' and name.lower() not in _SNAPSHOT_OMIT]
+
+    # Create the schema with a connection of its own: the BayesDB can
+    # write to an attached database, but not create tables in it.
+    application_id = cursor_value(bdb.sql_execute('PRAGMA application_id'))
+    user_version = cursor_value(bdb.sql_execute('PRAGMA user_version'))
+    try:
+        snapshot = apsw.Connection(pathname)
+        try:
+            cursor = snapshot.cursor()
+            cursor.execute('PRAGMA application_id = %d' % (application_id,))
+            cursor.execute('PRAGMA user_version = %d' % (user_version,))
+            with snapshot:
+                for _type, _name, _tbl_name, sql in schema:
+                    cursor.execute(sql)
+                cursor.execute(snapshot_schema_1)
+                cursor.execute('''
+                    INSERT INTO bayesdb_snapshot_info
+                        (version, generator, data)
+                        VALUES (?, ?, ?)
+                ''', (SNAPSHOT_VERSION, generator, bool(data)))
+        finally:
+            snapshot.close()
+        with _attached(bdb, pathname):
+            with bdb.savepoint():
+                # Tables are copied in order of creation, which is not
+                # the order of their references after schema upgrades.
+                bdb.sql_execute('PRAGMA defer_foreign_keys = ON')
+                for name in tables:
+                    columns = _table_columns(bdb, 'main', name)
+                    if name.lower() == table.lower():
+                        if data:
+                            _copy_rows(bdb, 'main', _SNAPSHOT, name, '1',
+                                rowid=True)
+                    elif name == 'bayesdb_generator':
+                        _copy_rows(bdb, 'main', _SNAPSHOT, name, 'id = ?',
+                            (generator_id,))
+                    elif name == 'bayesdb_population':
+                        _copy_rows(bdb, 'main', _SNAPSHOT, name, 'id = ?',
+                            (population_id,))
+                    elif 'population_id' in columns:
+                        # Manifest variables have no generator.
+                        condition = 'population_id = ?'
+                        bindings = (population_id,)
+                        if 'generator_id' in columns:
+                            condition += ' AND (generator_id IS NULL' \
+                                ' OR generator_id = ?)'
+                            bindings += (generator_id,)
+                        _copy_rows(bdb, 'main', _SNAPSHOT, name, condition,
+                            bindings)
+                    elif 'generator_id' in columns:
+                        _copy_rows(bdb, 'main', _SNAPSHOT, name,
+                            'generator_id = ?', (generator_id,))
+                    elif 'tabname' in columns:
+                        _copy_rows(bdb, 'main', _SNAPSHOT, name,
+                            'tabname = ?', (table,))
+                    else:
+                        _copy_rows(bdb, 'main', _SNAPSHOT, name, '1')
+    except:
+        if os.path.exists(pathname):
+            os.unlink(pathname)
+        raise
+
+def bayesdb_import_models(bdb, pathname, name=None, replace=False):
+    """Import the generator in the snapshot at `pathname` into `bdb`.
+
+    The generator is named `name`, or by default as it was exported.
+    If `bdb` already has a generator by that name, it is dropped if
+    `replace` is true, and an error otherwise.  The population and
+    table are created as in the snapshot unless `bdb` already has them,
+    in which case they must have the same variables and columns.
+    Returns the new generator's id.
+    """
+    if not os.path.exists(pathname):
+        raise ValueError('No such snapshot: %r' % (pathname,))
+    with _attached(bdb, pathname):
+        with bdb.savepoint():
+            bdb.sql_execute('PRAGMA defer_foreign_keys = ON')
+            return _import_models(bdb, name, replace)
+
+def _import_models(bdb, name, replace):
+    info_sql = '''
+        SELECT COUNT(*) FROM %s.sqlite_master
+            WHERE type = 'table' AND name = 'bayesdb_snapshot_info'
+    ''' % (_SNAPSHOT,)
+    if cursor_value(bdb.sql_execute(info_sql)) != 1:
+        raise ValueError('Not a model snapshot')
+    info_sql = '''
+        SELECT version, generator, data FROM %s.bayesdb_snapshot_info
+    ''' % (_SNAPSHOT,)
+    version, old_name, _data = bdb.sql_execute(info_sql).fetchall()[0]
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('Unsupported model snapshot version: %r' %
+            (version,))
+    snapshot_schema = cursor_value(
+        bdb.sql_execute('PRAGMA %s.user_version' % (_SNAPSHOT,)))
+    schema = cursor_value(bdb.sql_execute('PRAGMA main.user_version'))
+    if snapshot_schema != schema:
+        raise ValueError('Snapshot has BayesDB schema version %r, not %r' %
+            (snapshot_schema, schema))
+
+    generator_sql = '''
+        SELECT id, tabname, population_id, metamodel
+            FROM %s.bayesdb_generator WHERE name = ?
+    ''' % (_SNAPSHOT,)
+    old_generator_id, table, old_population_id, mm_name = \
+        bdb.sql_execute(generator_sql, (old_name,)).fetchall()[0]
+    if mm_name not in bdb.metamodels:
+        raise ValueError('Metamodel of snapshot not registered: %r' %
+            (mm_name,))
+    bdb.metamodels[mm_name]
+    mm_version_sql = '''
+        SELECT version FROM %s.bayesdb_metamodel WHERE name = ?
+    ''' % (_SNAPSHOT,)
+    mm_version = cursor_value(bdb.sql_execute(mm_version_sql, (mm_name,)))
+    if mm_version != bayesdb_metamodel_version(bdb, mm_name):
+        raise ValueError('Snapshot has %s metamodel version %r, not %r' %
+            (mm_name, mm_version, bayesdb_metamodel_version(bdb, mm_name)))
+
+    # Table and its columns.  (core.bayesdb_has_table would find the
+    # snapshot's table.)
+    if not _table_columns(bdb, 'main', table):
+        schema_sql = '''
+            SELECT sql FROM %s.sqlite_master
+                WHERE type IN ('table', 'index') AND sql IS NOT NULL
+                    AND tbl_name = ? COLLATE NOCASE
+                ORDER BY rowid ASC
+        ''' % (_SNAPSHOT,)
+        for sql, in bdb.sql_execute(schema_sql, (table,)).fetchall():
+            bdb.sql_execute(sql)
+        _copy_rows(bdb, _SNAPSHOT, 'main', table, '1', rowid=True)
+        for column_table in ('bayesdb_column', 'bayesdb_column_map'):
+            _copy_rows(bdb, _SNAPSHOT, 'main', column_table, 'tabname = ?',
+                (table,))
+    core.bayesdb_table_guarantee_columns(bdb, table)
+    columns_sql = '''
+        SELECT colno, name FROM %s.bayesdb_column WHERE tabname = ?
+    '''
+    snapshot_columns = set((colno, casefold(name)) for colno, name in
+        bdb.sql_execute(columns_sql % (_SNAPSHOT,), (table,)))
+    columns = set((colno, casefold(name)) for colno, name in
+        bdb.sql_execute(columns_sql % ('main',), (table,)))
+    if not snapshot_columns <= columns:
+        raise ValueError('Table %r has columns other than in snapshot' %
+            (table,))
+
+    # Population and its manifest variables.
+    population_sql = '''
+        SELECT name FROM %s.bayesdb_population WHERE id = ?
+    ''' % (_SNAPSHOT,)
+    population = cursor_value(
+        bdb.sql_execute(population_sql, (old_population_id,)))
+    variables_sql = '''
+        SELECT colno, name, stattype FROM %s.bayesdb_variable
+            WHERE population_id = ? AND generator_id IS NULL
+    '''
+    if core.bayesdb_has_population(bdb, population):
+        population_id = core.bayesdb_get_population(bdb, population)
+        snapshot_variables = set(
+            (colno, casefold(name), casefold(stattype))
+            for colno, name, stattype in bdb.sql_execute(
+                variables_sql % (_SNAPSHOT,), (old_population_id,)))
+        variables = set(
+            (colno, casefold(name), casefold(stattype))
+            for colno, name, stattype in bdb.sql_execute(
+                variables_sql % ('main',), (population_id,)))
+        if core.bayesdb_population_table(bdb, population_id).lower() != \
+                table.lower() or snapshot_variables != variables:
+            raise ValueError('Population %r differs from snapshot' %
+                (population,))
+    else:
+        _copy_rows(bdb, _SNAPSHOT, 'main', 'bayesdb_population', 'id = ?',
+            (old_population_id,), omit=('id',))
+        population_id = core.bayesdb_get_population(bdb, population)
+        _copy_rows(bdb, _SNAPSHOT, 'main', 'bayesdb_variable',
+            'population_id = ? AND generator_id IS NULL',
+            (old_population_id,), replace={'population_id': population_id})
+
+    # Generator and everything of its metamodel.
+    if name is None:
+        name = old_name
+    if core.bayesdb_has_generator(bdb, None, name):
+        if not replace:
+            raise ValueError('Generator already exists: %r' % (name,))
+        bdb.execute('DROP GENERATOR %s' % (bql_quote_name(name),))
+    _copy_rows(bdb, _SNAPSHOT, 'main', 'bayesdb_generator', 'id = ?',
+        (old_generator_id,), omit=('id',),
+        replace={'name': name, 'population_id': population_id})
+    generator_id = core.bayesdb_get_generator(bdb, None, name)
+    tables_sql = '''
+        SELECT name FROM main.sqlite_master
+            WHERE type = 'table' AND name LIKE 'bayesdb\\_%' ESCAPE '\\'
+                AND name != 'bayesdb_generator'
+                AND name IN (SELECT name FROM {0}.sqlite_master
+                    WHERE type = 'table')
+            ORDER BY rowid ASC
+    '''.format(_SNAPSHOT)
+    for table_name, in bdb.sql_execute(tables_sql).fetchall():
+        if table_name.lower() in _SNAPSHOT_OMIT:
+            continue
+        if 'generator_id' not in _table_columns(bdb, 'main', table_name):
+            continue
+        _copy_rows(bdb, _SNAPSHOT, 'main', table_name, 'generator_id = ?',
+            (old_generator_id,), replace={
+                'generator_id': generator_id,
+                'population_id': population_id,
+            })
+    return generator_id
+
+@contextlib.contextmanager
+def _attached(bdb, pathname):
+    bdb.sql_execute('ATTACH DATABASE ? AS %s' % (_SNAPSHOT,), (pathname,))
+    try:
+        yield
+    finally:
+        bdb.sql_execute('DETACH DATABASE %s' % (_SNAPSHOT,))
+
+def _table_columns(bdb, schema, table):
+    sql = 'PRAGMA %s.table_info(%s)' % (schema, sqlite3_quote_name(table))
+    return [row[1] for row in bdb.sql_execute(sql)]
+
+def _copy_rows(bdb, source, target, table, condition, bindings=(),
+        rowid=False, omit=(), replace=None):
+    """Copy rows of `table` satisfying `condition` from `source`.
+
+    Columns named in `omit` are left to their defaults, and columns
+    named in `replace` are set to the values given there.
+    """
+    if replace is None:
+        replace = {}
+    columns = [column for column in _table_columns(bdb, target, table)
+        if column not in omit]
+    names = [sqlite3_quote_name(column) for column in columns]
+    values = []
+    parameters = []
+    for column, qc in zip(columns, names):
+        if column in replace:
+            values.append('?')
+            parameters.append(replace[column])
+        else:
+            values.append(qc)
+    if rowid:
+        names.insert(0, '_rowid_')
+        values.insert(0, '_rowid_')
+    qt = sqlite3_quote_name(table)
+    sql = 'INSERT INTO %s.%s (%s) SELECT %s FROM %s.%s WHERE %s' % (
+        target, qt, ', '.join(names), ', '.join(values), source, qt,
+        condition)
+    bdb.sql_execute(sql, parameters + list(bindings))
@@ -44,7 +44,9 @@ def sqlite3_transaction(db):
         db.cursor().execute("COMMIT")
         ok = True
     finally:
-        if not ok:
+        # An interrupted statement may already have rolled back the
+        # whole transaction.
+        if not ok and not db.getautocommit():
             db.cursor().execute("ROLLBACK")
 
 @contextlib.contextmanager
@@ -66,9 +68,12 @@ def sqlite3_savepoint(db):
         yield
         ok = True
     finally:
-        if not ok:
+        # An interrupted statement may already have rolled back the
+        # whole transaction, savepoint and all.
+        if not ok and not db.getautocommit():
             db.cursor().execute("ROLLBACK TO x%s" % (savepoint,))
-        db.cursor().execute("RELEASE x%s" % (savepoint,))
+        if not db.getautocommit():
+            db.cursor().execute("RELEASE x%s" % (savepoint,))
 
 @contextlib.contextmanager
 def sqlite3_savepoint_rollback(db):
@@ -78,8 +83,9 @@ def sqlite3_savepoint_rollback(db):
     try:
         yield
     finally:
-        db.cursor().execute("ROLLBACK TO x%s" % (savepoint,))
-        db.cursor().execute("RELEASE x%s" % (savepoint,))
+        if not db.getautocommit():
+            db.cursor().execute("ROLLBACK TO x%s" % (savepoint,))
+            db.cursor().execute("RELEASE x%s" % (savepoint,))
 
 def sqlite3_exec_1(db, query, *args):
     """Execute a query returning a 1x1 table, and return its one value.
@@ -124,16 +124,28 @@ def t_cdf(x, df):
     """Approximate CDF for Student's t distribution.
 
     ``t_cdf(x, df) = P(T_df < x)``
+
+    x and df may be arrays, evaluated elementwise.
     """
-    if df <= 0:
+    if numpy.any(numpy.asarray(df) <= 0):
         raise ValueError('Degrees of freedom must be positive.')
-    if x == 0:
+    if numpy.ndim(x) == 0 and x == 0:
         return 0.5
     import scipy.stats
     return scipy.stats.t.cdf(x, df)
 
 def chi2_sf(x, df):
-    """Survival function for chi^2 distribution."""
+    """Survival function for chi^2 distribution.
+
+    x and df may be arrays, evaluated elementwise.
+    """
+    if numpy.ndim(x) != 0 or numpy.ndim(df) != 0:
+        x = numpy.asarray(x, dtype=float)
+        df = numpy.asarray(df, dtype=float)
+        if numpy.any(df <= 0):
+            raise ValueError('Nonpositive df: %f' % (numpy.min(df),))
+        # Clamp negative x to zero, whose survival is 1 anyway.
+        return gamma_above(df/2., numpy.maximum(x, 0.)/2.)
     if df <= 0:
         raise ValueError('Nonpositive df: %f' % (df,))
     if x < 0:
@@ -146,10 +158,13 @@ def f_sf(x, df_num, df_den):
     """Approximate survival function for the F distribution.
 
     ``f_sf(x, df_num, df_den) = P(F_{df_num, df_den} > x)``
+
+    x, df_num, and df_den may be arrays, evaluated elementwise.
     """
-    if df_num <= 0 or df_den <= 0:
+    if numpy.any(numpy.asarray(df_num) <= 0) or \
+       numpy.any(numpy.asarray(df_den) <= 0):
         raise ValueError('Degrees of freedom must be positive.')
-    if x <= 0:
+    if numpy.ndim(x) == 0 and x <= 0:
         return 1.0
     import scipy.stats
     return scipy.stats.f.sf(x, df_num, df_den)
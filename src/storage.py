@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""SQLite storage settings for BayesDB files.
+
+A storage profile is a dictionary of SQLite settings, or the name of
+one in :data:`storage_profiles`, passed to
+:func:`~bayeslite.bayesdb_open` as `storage_profile`::
+
+    bdb = bayesdb_open(pathname='foo.bdb', storage_profile='fast')
+    bdb = bayesdb_open(pathname='foo.bdb',
+        storage_profile={'journal_mode': 'wal', 'mmap_size': 2**30})
+
+The settings are:
+
+``journal_mode``
+    ``'delete'``, ``'truncate'``, ``'persist'``, ``'memory'``,
+    ``'wal'``, or ``'off'``.  Write-ahead logging, ``'wal'``, makes
+    commits of large model blobs cheaper and lets readers proceed
+    while a writer commits.  Persists in the file.
+``synchronous``
+    ``'off'``, ``'normal'``, ``'full'``, or ``'extra'``: how hard
+    SQLite waits for commits to reach the disk.  With ``'wal'``,
+    ``'normal'`` is safe against corruption but may lose the last
+    commits on power failure.
+``mmap_size``
+    Bytes of the file to map into memory for reading.
+``cache_size``
+    Pages of the file to cache in memory, or kibibytes if negative.
+``page_size``
+    Bytes per page.  Takes effect only when the file is created.
+``temp_store``
+    ``'default'``, ``'file'``, or ``'memory'``: where temporary
+    tables and indices live.
+
+Settings not given are left at SQLite's defaults.  Use
+:meth:`~bayeslite.BayesDB.storage_settings` to see what a BayesDB has
+in effect.
+"""
+
+import apsw
+import os
+import tempfile
+import time
+
+from bayeslite.txn import BayesDBTxnError
+from bayeslite.util import cursor_value
+
+storage_profiles = {
+    'default': {},
+    'fast': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256*1024*1024,
+        'cache_size': -64*1024,
+        'page_size': 4096,
+        'temp_store': 'memory',
+    },
+    'safe': {
+        'journal_mode': 'wal',
+        'synchronous': 'full',
+    },
+    'serve': {
+        'mmap_size': 1024*1024*1024,
+        'cache_size': -64*1024,
+        'temp_store': 'memory',
+    },
+}
+
+_JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+_SYNCHRONOUS = ('off', 'normal', 'full', 'extra')
+_TEMP_STORES = ('default', 'file', 'memory')
+
+# Order in which to apply settings.  The page size must be set before
+# anything is written, and cannot change once in WAL mode.
+_SETTINGS = (
+    ('page_size', None),
+    ('journal_mode', _JOURNAL_MODES),
+    ('synchronous', _SYNCHRONOUS),
+    ('mmap_size', None),
+    ('cache_size', None),
+    ('temp_store', _TEMP_STORES),
+)
+
+# Settings stored in the file rather than the connection.
+_PERSISTENT = ('page_size', 'journal_mode')
+
+# Pages an online backup copies in each step.
+_BACKUP_PAGES = 1024
+
+# Milliseconds a backup waits for a writer to release a lock.
+_BACKUP_BUSY_TIMEOUT = 10000
+
+def storage_profile_settings(profile):
+    """Return the dictionary of settings for storage profile `profile`.
+
+    `profile` is the name of a profile in :data:`storage_profiles` or
+    a dictionary of settings.  Raise :exc:`ValueError` if it is not
+    valid.
+    """
+    if profile is None:
+        return {}
+    if isinstance(profile, basestring):
+        if profile not in storage_profiles:
+            raise ValueError('No such storage profile: %r' % (profile,))
+        profile = storage_profiles[profile]
+    settings = {}
+    names = dict(_SETTINGS)
+    for name, value in profile.iteritems():
+        if name not in names:
+            raise ValueError('Unknown storage setting: %r' % (name,))
+        choices = names[name]
+        if choices is None:
+            if not isinstance(value, (int, long)) or \
+                    isinstance(value, bool):
+                raise ValueError('Storage setting %s must be an integer: %r'
+                    % (name, value))
+        else:
+            if not isinstance(value, basestring) or \
+                    value.lower() not in choices:
+                raise ValueError('Storage setting %s must be one of %r: %r'
+                    % (name, choices, value))
+            value = value.lower()
+        settings[name] = value
+    return settings
+
+def bayesdb_storage_apply(bdb, settings):
+    """Apply the storage `settings` to `bdb`'s SQLite connection.
+
+    Must be done before the schema is installed, so that the page size
+    of a new file takes effect.  Settings stored in the file are left
+    alone if `bdb` is read-only.
+    """
+    for name, _choices in _SETTINGS:
+        if name not in settings:
+            continue
+        if name in _PERSISTENT and bdb.readonly:
+            continue
+        # Values were checked by storage_profile_settings, and PRAGMA
+        # does not take parameters.
+        sql = 'PRAGMA %s = %s' % (name, settings[name])
+        bdb.sql_execute(sql).fetchall()
+
+def bayesdb_storage_settings(bdb):
+    """Return a dictionary of the storage settings in effect in `bdb`."""
+    settings = {}
+    for name, choices in _SETTINGS:
+        # mmap_size reports nothing for databases that can't be mapped,
+        # such as in-memory ones.
+        cursor = bdb.sql_execute('PRAGMA %s' % (name,))
+        value = cursor_value(cursor, nullok=True)
+        if choices is not None and isinstance(value, (int, long)):
+            # synchronous and temp_store report their level by number.
+            value = choices[value]
+        settings[name] = value
+    return settings
+
+def bayesdb_storage_backup(bdb, pathname, pages_per_step=None, sleep=None,
+        progress=None):
+    """Copy the database of `bdb` to the file at `pathname` while in use.
+
+    The copy is of the last commit to `bdb`'s file, not of anything
+    uncommitted in `bdb`'s transactions.  An in-memory database has
+    no file to copy from, so it cannot be copied during a transaction.
+    The copy replaces the file at
+    `pathname` only once complete.  It is made `pages_per_step`
+    pages at a time (all at once if -1), sleeping `sleep` seconds
+    between steps, and calling ``progress(copied, total)`` with the
+    number of pages after each step if `progress` is given.
+
+    If the file is in write-ahead log mode, the copy reads a snapshot
+    of it without blocking writers, even other handles on it in other
+    threads or processes.  Otherwise the copy holds a lock only during
+    each step, but starts over if another handle commits in between.
+    """
+    if pages_per_step is None:
+        pages_per_step = _BACKUP_PAGES
+    if not (pages_per_step == -1 or 0 < pages_per_step):
+        raise ValueError('Invalid pages per backup step: %r' %
+            (pages_per_step,))
+    if bdb.pathname == ':memory:':
+        # The only handle on the database would copy what it has not
+        # committed.
+        if not bdb._sqlite3.getautocommit():
+            raise BayesDBTxnError(bdb,
+                'Cannot back up an in-memory database in a transaction.')
+        # Nothing else can see the database to write to it.
+        source = bdb._sqlite3
+    else:
+        source = apsw.Connection(bdb.pathname,
+            flags=apsw.SQLITE_OPEN_READONLY)
+        source.setbusytimeout(_BACKUP_BUSY_TIMEOUT)
+    try:
+        cursor = source.cursor()
+        wal = cursor_value(cursor.execute('PRAGMA journal_mode')) == 'wal'
+        if wal and source is not bdb._sqlite3:
+            # Pin a snapshot for the backup to read.
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT COUNT(*) FROM sqlite_master').fetchall()
+        # Copy to a new file and rename it into place, so that the
+        # file at `pathname` is always a complete copy, and SQLite
+        # need not reconcile the copy with what was there before.
+        fd, temp_pathname = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(pathname)),
+            prefix=os.path.basename(pathname) + '.')
+        os.close(fd)
+        try:
+            destination = apsw.Connection(temp_pathname)
+            try:
+                with destination.backup('main', source, 'main') as backup:
+                    while not backup.done:
+                        backup.step(pages_per_step)
+                        if progress is not None:
+                            progress(backup.pagecount - backup.remaining,
+                                backup.pagecount)
+                        if not backup.done and sleep:
+                            time.sleep(sleep)
+            finally:
+                destination.close()
+            os.rename(temp_pathname, pathname)
+        except:
+            os.unlink(temp_pathname)
+            raise
+    finally:
+        if source is not bdb._sqlite3:
+            source.close()
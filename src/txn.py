@@ -74,7 +74,9 @@ def bayesdb_begin_transaction(bdb):
 def bayesdb_rollback_transaction(bdb):
     if bdb._txn_depth == 0:
         raise BayesDBTxnError(bdb, 'Not in a transaction!')
-    bdb.sql_execute("ROLLBACK")
+    # An interrupted statement may already have rolled it back.
+    if not bdb._sqlite3.getautocommit():
+        bdb.sql_execute("ROLLBACK")
     bdb._txn_depth = 0
     bayesdb_txn_fini(bdb)
 
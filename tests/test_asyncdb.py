@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+import threading
+
+import bayeslite
+
+from bayeslite.exception import BQLError
+
+import test_core
+
+def t1_async(adb):
+    def setup(bdb):
+        test_core.t1_schema(bdb)
+        test_core.t1_data(bdb)
+        bdb.execute('''
+            CREATE POPULATION p1 FOR t1 (
+                id IGNORE;
+                label NOMINAL;
+                age NUMERICAL;
+                weight NUMERICAL
+            )
+        ''')
+        bdb.execute('CREATE GENERATOR p1_cc FOR p1 USING crosscat()')
+        bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+    adb.call(setup).result()
+
+def test_async_execute():
+    with bayeslite.AsyncBayesDB() as adb:
+        t1_async(adb)
+        futures = [adb.execute('SELECT age FROM t1 WHERE id = ?', (i,))
+            for i in xrange(1, 4)]
+        assert [f.result().fetchall().result() for f in futures] == \
+            [[(row[1],)] for row in test_core.t1_rows[:3]]
+        cursor = adb.execute('SELECT id FROM t1 ORDER BY id').result()
+        batches = list(cursor.batches(4))
+        assert map(len, batches) == [4]*(len(test_core.t1_rows)//4) + \
+            ([len(test_core.t1_rows) % 4] if len(test_core.t1_rows) % 4
+                else [])
+        cursor = adb.execute('SELECT id FROM t1 ORDER BY id').result()
+        assert [row[0] for row in cursor] == \
+            range(1, len(test_core.t1_rows) + 1)
+        # Errors come back through the future.
+        future = adb.execute('ESTIMATE PREDICTIVE PROBABILITY OF nonesuch'
+            ' FROM p1')
+        assert isinstance(future.exception(), BQLError)
+        with pytest.raises(BQLError):
+            future.result()
+
+def test_async_callback():
+    with bayeslite.AsyncBayesDB() as adb:
+        done = threading.Event()
+        results = []
+        def callback(future):
+            results.append((future.done(), future.exception()))
+            done.set()
+        adb.execute('SELECT 42').add_done_callback(callback)
+        done.wait(10)
+        assert results == [(True, None)]
+
+def test_async_analyze():
+    with bayeslite.AsyncBayesDB() as adb:
+        t1_async(adb)
+        progress = []
+        future = adb.analyze('p1_cc', iterations=5, step=2,
+            progress=lambda n, _elapsed: progress.append(n))
+        assert future.result() == 5
+        assert progress == [2, 4, 5]
+        sql = '''
+            SELECT iterations FROM bayesdb_generator_model
+                WHERE generator_id = 1
+        '''
+        cursor = adb.sql_execute(sql).result()
+        assert cursor.fetchall().result() == [(5,), (5,)]
+        with pytest.raises(ValueError):
+            adb.analyze('p1_cc')
+
+def test_async_trace():
+    with bayeslite.AsyncBayesDB() as adb:
+        class Tracer(bayeslite.IBayesDBTracer):
+            def __init__(self):
+                self.events = []
+            def start(self, qid, query, bindings):
+                self.events.append(('start', query))
+            def finished(self, qid):
+                self.events.append(('finished',))
+        tracer = Tracer()
+        adb.call(lambda bdb: bdb.trace(tracer)).result()
+        cursor = adb.execute('SELECT 42').result()
+        assert cursor.fetchall().result() == [(42,)]
+        adb.call(lambda bdb: bdb.untrace(tracer)).result()
+        assert tracer.events == [('start', 'SELECT 42'), ('finished',)]
@@ -16,6 +16,8 @@
 
 import StringIO
 import apsw
+import json
+import math
 import pytest
 import struct
 
@@ -525,18 +527,20 @@ def test_estimate_bql():
             'from p1;')
     # PROBABILITY DENISTY.
     assert bql2sql('estimate probability density of weight = 20 from p1;') == \
-        'SELECT bql_pdf_joint(1, NULL, NULL, 3, 20) FROM "t1";'
+        'SELECT (SELECT bql_pdf_joint(1, NULL, NULL, 3, 20)) FROM "t1";'
     assert bql2sql('estimate probability density of weight = 20'
             ' given (age = 8)'
             ' from p1;') == \
-        'SELECT bql_pdf_joint(1, NULL, NULL, 3, 20, NULL, 2, 8) FROM "t1";'
+        'SELECT (SELECT bql_pdf_joint(1, NULL, NULL, 3, 20, NULL, 2, 8))' \
+            ' FROM "t1";'
     assert bql2sql('estimate probability density of (weight = 20, age = 8)'
             ' from p1;') == \
-        'SELECT bql_pdf_joint(1, NULL, NULL, 3, 20, 2, 8) FROM "t1";'
+        'SELECT (SELECT bql_pdf_joint(1, NULL, NULL, 3, 20, 2, 8))' \
+            ' FROM "t1";'
     assert bql2sql('estimate probability density of (weight = 20, age = 8)'
             " given (label = 'mumble') from p1;") == \
-        "SELECT bql_pdf_joint(1, NULL, NULL, 3, 20, 2, 8, NULL, 1, 'mumble')" \
-            ' FROM "t1";'
+        'SELECT (SELECT bql_pdf_joint(1, NULL, NULL, 3, 20, 2, 8,' \
+            " NULL, 1, 'mumble')) FROM \"t1\";"
     assert bql2sql('estimate probability density of weight = (c + 1)'
             ' from p1;') == \
         'SELECT bql_pdf_joint(1, NULL, NULL, 3, ("c" + 1)) FROM "t1";'
@@ -545,7 +549,7 @@ def test_estimate_bql():
         'SELECT bql_pdf_joint(1, NULL, NULL, 3, "f"("c")) FROM "t1";'
     assert bql2sql('estimate similarity to (rowid = 5) '
             'in the context of weight from p1;') == \
-        'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,' \
+        'SELECT bql_row_similarity_batch(1, NULL, NULL, _rowid_,' \
         ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" = 5)), 3) FROM "t1";'
     assert bql2sql(
             'estimate similarity of (rowid = 12) to (rowid = 5) '
@@ -555,8 +559,29 @@ def test_estimate_bql():
         ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" = 5)), 3) FROM "t1";'
     assert bql2sql('estimate similarity to (rowid = 5) in the context of age'
             ' from p1') == \
-        'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,' \
+        'SELECT bql_row_similarity_batch(1, NULL, NULL, _rowid_,' \
         ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" = 5)), 2) FROM "t1";'
+    # Targets that may vary from row to row are not batched.
+    assert bql2sql('estimate similarity to'
+            ' (rowid = (select max(rowid) from t1))'
+            ' in the context of age from p1') == \
+        'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,' \
+        ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" =' \
+        ' (SELECT "max"("rowid") FROM "t1"))), 2) FROM "t1";'
+    assert bql2sql('estimate similarity to (rowid = abs(-5))'
+            ' in the context of age from p1') == \
+        'SELECT bql_row_similarity_batch(1, NULL, NULL, _rowid_,' \
+        ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" = "abs"((- 5)))),' \
+        ' 2) FROM "t1";'
+    assert bql2sql('estimate similarity to (rowid = random())'
+            ' in the context of age from p1') == \
+        'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,' \
+        ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" = "random"())), 2)' \
+        ' FROM "t1";'
+    assert bql2sql('estimate similarity to (t2.rowid = 5)'
+            ' in the context of age from p1') == \
+        'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,' \
+        ' (SELECT _rowid_ FROM "t1" WHERE ("t2"."rowid" = 5)), 2) FROM "t1";'
     assert bql2sql(
         'estimate similarity of (rowid = 5) to (height = 7 and age < 10)'
             ' in the context of weight from p1;') == \
@@ -570,12 +595,12 @@ def test_estimate_bql():
             'estimate similarity to (rowid = 5) in the context of * from p1;')
     assert bql2sql('estimate similarity to (rowid = 5)'
             ' in the context of age from p1;') == \
-        'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,' \
+        'SELECT bql_row_similarity_batch(1, NULL, NULL, _rowid_,' \
         ' (SELECT _rowid_ FROM "t1" WHERE ("rowid" = 5)), 2) FROM "t1";'
     assert bql2sql('estimate dependence probability of age with weight'
             ' from p1;') == \
-        'SELECT bql_column_dependence_probability(1, NULL, NULL, 2, 3) '\
-        'FROM "t1";'
+        'SELECT (SELECT bql_column_dependence_probability(1, NULL, NULL,'\
+        ' 2, 3)) FROM "t1";'
     with pytest.raises(bayeslite.BQLError):
         # Need both rows fixed.
         bql2sql('estimate similarity to (rowid=2) in the context of r by p1')
@@ -590,13 +615,30 @@ def test_estimate_bql():
         bql2sql('estimate dependence probability from p1;')
     assert bql2sql('estimate mutual information of age with weight' +
         ' from p1;') == \
-        'SELECT bql_column_mutual_information('\
-            '1, NULL, NULL, \'[2]\', \'[3]\', NULL)'\
+        'SELECT (SELECT bql_column_mutual_information('\
+            '1, NULL, NULL, \'[2]\', \'[3]\', NULL))'\
         ' FROM "t1";'
     assert bql2sql('estimate mutual information of age with weight' +
         ' using 42 samples from p1;') == \
-        'SELECT bql_column_mutual_information('\
-            '1, NULL, NULL, \'[2]\', \'[3]\', 42)'\
+        'SELECT (SELECT bql_column_mutual_information('\
+            '1, NULL, NULL, \'[2]\', \'[3]\', 42))'\
+        ' FROM "t1";'
+    assert bql2sql('estimate mutual information of age with weight' +
+        ' tolerance 0.01 from p1;') == \
+        'SELECT (SELECT bql_column_mutual_information_adaptive('\
+            '1, NULL, NULL, \'[2]\', \'[3]\', NULL, 0.01))'\
+        ' FROM "t1";'
+    assert bql2sql('estimate mutual information of age with weight' +
+        ' using 42 samples standard error from p1;') == \
+        'SELECT (SELECT bql_column_mutual_information_stderr('\
+            '1, NULL, NULL, \'[2]\', \'[3]\', 42, NULL))'\
+        ' FROM "t1";'
+    assert bql2sql('estimate mutual information of age with weight,' +
+        ' mutual information of age with weight standard error from p1;') \
+        == 'SELECT (SELECT bql_column_mutual_information_adaptive('\
+            '1, NULL, NULL, \'[2]\', \'[3]\', NULL, NULL)),'\
+        ' (SELECT bql_column_mutual_information_stderr('\
+            '1, NULL, NULL, \'[2]\', \'[3]\', NULL, NULL))'\
         ' FROM "t1";'
     with pytest.raises(bayeslite.BQLError):
         # Need both columns fixed.
@@ -613,7 +655,8 @@ def test_estimate_bql():
         bql2sql('estimate mutual information using 42 samples from p1;')
     # XXX Should be SELECT, not ESTIMATE, here?
     assert bql2sql('estimate correlation of age with weight from p1;') == \
-        'SELECT bql_column_correlation(1, NULL, NULL, 2, 3) FROM "t1";'
+        'SELECT (SELECT bql_column_correlation(1, NULL, NULL, 2, 3))' \
+        ' FROM "t1";'
     with pytest.raises(bayeslite.BQLError):
         # Need both columns fixed.
         bql2sql('estimate correlation with age from p1;')
@@ -847,6 +890,49 @@ def test_infer_auto_star_nsamples():
             ' AS "weight"' \
         ' FROM "t1";'
 
+def test_estimate_invariant():
+    # Row-invariant BQL functions are evaluated once per query, in an
+    # uncorrelated scalar subquery.  Those with row-dependent
+    # arguments are not.
+    assert bql2sql('estimate * from p1 where'
+            ' probability density of weight = 20 > 0.1;') == \
+        'SELECT * FROM "t1" WHERE' \
+        ' ((SELECT bql_pdf_joint(1, NULL, NULL, 3, 20)) > 0.1);'
+    assert bql2sql('estimate * from p1 where'
+            ' probability density of weight = (age + 1) > 0.1;') == \
+        'SELECT * FROM "t1" WHERE' \
+        ' (bql_pdf_joint(1, NULL, NULL, 3, ("age" + 1)) > 0.1);'
+    assert bql2sqlparam('estimate age from p1 where'
+            ' mutual information of age with weight using ?1 samples'
+            ' > 0.1;') == \
+        'SELECT "age" FROM "t1" WHERE' \
+        ' ((SELECT bql_column_mutual_information(1, NULL, NULL,' \
+            ' \'[2]\', \'[3]\', ?1)) > 0.1);'
+    # An ORDER BY key that is also a result column is computed once.
+    assert bql2sql('estimate rowid, predictive probability of weight'
+            ' from p1 order by predictive probability of weight desc;') == \
+        'SELECT "rowid", bql_row_column_predictive_probability(1, NULL,' \
+            ' NULL, _rowid_, \'[3]\', \'[]\')' \
+        ' FROM "t1" ORDER BY 2 DESC;'
+    assert bql2sql('estimate *, predictive probability of weight'
+            ' from p1 order by predictive probability of weight;') == \
+        'SELECT *, bql_row_column_predictive_probability(1, NULL,' \
+            ' NULL, _rowid_, \'[3]\', \'[]\')' \
+        ' FROM "t1" ORDER BY bql_row_column_predictive_probability(1, NULL,' \
+            ' NULL, _rowid_, \'[3]\', \'[]\');'
+    assert bql2sql('estimate dependence probability as depprob'
+            ' from pairwise columns of p1'
+            ' order by dependence probability;') == \
+        'SELECT 1 AS population_id, v0.name AS name0, v1.name AS name1,' \
+        ' bql_column_dependence_probability(1, NULL, NULL, v0.colno,' \
+            ' v1.colno) AS "depprob"' \
+        ' FROM bayesdb_population AS p, bayesdb_variable AS v0,' \
+            ' bayesdb_variable AS v1' \
+        ' WHERE p.id = 1' \
+        ' AND v0.population_id = p.id AND v1.population_id = p.id' \
+        ' AND v0.generator_id IS NULL AND v1.generator_id IS NULL' \
+        ' ORDER BY 4;'
+
 def test_estimate_columns_trivial():
     prefix0 = 'SELECT v.name AS name'
     prefix1 = ' FROM bayesdb_variable AS v' \
@@ -864,7 +950,7 @@ def test_estimate_columns_trivial():
             ' > (probability density of age = 16)') == \
         prefix + \
         ' AND (bql_column_value_probability(1, NULL, NULL, v.colno, 8) >' \
-        ' bql_pdf_joint(1, NULL, NULL, 2, 16));'
+        ' (SELECT bql_pdf_joint(1, NULL, NULL, 2, 16)));'
     assert bql2sql('estimate *, probability density of value 8 given (age = 8)'
             ' from columns of p1;') == \
         prefix0 + \
@@ -1011,7 +1097,7 @@ def test_estimate_pairwise_trivial():
         'bql_column_mutual_information(1, NULL, NULL, '\
             '\'[\' || v0.colno || \']\', \'[\' || v1.colno || \']\', NULL)' + \
         infix + \
-        ' AND (bql_pdf_joint(1, NULL, NULL, 2, 0) > 0.5);'
+        ' AND ((SELECT bql_pdf_joint(1, NULL, NULL, 2, 0)) > 0.5);'
     assert bql2sql('estimate mutual information given (label=\'go\', weight)'
             ' from pairwise columns of p1 where'
             ' (probability density of age = 0) > 0.5;') == \
@@ -1020,7 +1106,7 @@ def test_estimate_pairwise_trivial():
         ' \'[\' || v0.colno || \']\', \'[\' || v1.colno || \']\', NULL,'\
         ' 1, \'go\', 3, NULL)' + \
         infix + \
-        ' AND (bql_pdf_joint(1, NULL, NULL, 2, 0) > 0.5);'
+        ' AND ((SELECT bql_pdf_joint(1, NULL, NULL, 2, 0)) > 0.5);'
     with pytest.raises(bayeslite.BQLError):
         # PROBABILITY DENSITY OF VALUE is 1-column.
         bql2sql('estimate correlation from pairwise columns of p1 where' +
@@ -1330,8 +1416,8 @@ def test_modelledby_usingmodels_trival():
         estimate mutual information of age with weight
         from p1 modeled by m1 using model 1;
     ''', setup=setup) == \
-        'SELECT bql_column_mutual_information('\
-            '1, 1, \'[1]\', \'[2]\', \'[3]\', NULL)'\
+        'SELECT (SELECT bql_column_mutual_information('\
+            '1, 1, \'[1]\', \'[2]\', \'[3]\', NULL))'\
         ' FROM "t1";'
 
 def test_simulate_columns_all():
@@ -1617,22 +1703,18 @@ def test_parametrized():
                     ' AND name = ?',
             # ESTIMATE SIMILARITY TO (rowid=1):
             'SELECT tabname FROM bayesdb_population WHERE id = ?',
-            'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,'
+            'SELECT bql_row_similarity_batch(1, NULL, NULL, _rowid_,'
                 ' (SELECT _rowid_ FROM "t" WHERE ("rowid" = 1)), 0) FROM "t"',
             'SELECT id FROM bayesdb_generator WHERE population_id = ?',
             'SELECT metamodel FROM bayesdb_generator WHERE id = ?',
-            'SELECT modelno FROM bayesdb_crosscat_theta'
-                ' WHERE generator_id = ?',
-            'SELECT theta_json FROM bayesdb_crosscat_theta'
-                ' WHERE generator_id = ? AND modelno = ?',
-            'SELECT modelno FROM bayesdb_crosscat_theta'
-                ' WHERE generator_id = ?',
             'SELECT sql_rowid, cc_row_id FROM bayesdb_crosscat_subsample'
-                ' WHERE generator_id = ? AND sql_rowid IN (1)',
-            'SELECT metadata_json FROM bayesdb_crosscat_metadata'
                 ' WHERE generator_id = ?',
             'SELECT cc_colno FROM bayesdb_crosscat_column'
                 ' WHERE generator_id = ? AND colno = ?',
+            'SELECT modelno FROM bayesdb_crosscat_theta'
+                ' WHERE generator_id = ?',
+            'SELECT theta_json FROM bayesdb_crosscat_theta'
+                ' WHERE generator_id = ? AND modelno = ?',
         ]
         assert sqltraced_execute('estimate similarity to (rowid = 1)'
                 ' in the context of (estimate * from columns of p limit ?)'
@@ -1659,22 +1741,18 @@ def test_parametrized():
                     ' AND name = ?',
             'SELECT tabname FROM bayesdb_population WHERE id = ?',
             # ESTIMATE SIMILARITY TO (rowid=1):
-            'SELECT bql_row_similarity(1, NULL, NULL, _rowid_,'
+            'SELECT bql_row_similarity_batch(1, NULL, NULL, _rowid_,'
                 ' (SELECT _rowid_ FROM "t" WHERE ("rowid" = 1)), 0) FROM "t"',
             'SELECT id FROM bayesdb_generator WHERE population_id = ?',
             'SELECT metamodel FROM bayesdb_generator WHERE id = ?',
-            'SELECT modelno FROM bayesdb_crosscat_theta'
-                ' WHERE generator_id = ?',
-            'SELECT theta_json FROM bayesdb_crosscat_theta'
-                ' WHERE generator_id = ? AND modelno = ?',
-            'SELECT modelno FROM bayesdb_crosscat_theta'
-                ' WHERE generator_id = ?',
             'SELECT sql_rowid, cc_row_id FROM bayesdb_crosscat_subsample'
-                ' WHERE generator_id = ? AND sql_rowid IN (1)',
-            'SELECT metadata_json FROM bayesdb_crosscat_metadata'
                 ' WHERE generator_id = ?',
             'SELECT cc_colno FROM bayesdb_crosscat_column'
                 ' WHERE generator_id = ? AND colno = ?',
+            'SELECT modelno FROM bayesdb_crosscat_theta'
+                ' WHERE generator_id = ?',
+            'SELECT theta_json FROM bayesdb_crosscat_theta'
+                ' WHERE generator_id = ? AND modelno = ?',
         ]
 
         assert sqltraced_execute(
@@ -2595,6 +2673,280 @@ def test_empty_cursor():
         empty(bdb.execute('DROP POPULATION p'))
         empty(bdb.execute('DROP TABLE t'))
 
+def test_execute_script():
+    script = '''
+        -- Make a table.
+        CREATE TABLE t AS SELECT 1 AS x, 'a;b' AS y;
+        SELECT * FROM t;
+        CREATE POPULATION p FOR t (x NUMERICAL; y CATEGORICAL);
+        CREATE TABLE u AS SELECT x + 1 AS x FROM t
+    '''
+    traced = []
+    with bayeslite.bayesdb_open() as bdb:
+        bdb.trace(lambda string, _bindings: traced.append(string))
+        bdb.execute_script(StringIO.StringIO(script))
+        assert bdb.execute('SELECT * FROM u').fetchall() == [(2,)]
+        assert core.bayesdb_has_population(bdb, 'p')
+        assert traced[0] == '-- Make a table.\n' \
+            "        CREATE TABLE t AS SELECT 1 AS x, 'a;b' AS y;"
+        assert traced[-2:] == [
+            'CREATE TABLE u AS SELECT x + 1 AS x FROM t',
+            'SELECT * FROM u',
+        ]
+        # A phrase that fails stops the script, after those before it.
+        with pytest.raises(parse.BQLParseError):
+            bdb.execute_script(StringIO.StringIO(
+                'DROP TABLE u; SELECT +; DROP POPULATION p;'))
+        assert core.bayesdb_has_population(bdb, 'p')
+        assert not core.bayesdb_has_table(bdb, 'u')
+
+def test_execute_many():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('initialize 2 models for p1_cc')
+        query = '''
+            estimate probability density of age = :a given (weight = :w)
+                by p1
+        '''
+        bindings = [{':a': 20, ':w': 10}, {':a': 30, ':w': 100}, {':w': 1, ':a': 9}]
+        cursor = bdb.execute_many(query, bindings)
+        assert [d[0] for d in cursor.description][0] == 'index'
+        assert cursor.fetchall() == [(i,) + row
+            for i, b in enumerate(bindings)
+            for row in bdb.execute(query, b).fetchall()]
+        # Queries that evaluate subqueries to compile are compiled
+        # for each bindings.
+        query = '''
+            estimate * from columns of p1
+                where name in (select name from bayesdb_variable
+                    where name <> ?)
+                order by name
+        '''
+        assert bdb.execute_many(query, [('age',), ('weight',)]).fetchall() \
+            == [
+                (0, 'label'), (0, 'weight'),
+                (1, 'age'), (1, 'label'),
+            ]
+        assert bdb.execute_many('select 0 where ?', []).fetchall() == []
+        with pytest.raises(ValueError):
+            bdb.execute_many('select ?', [(1,), (1, 2)])
+
+def test_sql_execute_many():
+    with bayeslite.bayesdb_open() as bdb:
+        bdb.sql_execute('create table t(x, y)')
+        with bdb.savepoint():
+            bdb.sql_execute_many('insert into t values (?, ?)',
+                ((i, i*i) for i in xrange(10)))
+        assert bdb.sql_execute('select count(*), sum(y) from t').fetchall() \
+            == [(10, 285)]
+        assert bdb.sql_execute_many('select y from t where x = ?',
+                [(2,), (3,)]).fetchall() == [(4,), (9,)]
+
+def test_model_subset():
+    with test_core.t1() as (bdb, _population_id, generator_id):
+        bdb.execute('initialize 4 models for p1_cc')
+        bdb.execute('analyze p1_cc for 2 iterations wait')
+        def modelnos(query):
+            sql = []
+            def trace(string, _bindings):
+                sql.append(string)
+            bdb.sql_trace(trace)
+            bdb.execute(query).fetchall()
+            bdb.sql_untrace(trace)
+            [call] = [s for s in sql
+                if 'bql_column_dependence_probability' in s]
+            if "'[" not in call:
+                return None
+            return json.loads(call[call.index("'[") + 1:call.index("]'") + 1])
+        query = '''
+            estimate dependence probability of age with weight by p1 %s
+        '''
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        logscores = metamodel.model_logscores(bdb, generator_id)
+        assert sorted(logscores) == [0, 1, 2, 3]
+        top = sorted(sorted(logscores, key=lambda m: -logscores[m])[:2])
+        assert modelnos(query % ('using top 2 models by logscore',)) == top
+        # Crosscat integrates over any set of models.
+        value = bdb.execute(query % ('using top 2 models by logscore',))
+        assert value.fetchall() == bdb.execute(query %
+            ('using models %d, %d' % tuple(top),)).fetchall()
+        random = modelnos(query % ('using 3 random models',))
+        assert len(set(random)) == 3
+        assert set(random) <= set(logscores)
+        # Asking for at least as many models as there are uses them all.
+        assert modelnos(query % ('using 4 random models',)) is None
+        with pytest.raises(BQLError):
+            bdb.execute(query % ('using top 0 models by logscore',))
+        # A default for the generator applies when no models are named.
+        bdb.set_default_models('p1_cc', 'top', 2)
+        assert modelnos(query % ('',)) == top
+        assert modelnos(query % ('using model 3',)) == [3]
+        bdb.set_default_models('p1_cc')
+        assert modelnos(query % ('',)) is None
+        with pytest.raises(ValueError):
+            bdb.set_default_models('p1_cc', 'bottom', 2)
+        with pytest.raises(ValueError):
+            bdb.set_default_models('nosuchgenerator', 'top', 2)
+        # Defaults are forgotten with their generators, including one
+        # whose id a new generator reuses after a rollback.
+        bdb.set_default_models('p1_cc', 'top', 2)
+        bdb.execute('drop generator p1_cc')
+        assert bdb._default_models == {}
+        bdb.execute('begin')
+        bdb.execute('create generator p1_cc for p1 using crosscat')
+        generator_id = core.bayesdb_get_generator(bdb, None, 'p1_cc')
+        bdb.set_default_models('p1_cc', 'top', 2)
+        bdb.execute('rollback')
+        bdb.execute('create generator p1_cc for p1 using crosscat')
+        bdb.execute('initialize 4 models for p1_cc')
+        assert core.bayesdb_get_generator(bdb, None, 'p1_cc') == generator_id
+        assert modelnos(query % ('',)) is None
+
+def test_estimate_sample():
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('initialize 2 models for p1_cc')
+        nrows = len(test_core.t1_rows)
+        rowids = [rowid for (rowid,) in
+            bdb.execute('estimate rowid from p1 sample 5 rows')]
+        assert len(set(rowids)) == 5
+        assert set(rowids) <= set(range(1, nrows + 1))
+        assert len(bdb.execute('estimate rowid from p1 sample 50 percent'
+            ' where age > 10').fetchall()) <= int(round(nrows/2.))
+        # The whole population gives exact aggregates.
+        assert bdb.execute('''
+            estimate count(*), avg(age) as a, total(weight)
+                from p1 sample 100 percent where label is not null
+        ''').fetchall() == bdb.execute('''
+            select count(*) * 1., 0., avg(age), 0., total(weight) * 1., 0.
+                from t1 where label is not null
+        ''').fetchall()
+        cursor = bdb.execute('''
+            estimate count(*), avg(predictive probability of age)
+                from p1 sample 4 rows
+        ''')
+        assert [d[0] for d in cursor.description] == \
+            ['count', 'count_stderr', 'avg', 'avg_stderr']
+        [(count, count_stderr, avg, avg_stderr)] = cursor.fetchall()
+        assert count == nrows
+        assert count_stderr == 0
+        assert 0 <= avg and 0 <= avg_stderr
+        with pytest.raises(BQLError):
+            bdb.execute('estimate max(age) from p1 sample 4 rows')
+        with pytest.raises(BQLError):
+            bdb.execute('estimate count(*) + 1 from p1 sample 4 rows')
+        with pytest.raises(BQLError):
+            bdb.execute('estimate label, count(*) from p1 sample 4 rows'
+                ' group by label')
+        with pytest.raises(BQLError):
+            bdb.execute('estimate rowid from p1 sample 101 percent')
+        # MAX and MIN of two operands are not aggregates.
+        assert len(bdb.execute('estimate max(age, weight) from p1'
+            ' sample 3 rows').fetchall()) == 3
+        assert bdb.execute('estimate count(*), total(age) from p1'
+            ' sample 0 rows').fetchall() == [(0, None, 0, None)]
+        # The sample is forgotten even while another statement is
+        # active, when its temporary table could not be dropped.
+        active = bdb.sql_execute('select * from t1')
+        active.next()
+        cursor = bdb.execute('estimate rowid from p1 sample 3 rows')
+        assert len(cursor.fetchall()) == 3
+        del cursor
+        assert bdb.sql_execute("select name from sqlite_temp_master"
+            " where name like 'bayesdb_%'").fetchall() == \
+            [('bayesdb_sample',)]
+        assert cursor_value(bdb.sql_execute(
+            'select count(*) from temp.bayesdb_sample')) == 0
+        del active
+
+def test_sample_stderr():
+    from bayeslite.bqlfn import bql_sample_stderr
+    # Values 1, 2, 3, 4 in a sample of 4 rows out of 8.
+    assert relerr(math.sqrt(5/24.),
+        bql_sample_stderr(None, 'mean', 4, 8, 4, 10, 30)) < 1e-12
+    assert relerr(8*math.sqrt(5/24.),
+        bql_sample_stderr(None, 'total', 4, 8, 4, 10, 30)) < 1e-12
+    # Three of four sampled rows counted.
+    assert relerr(8*math.sqrt(.25/4*.5),
+        bql_sample_stderr(None, 'count', 4, 8, 3, None, None)) < 1e-12
+    assert bql_sample_stderr(None, 'mean', 4, 8, 1, 1, 1) is None
+
+def test_explain(monkeypatch):
+    with test_core.t1() as (bdb, _population_id, _generator_id):
+        bdb.execute('initialize 3 models for p1_cc')
+        nrows = len(test_core.t1_rows)
+        def explain(query, *bindings):
+            cursor = bdb.execute('explain ' + query, bindings)
+            assert [d[0] for d in cursor.description] == [
+                'kind', 'detail', 'rows', 'generators', 'models', 'calls',
+                'samples',
+            ]
+            return cursor.fetchall()
+        rows = explain('estimate predictive probability of age from p1')
+        assert [row[0] for row in rows] == ['sql', 'plan', 'bqlfn', 'total']
+        assert 'bql_row_column_predictive_probability' in rows[0][1]
+        assert rows[1][1] == 'SCAN TABLE t1'
+        assert rows[2:] == [
+            ('bqlfn', 'bql_row_column_predictive_probability',
+                nrows, 1, 3, 3*nrows, None),
+            ('total', None, None, None, None, 3*nrows, 0),
+        ]
+        # Rows are counted without computing column statistics.
+        bayeslite.colstats.bayesdb_column_stats_forget(bdb, 't1')
+        rows = explain('estimate predictive probability of age from p1')
+        assert rows[2][2] == nrows
+        assert cursor_value(bdb.sql_execute("SELECT COUNT(*)"
+            " FROM sqlite_master WHERE type = 'trigger'")) == 0
+        assert cursor_value(bdb.sql_execute(
+            'SELECT COUNT(*) FROM bayesdb_column_stats')) == 0
+        # Constant functions are evaluated once, and the number of
+        # samples is known only if the query gives it.
+        rows = explain('''
+            estimate mutual information of age with weight using ? samples,
+                    predictive probability of age
+                from p1 using models 0, 1 sample 5 rows
+        ''', 50)
+        assert rows[-3:] == [
+            ('bqlfn', 'bql_column_mutual_information', 1, 1, 2, 2, 100),
+            ('bqlfn', 'bql_row_column_predictive_probability',
+                5, 1, 2, 10, None),
+            ('total', None, None, None, None, 12, 100),
+        ]
+        # Similarity to a fixed row is computed at all rows at once.
+        rows = explain('estimate similarity to (rowid = 1)'
+            ' in the context of age from p1')
+        assert rows[-2:] == [
+            ('bqlfn', 'bql_row_similarity_batch', 1, 1, 3, 3, None),
+            ('total', None, None, None, None, 3, 0),
+        ]
+        rows = explain('estimate mutual information from pairwise variables'
+            ' of p1 for age, weight')
+        assert rows[-2:] == [
+            ('bqlfn', 'bql_column_mutual_information', 4, 1, 3, 12, None),
+            ('total', None, None, None, None, 12, None),
+        ]
+        rows = explain('infer explicit predict age confidence c'
+            ' using 7 samples from p1')
+        assert rows[-1] == \
+            ('total', None, None, None, None, 3*nrows, 7*3*nrows)
+        # SIMULATE is explained without simulating.
+        assert explain('simulate age from p1 limit 10') == [
+            ('bqlfn', 'bayesdb_simulate', 1, 1, 3, 10, 10),
+            ('total', None, None, None, None, 10, 10),
+        ]
+        # Nor is SIMULATE in a subquery.
+        def simulate(*args, **kwargs):
+            assert False, 'EXPLAIN ran a simulation'
+        monkeypatch.setattr(bayeslite.bqlfn, 'bayesdb_simulate', simulate)
+        with pytest.raises(BQLError):
+            explain('select * from (simulate age from p1 limit 1000)')
+        with pytest.raises(BQLError):
+            explain('estimate predictive probability of age from p1'
+                ' where age in (simulate age from p1 limit 1000)')
+        rows = explain('select * from t1 where age > ?', 10)
+        assert rows[0] == \
+            ('sql', 'SELECT * FROM "t1" WHERE ("age" > ?1)',
+                None, None, None, None, None)
+        assert rows[-1] == ('total', None, None, None, None, 0, 0)
+
 def test_create_generator_ifnotexists():
     # XXX Test other metamodels too, because they have a role in ensuring that
     # this works. Their create_generator will still be called.
@@ -2629,10 +2981,10 @@ def test_bql_rand():
         cursor = bdb.execute('SELECT bql_rand() FROM frobotz LIMIT 10;')
         rands = cursor.fetchall()
         # These are "the" random numbers (internal PRNG is seeded to 0)
-        ans = [(0.28348770982811367,), (0.4789774612650598,), (0.07824908989551316,),
-               (0.6091223239372148,), (0.03906608409906187,), (0.3690599096081546,),
-               (0.8223420512129717,), (0.7777771914916722,), (0.061856771629497986,),
-               (0.6492586781908201,)]
+        ans = [(0.7450454884791032,), (0.4152185863539466,), (0.3462893849077504,),
+               (0.32361232752086766,), (0.7381491595659957,), (0.7425526306943516,),
+               (0.18423019347276492,), (0.06532928674197935,), (0.3549773108852966,),
+               (0.976336638885995,)]
         assert rands == ans
 
 def test_bql_rand2():
@@ -2643,10 +2995,10 @@ def test_bql_rand2():
             bdb.sql_execute('INSERT INTO frobotz VALUES(2)')
         cursor = bdb.execute('SELECT bql_rand() FROM frobotz LIMIT 10;')
         rands = cursor.fetchall()
-        ans = [(0.8351877951287725,), (0.9735099617243271,), (0.026142315910925418,),
-               (0.09380653289687524,), (0.1097050387582088,), (0.33154896906379605,),
-               (0.4579314980719317,), (0.09072802203491703,), (0.5276180968829105,),
-               (0.9993280772797679,)]
+        ans = [(0.42954949562597244,), (0.19308021838349432,), (0.5027108761260615,),
+               (0.05074328446582366,), (0.3691431930532768,), (0.17383548326584142,),
+               (0.8550841230855101,), (0.16337233550661512,), (0.31922755857104435,),
+               (0.33485305434750257,)]
         assert rands == ans
 
 class MockTracerOneQuery(bayeslite.IBayesDBTracer):
@@ -1247,3 +1247,62 @@ def test_using_modelnos():
                 ESTIMATE PREDICTIVE PROBABILITY OF period FROM satellites
                 USING MODELS 0-8 LIMIT 2;
             ''')
+
+def test_unincorporated_rows():
+    with cgpm_dummy_satellites_bdb() as bdb:
+        bdb.execute('''
+            CREATE POPULATION satellites FOR satellites_ucs WITH SCHEMA(
+                MODEL apogee AS NUMERICAL;
+                MODEL class_of_orbit AS CATEGORICAL;
+                MODEL country_of_operator AS CATEGORICAL;
+                MODEL launch_mass AS NUMERICAL;
+                MODEL perigee AS NUMERICAL;
+                MODEL period AS NUMERICAL
+            )
+        ''')
+        bayesdb_register_metamodel(bdb, CGPM_Metamodel(dict(), multiprocess=0))
+        bdb.execute('''
+            CREATE ANALYSIS SCHEMA g0 FOR satellites USING cgpm(
+                SUBSAMPLE 10
+            );
+        ''')
+        bdb.execute('INITIALIZE 1 ANALYSIS FOR g0')
+        population_id = bayesdb_get_population(bdb, 'satellites')
+        generator_id = bayesdb_get_generator(bdb, population_id, 'g0')
+        metamodel = bdb.metamodels['cgpm']
+        individuals = dict(bdb.sql_execute('''
+            SELECT table_rowid, cgpm_rowid FROM bayesdb_cgpm_individual
+                WHERE generator_id = ?
+        ''', (generator_id,)))
+        assert len(individuals) == 10
+        cgpm_rowids = metamodel._cgpm_rowids(bdb, generator_id)
+        assert cgpm_rowids == individuals
+        # The map is read again only when the engine changes.
+        assert metamodel._cgpm_rowids(bdb, generator_id) is cgpm_rowids
+        bdb.execute('ANALYZE g0 FOR 1 ITERATION WAIT')
+        assert metamodel._cgpm_rowids(bdb, generator_id) is not cgpm_rowids
+        assert metamodel._cgpm_rowid(bdb, generator_id, 1000) == -1
+        with pytest.raises(ValueError):
+            metamodel._cgpm_rowid(bdb, generator_id, 1000, nullok=False)
+        # Constraints from the table, for unincorporated rows only.
+        for rowid in xrange(1, 102):
+            constraints = metamodel._retrieve_table_constraints(
+                bdb, generator_id, rowid)
+            row = bdb.sql_execute('''
+                SELECT apogee, class_of_orbit, country_of_operator,
+                        launch_mass, perigee, period
+                    FROM satellites_ucs WHERE _rowid_ = ?
+            ''', (rowid,)).fetchall()
+            if rowid in individuals or not row:
+                assert constraints == []
+            else:
+                assert constraints == [
+                    (colno, value) for colno, value in enumerate(row[0])
+                    if value is not None
+                ]
+        # Crash test a query over all rows, which loads the rows of the
+        # table in chunks.
+        assert len(bdb.execute('''
+            INFER EXPLICIT PREDICT period CONFIDENCE c FROM satellites
+                MODELED BY g0
+        ''').fetchall()) == 100
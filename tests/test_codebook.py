@@ -123,3 +123,33 @@ def test_empty_codebook():
                 f.write('z, zee, eland,\n')
             with pytest.raises(IOError):
                 bayeslite.bayesdb_load_codebook_csv_file(bdb, 't', tf.name)
+
+def test_codebook_reload():
+    with bayeslite.bayesdb_open(builtin_metamodels=False) as bdb:
+        bdb.sql_execute('create table t(x, y, z)')
+        with tempfile.NamedTemporaryFile(prefix='bayeslite') as tf:
+            with open(tf.name, 'w') as f:
+                f.write('name,shortname,description,value_map\n')
+                f.write('x,eks,Greek chi,"{""a"":""A"",""b"":""B""}"\n')
+                f.write('y,why,quagga,"{""c"":""C""}"\n')
+            bayeslite.bayesdb_load_codebook_csv_file(bdb, 't', tf.name)
+            assert bdb.sql_execute('''
+                SELECT colno, key, value FROM bayesdb_column_map
+                    WHERE tabname = 't' ORDER BY colno, key
+            ''').fetchall() == [(0, 'a', 'A'), (0, 'b', 'B'), (1, 'c', 'C')]
+            with open(tf.name, 'w') as f:
+                f.write('name,shortname,description,value_map\n')
+                f.write('y,wye,gnu,"{""d"":""D""}"\n')
+                f.write('z,zed,eland,\n')
+                f.write('y,wy,gnu,"{""e"":""E""}"\n')
+            bayeslite.bayesdb_load_codebook_csv_file(bdb, 't', tf.name)
+            assert bdb.sql_execute('''
+                SELECT colno, key, value FROM bayesdb_column_map
+                    WHERE tabname = 't' ORDER BY colno, key
+            ''').fetchall() == [(0, 'a', 'A'), (0, 'b', 'B'), (1, 'e', 'E')]
+            assert bdb.sql_execute('''
+                SELECT shortname, description FROM bayesdb_column
+                    WHERE tabname = 't' ORDER BY colno
+            ''').fetchall() == [
+                ('eks', 'Greek chi'), ('wy', 'gnu'), ('zed', 'eland'),
+            ]
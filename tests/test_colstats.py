@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2017, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import StringIO
+import pytest
+
+import bayeslite
+import bayeslite.colstats as colstats
+
+from bayeslite.metamodels.nig_normal import NIGNormalMetamodel
+from bayeslite.metamodels.nig_normal import data_suff_stats
+
+def _bdb_with_table():
+    bdb = bayeslite.bayesdb_open()
+    bdb.sql_execute('CREATE TABLE t(x, y, z)')
+    for row in [
+        (1, 'a', 2.5),
+        (3, 'b', None),
+        (1, 'a', -1),
+        (2, 'c', 1.0),
+    ]:
+        bdb.sql_execute('INSERT INTO t VALUES (?, ?, ?)', row)
+    return bdb
+
+def _scans(bdb, table):
+    scans = []
+    def tracer(string, _bindings):
+        if 'FROM "%s"' % (table,) in string:
+            scans.append(string)
+    bdb.sql_trace(tracer)
+    return scans
+
+def test_column_stats():
+    with _bdb_with_table() as bdb:
+        scans = _scans(bdb, 't')
+        x = colstats.bayesdb_column_stats(bdb, 't', 0)
+        y = colstats.bayesdb_column_stats(bdb, 'T', 1)
+        z = colstats.bayesdb_column_stats(bdb, 't', 2)
+        assert len(scans) == 1
+        assert x == (4, 0, 3, 1, 3, 7., 15.)
+        assert y == (4, 0, 3, None, None, 0., 0.)
+        assert z == (3, 1, 3, -1, 2.5, 2.5, 8.25)
+        assert colstats.bayesdb_column_distinct_values(bdb, 't', 0) == \
+            [1, 3, 2]
+        assert colstats.bayesdb_column_distinct_values(bdb, 't', 1) == \
+            ['a', 'b', 'c']
+        assert len(scans) == 1
+        with pytest.raises(ValueError):
+            colstats.bayesdb_column_stats(bdb, 't', 3)
+        with pytest.raises(ValueError):
+            colstats.bayesdb_column_stats(bdb, 'u', 0)
+
+def test_column_stats_no_compute():
+    with _bdb_with_table() as bdb:
+        scans = _scans(bdb, 't')
+        assert colstats.bayesdb_column_stats(bdb, 't', 0, compute=False) \
+            is None
+        assert len(scans) == 0
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).count == 4
+        assert colstats.bayesdb_column_stats(bdb, 't', 0, compute=False) \
+            .count == 4
+        assert len(scans) == 1
+
+def test_column_stats_invalidate():
+    with _bdb_with_table() as bdb:
+        scans = _scans(bdb, 't')
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).count == 4
+        bdb.sql_execute('INSERT INTO t VALUES (5, NULL, NULL)')
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).count == 5
+        bdb.sql_execute('UPDATE t SET x = 10 WHERE x = 5')
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).max == 10
+        bdb.sql_execute('DELETE FROM t WHERE x = 10')
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).max == 3
+        bdb.sql_execute('ALTER TABLE t ADD COLUMN w')
+        assert colstats.bayesdb_column_stats(bdb, 't', 3).nulls == 4
+        assert len(scans) == 5
+        bdb.execute('ALTER TABLE t RENAME TO u')
+        assert colstats.bayesdb_column_stats(bdb, 'u', 0).count == 4
+        bdb.execute('DROP TABLE u')
+        bdb.sql_execute('CREATE TABLE u(x)')
+        assert colstats.bayesdb_column_stats(bdb, 'u', 0).count == 0
+
+def test_column_stats_bulk_load():
+    with _bdb_with_table() as bdb:
+        def ntriggers():
+            return bdb.sql_execute('''
+                SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'
+            ''').fetchvalue()
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).count == 4
+        assert ntriggers() == 3
+        # Loading drops the triggers rather than firing them per row.
+        bayeslite.bayesdb_read_csv(bdb, 't',
+            StringIO.StringIO('x,y,z\n4,d,\n5,e,\n'), header=True)
+        assert ntriggers() == 0
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).count == 6
+        assert ntriggers() == 3
+        assert bayeslite.bayesdb_nullify(bdb, 't', 'nope') == 0
+        assert ntriggers() == 3
+        assert bayeslite.bayesdb_nullify(bdb, 't', 'a') == 2
+        assert ntriggers() == 0
+        assert colstats.bayesdb_column_stats(bdb, 't', 1).nulls == 2
+
+def test_column_stats_too_many_distinct(monkeypatch):
+    monkeypatch.setattr(colstats, '_DISTINCT_LIMIT', 2)
+    with _bdb_with_table() as bdb:
+        assert colstats.bayesdb_column_stats(bdb, 't', 0).ndistinct is None
+        assert colstats.bayesdb_column_distinct_values(bdb, 't', 0) is None
+        assert colstats.bayesdb_column_stats(bdb, 't', 2).ndistinct is None
+
+def test_column_stats_old_schema():
+    with bayeslite.bayesdb_open(version=10) as bdb:
+        bdb.sql_execute('CREATE TABLE t(x)')
+        assert colstats.bayesdb_column_stats(bdb, 't', 0) is None
+        assert colstats.bayesdb_column_distinct_values(bdb, 't', 0) is None
+
+def test_nig_normal_suff_stats():
+    with _bdb_with_table() as bdb:
+        assert data_suff_stats(bdb, 't', 'x') == (4, 7, 15)
+        bayeslite.bayesdb_register_metamodel(bdb, NIGNormalMetamodel())
+        bdb.execute('CREATE POPULATION p FOR t(x NUMERICAL; IGNORE y, z)')
+        bdb.execute('CREATE GENERATOR p_nig FOR p USING nig_normal')
@@ -19,6 +19,7 @@ import contextlib
 import itertools
 import json
 import pytest
+import struct
 import tempfile
 
 import crosscat.LocalEngine
@@ -74,6 +75,38 @@ def test_prng_determinism():
     assert bdb.py_prng.uniform(0, 1) == 0.6156331606142532
     assert bdb.np_prng.uniform(0, 1) == 0.28348770982811367
 
+def test_substream_determinism():
+    bdb = bayeslite.bayesdb_open(builtin_metamodels=False)
+    x = bdb.substream(1, 2, chunk=3).weakrandom64()
+    # Drawing from other streams does not perturb the substream.
+    bdb.py_prng.uniform(0, 1)
+    bdb.substream(1, 2, chunk=4).weakrandom64()
+    assert bdb.substream(1, 2, chunk=3).weakrandom64() == x
+    assert bdb.substream(1, 2, chunk=4).weakrandom64() != x
+    assert bdb.substream(1, 3, chunk=3).weakrandom64() != x
+    assert bdb.substream(2, 2, chunk=3).weakrandom64() != x
+    assert bdb.substream(None, 2, chunk=3).weakrandom64() != x
+    # Unspecified chunks count up.
+    assert bdb.substream(1, 2).weakrandom64() == \
+        bdb.substream(1, 2, chunk=0).weakrandom64()
+    assert bdb.substream(1, 2).weakrandom64() == \
+        bdb.substream(1, 2, chunk=1).weakrandom64()
+    # Substreams depend on the seed.
+    seed = struct.pack('<QQQQ', 0, 0, 0, 1)
+    bdb1 = bayeslite.bayesdb_open(builtin_metamodels=False, seed=seed)
+    assert bdb1.substream(1, 2, chunk=3).weakrandom64() != x
+
+def test_substream_query_independence():
+    def rands(n):
+        bdb = bayeslite.bayesdb_open(builtin_metamodels=False)
+        bdb.sql_execute('CREATE TABLE t(x)')
+        for i in range(10):
+            bdb.sql_execute('INSERT INTO t VALUES(?)', (i,))
+        bdb.execute('SELECT bql_rand() FROM t LIMIT ?', (n,)).fetchall()
+        return bdb.execute('SELECT bql_rand() FROM t').fetchall()
+    # How much randomness one query consumes does not affect the next.
+    assert rands(1) == rands(10)
+
 def test_openclose():
     with bayesdb():
         pass
@@ -386,6 +419,55 @@ def test_t1_mp_analysis_iter_deadline__ci_slow():
     with analyzed_bayesdb_population(t1_mp(), 10, 1, max_seconds=10):
         pass
 
+def test_t1_initialize_multiprocess():
+    # Initializing models in parallel gives the same models as serially.
+    thetas = []
+    for multiprocess in (False, True):
+        metamodel = CrosscatMetamodel(local_crosscat(),
+            multiprocess=multiprocess)
+        with bayesdb_population(bayesdb(metamodel=metamodel),
+                't1', 'p1', 'p1_cc', t1_schema, t1_data,
+                columns=['id IGNORE', 'label CATEGORICAL', 'age NUMERICAL',
+                    'weight NUMERICAL']) as (bdb, _population_id, _gid):
+            bdb.execute('INITIALIZE 4 MODELS FOR p1_cc')
+            thetas.append([(modelno, json.loads(theta_json))
+                for modelno, theta_json in bdb.sql_execute('''
+                    SELECT modelno, theta_json FROM bayesdb_crosscat_theta
+                        ORDER BY modelno
+                ''')])
+    assert len(thetas[0]) == 4
+    assert thetas[0] == thetas[1]
+
+def test_t1_analyze_multiprocess():
+    # Analyzing models in parallel gives the same models and diagnostics
+    # as serially.
+    results = []
+    for multiprocess in (False, True):
+        metamodel = CrosscatMetamodel(local_crosscat(),
+            multiprocess=multiprocess)
+        with bayesdb_population(bayesdb(metamodel=metamodel),
+                't1', 'p1', 'p1_cc', t1_schema, t1_data,
+                columns=['id IGNORE', 'label CATEGORICAL', 'age NUMERICAL',
+                    'weight NUMERICAL']) as (bdb, _population_id, _gid):
+            bdb.execute('INITIALIZE 4 MODELS FOR p1_cc')
+            bdb.execute('ANALYZE p1_cc FOR 2 ITERATIONS'
+                ' CHECKPOINT 1 ITERATION WAIT')
+            thetas = [(modelno, json.loads(theta_json))
+                for modelno, theta_json in bdb.sql_execute('''
+                    SELECT modelno, theta_json FROM bayesdb_crosscat_theta
+                        ORDER BY modelno
+                ''')]
+            diagnostics = bdb.sql_execute('''
+                SELECT modelno, checkpoint, logscore, num_views,
+                        column_crp_alpha, iterations
+                    FROM bayesdb_crosscat_diagnostics
+                    ORDER BY modelno, checkpoint
+            ''').fetchall()
+            results.append((thetas, diagnostics))
+    assert len(results[0][0]) == 4
+    assert len(results[0][1]) == 8
+    assert results[0] == results[1]
+
 def test_t1_analysis_time_deadline():
     with analyzed_bayesdb_population(t1(), 10, None, max_seconds=1):
         pass
@@ -489,6 +571,93 @@ def test_twocolumn(exname, colno0, colno1):
             ' bql_column_mutual_information(?, NULL, NULL, ?, ?, 100)',
             (population_id, colno0_json, colno1_json)).fetchall()
 
+def test_row_similarities(monkeypatch):
+    with analyzed_bayesdb_population(t1(), 2, 1) \
+            as (bdb, population_id, generator_id):
+        # Similarities to one target row computed for all rows at once
+        # within a query agree with those computed row by row.
+        colno = core.bayesdb_variable_number(bdb, population_id, None, 'age')
+        expected = bdb.sql_execute('''
+            SELECT rowid, bql_row_similarity(?, NULL, NULL, rowid, 1, ?)
+                FROM t1 ORDER BY 2 DESC, rowid LIMIT 3
+        ''', (population_id, colno)).fetchall()
+        assert bdb.execute('''
+            ESTIMATE rowid, SIMILARITY TO (rowid = 1) IN THE CONTEXT OF age
+                FROM p1
+                ORDER BY SIMILARITY TO (rowid = 1) IN THE CONTEXT OF age DESC,
+                    rowid
+                LIMIT 3
+        ''').fetchall() == expected
+        metamodel = core.bayesdb_generator_metamodel(bdb, generator_id)
+        similarities = metamodel.row_similarities(
+            bdb, generator_id, [1], 1, [colno])
+        # Only a target fixed for the whole query is batched.
+        batches = []
+        def row_similarities(*args):
+            batches.append(args)
+            return similarities
+        monkeypatch.setattr(metamodel, 'row_similarities', row_similarities)
+        bdb.execute('ESTIMATE SIMILARITY IN THE CONTEXT OF age'
+            ' FROM PAIRWISE p1').fetchall()
+        assert len(batches) == 0
+        bdb.execute('ESTIMATE SIMILARITY TO (rowid = 1)'
+            ' IN THE CONTEXT OF age FROM p1').fetchall()
+        assert len(batches) == 1
+        for rowid in range(1, len(t1_rows) + 1):
+            assert similarities[rowid] == metamodel.row_similarity(
+                bdb, generator_id, [1], rowid, 1, [colno])
+
+def test_mutinf_tolerance(monkeypatch):
+    with analyzed_bayesdb_population(t1(), 2, 1) \
+            as (bdb, population_id, generator_id):
+        estimate, stderr = bdb.execute('''
+            ESTIMATE MUTUAL INFORMATION OF age WITH weight
+                    USING 10 SAMPLES TOLERANCE 100,
+                MUTUAL INFORMATION OF age WITH weight
+                    USING 20 SAMPLES STANDARD ERROR
+                FROM p1 LIMIT 1
+        ''').fetchone()
+        assert 0 <= stderr
+        # An estimate and its standard error come from the same batches.
+        batches = []
+        mutinf = bqlfn._bql_column_mutual_information
+        def counting_mutinf(*args):
+            batches.append(mutinf(*args))
+            return batches[-1]
+        monkeypatch.setattr(bqlfn, '_bql_column_mutual_information',
+            counting_mutinf)
+        estimate, stderr = bdb.execute('''
+            ESTIMATE MUTUAL INFORMATION OF age WITH weight,
+                MUTUAL INFORMATION OF age WITH weight STANDARD ERROR
+                FROM p1 LIMIT 1
+        ''').fetchone()
+        monkeypatch.undo()
+        assert len(batches) == 2
+        [[b0], [b1]] = batches
+        assert abs(sum((x + y)/2. for x, y in zip(b0, b1))/len(b0) -
+            estimate) < 1e-12
+        assert stderr == bqlfn._mutinf_stderr(batches)
+        # A loose tolerance is met after the first batch.
+        means, stderr = bqlfn._bql_column_mutual_information_adaptive(
+            bdb, population_id, generator_id, None, '[2]', '[3]', 10, 100)
+        assert len(means) == 1
+        assert len(means[0]) == 2
+        assert stderr is None or stderr <= 100
+        with pytest.raises(bayeslite.BQLError):
+            bqlfn._bql_column_mutual_information_adaptive(
+                bdb, population_id, generator_id, None, '[2]', '[3]', 10, 0)
+        assert len(bdb.execute('''
+            SIMULATE MUTUAL INFORMATION OF age WITH weight
+                USING 10 SAMPLES TOLERANCE 100 AS mi
+                FROM MODELS OF p1
+        ''').fetchall()) == 2
+        with pytest.raises(bayeslite.BQLError):
+            bdb.execute('''
+                SIMULATE MUTUAL INFORMATION OF age WITH weight
+                    STANDARD ERROR
+                    FROM MODELS OF p1
+            ''').fetchall()
+
 @pytest.mark.parametrize('colno,rowid',
     [(colno, rowid)
         for colno in range(1,4)
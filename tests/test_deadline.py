@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+import threading
+import time
+
+import bayeslite
+import bayeslite.core as core
+
+import test_core
+
+# A query that takes far longer than any test should.
+slow_query = 'SELECT COUNT(*) FROM n AS a, n AS b, n AS c'
+
+def bayesdb_slow():
+    bdb = bayeslite.bayesdb_open(builtin_metamodels=False)
+    bdb.sql_execute('CREATE TABLE n(i INTEGER)')
+    with bdb.savepoint():
+        for i in xrange(1000):
+            bdb.sql_execute('INSERT INTO n(i) VALUES (?)', (i,))
+    return bdb
+
+def test_timeout_sql():
+    with bayesdb_slow() as bdb:
+        start = time.time()
+        with pytest.raises(bayeslite.BQLTimeoutError):
+            bdb.execute(slow_query, timeout=0.1).fetchall()
+        assert time.time() - start < 10
+        # The database is still usable afterward.
+        assert bdb.execute('SELECT COUNT(*) FROM n').fetchvalue() == 1000
+        assert bdb.execute('SELECT 42', timeout=10).fetchvalue() == 42
+
+def test_timeout_rollback():
+    with bayesdb_slow() as bdb:
+        with pytest.raises(bayeslite.BQLTimeoutError):
+            bdb.execute('CREATE TABLE m AS %s' % (slow_query,), timeout=0.1)
+        assert not core.bayesdb_has_table(bdb, 'm')
+        bdb.execute('BEGIN')
+        bdb.sql_execute('INSERT INTO n(i) VALUES (1000)')
+        with pytest.raises(bayeslite.BQLTimeoutError):
+            bdb.execute('CREATE TABLE m AS %s' % (slow_query,), timeout=0.1)
+        bdb.execute('ROLLBACK')
+        assert not core.bayesdb_has_table(bdb, 'm')
+        assert bdb.execute('SELECT COUNT(*) FROM n').fetchvalue() == 1000
+
+def test_interrupt():
+    with bayesdb_slow() as bdb:
+        # Interrupting with no query in progress has no effect.
+        bdb.interrupt()
+        assert bdb.execute('SELECT 42').fetchvalue() == 42
+        timer = threading.Timer(0.1, bdb.interrupt)
+        timer.start()
+        try:
+            with pytest.raises(bayeslite.BQLTimeoutError):
+                bdb.execute(slow_query).fetchall()
+        finally:
+            timer.cancel()
+        assert bdb.execute('SELECT 42').fetchvalue() == 42
+
+def test_timeout_bqlfn():
+    with test_core.analyzed_bayesdb_population(test_core.t1(), 1, 1) \
+            as (bdb, _population_id, _generator_id):
+        bql = 'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1'
+        with pytest.raises(bayeslite.BQLTimeoutError):
+            bdb.execute(bql, timeout=0).fetchall()
+        results = bdb.execute(bql, timeout=10).fetchall()
+        assert len(results) == len(test_core.t1_rows)
+
+def test_timeout_analyze():
+    with test_core.t1() as (bdb, _population_id, generator_id):
+        bdb.execute('INITIALIZE 1 MODEL FOR p1_cc')
+        with pytest.raises(bayeslite.BQLTimeoutError):
+            bdb.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT', timeout=0)
+        iterations = bdb.sql_execute('''
+            SELECT iterations FROM bayesdb_generator_model
+                WHERE generator_id = ?
+        ''', (generator_id,)).fetchvalue()
+        assert iterations == 0
@@ -24,7 +24,7 @@ def test_expand_probability_estimate():
             ['c0'],
             ['c1', 'c2'],
             [('c3', ast.ExpLit(ast.LitInt(3)))],
-            None),
+            None, None, False),
         ast.ExpLit(ast.LitFloat(0.1)),
     ])
     probest = ast.ExpBQLProbEst(expression)
@@ -43,7 +43,7 @@ def test_expand_probability_estimate():
 def test_simulate_models_trivial():
     e = ast.ExpBQLMutInf(['c0'], ['c1', 'c2'],
         [('c3', ast.ExpLit(ast.LitInt(3)))],
-        None)
+        None, None, False)
     simmodels = ast.SimulateModelsExp([ast.SelColExp(e, 'x')], 'p', 'g')
     assert macro.expand_simulate_models(simmodels) == \
         ast.SimulateModels([ast.SelColExp(e, 'x')], 'p', 'g')
@@ -64,10 +64,10 @@ def test_simulate_models_nontrivial():
     # XXX test descent into ExpCase
     mutinf0 = ast.ExpBQLMutInf(['c0'], ['c1', 'c2'],
         [('c3', ast.ExpLit(ast.LitInt(3)))],
-        None)
+        None, None, False)
     mutinf1 = ast.ExpBQLMutInf(['c4', 'c5'], ['c6'],
         [('c7', ast.ExpLit(ast.LitString('ergodic')))],
-        100)
+        100, None, False)
     probdensity = ast.ExpBQLProbDensity(
         [('x', ast.ExpLit(ast.LitFloat(1.2)))],
         # No conditions for now -- that changes the weighting of the average.
@@ -15,8 +15,11 @@
 #   limitations under the License.
 
 import math
+import numpy
 import pytest
 
+import bayeslite.math_util as math_util
+
 from bayeslite.math_util import *
 
 def pi_cf():
@@ -87,7 +90,10 @@ def test_misc():
     assert relerr(math.pi, pi_ps()) < EPSILON
     assert relerr((1 + math.sqrt(5))/2, phi_cf()) < EPSILON
 
-def test_logsumexp():
+# Reduce one-dimensional input in Python, and with numpy.
+@pytest.mark.parametrize('short_length', [0, 1000])
+def test_logsumexp(monkeypatch, short_length):
+    monkeypatch.setattr(math_util, '_SHORT_LENGTH', short_length)
     inf = float('inf')
     nan = float('nan')
     with pytest.raises(OverflowError):
@@ -104,7 +110,9 @@ def test_logsumexp():
     assert math.isnan(logsumexp([nan, inf]))
     assert math.isnan(logsumexp([nan, -3]))
 
-def test_logmeanexp():
+@pytest.mark.parametrize('short_length', [0, 1000])
+def test_logmeanexp(monkeypatch, short_length):
+    monkeypatch.setattr(math_util, '_SHORT_LENGTH', short_length)
     inf = float('inf')
     nan = float('nan')
     assert logmeanexp([]) == -inf
@@ -127,3 +135,70 @@ def test_logavgexp_weighted():
     # XXX Expand me!
     assert relerr(-1000 - logsumexp([500, -500]) + math.log(2),
             logavgexp_weighted([500, -500], [-1500, -500])) < 1e-15
+
+def test_logsumexp_axis():
+    inf = float('inf')
+    nan = float('nan')
+    rows = [
+        [0., 0.],
+        [-1000., -1000.],
+        [-inf, 1.],
+        [-inf, -inf],
+        [+inf, +inf],
+        [-inf, +inf],
+        [nan, -3.],
+        [-3., +inf],
+    ]
+    columns = numpy.array(rows).T
+    for f in (logsumexp, logmeanexp):
+        results = f(columns, axis=0)
+        assert results.shape == (len(rows),)
+        for row, result in zip(rows, results):
+            expected = f(row)
+            assert (math.isnan(expected) and math.isnan(result)) or \
+                expected == result
+        numpy.testing.assert_array_equal(f(numpy.array(rows), axis=1),
+            results)
+    assert logsumexp(numpy.zeros((0, 3))).tolist() == [-inf, -inf, -inf]
+    assert logmeanexp(numpy.zeros((3, 0)), axis=1).tolist() == \
+        [-inf, -inf, -inf]
+    log_W = numpy.array([[500.], [-500.]])
+    log_A = numpy.array([[-1500., 0.], [-500., 0.]])
+    assert relerr(
+            logavgexp_weighted([500, -500], [-1500, -500]),
+            logavgexp_weighted(log_W, log_A)[0]) < 1e-15
+    assert abs(logavgexp_weighted(log_W, log_A)[1]) < 1e-15
+
+GAMMA_A = [.05, .3, 1., 2.1, 6., 60.5]
+GAMMA_X = [0., .05, .4, 1., 1.9, 4.5, 8., 96.5]
+
+@pytest.mark.parametrize('scipy', [True, False])
+def test_gamma_array(monkeypatch, scipy):
+    if scipy:
+        pytest.importorskip('scipy.special')
+    else:
+        monkeypatch.setattr(math_util, '_SCIPY_SPECIAL', False)
+    A = numpy.array(GAMMA_A)
+    X = numpy.array(GAMMA_X)
+    below = gamma_below(A[:, None], X)
+    above = gamma_above(A[:, None], X)
+    assert below.shape == above.shape == (len(A), len(X))
+    # Check against the pure Python scalar functions.
+    for i, a in enumerate(A):
+        for j, x in enumerate(X):
+            assert abserr(math_util._gamma_below(a, x), below[i, j]) < 1e-13
+            assert abserr(math_util._gamma_above(a, x), above[i, j]) < 1e-13
+
+@pytest.mark.parametrize('scipy', [True, False])
+def test_gamma_scalar(monkeypatch, scipy):
+    special = pytest.importorskip('scipy.special')
+    if not scipy:
+        monkeypatch.setattr(math_util, '_SCIPY_SPECIAL', False)
+    for a in GAMMA_A:
+        for x in GAMMA_X:
+            below = gamma_below(a, x)
+            above = gamma_above(a, x)
+            assert isinstance(below, float)
+            assert isinstance(above, float)
+            assert abserr(special.gammainc(a, x), below) < 1e-13
+            assert abserr(special.gammaincc(a, x), above) < 1e-13
@@ -202,3 +202,41 @@ def _retest_example(bdb, exname):
     bdb.execute('ANALYZE %s FOR 1 ITERATION WAIT' % (qg,))
     bdb.execute('ANALYZE %s MODEL 0 FOR 1 ITERATION WAIT' % (qg,))
     bdb.execute('ANALYZE %s MODEL 1 FOR 1 ITERATION WAIT' % (qg,))
+
+def test_lazy_builtin():
+    with bayeslite.bayesdb_open() as bdb:
+        # Builtin metamodels count as registered but are registered
+        # only on first use.
+        assert 'crosscat' in bdb.metamodels
+        assert 'crosscat' not in bdb.metamodels.keys()
+        assert not core.bayesdb_has_table(bdb, 'bayesdb_crosscat_theta')
+        with pytest.raises(ValueError):
+            bayeslite.bayesdb_register_metamodel(bdb,
+                CrosscatMetamodel(crosscat.LocalEngine.LocalEngine(seed=0)))
+        bdb.sql_execute('CREATE TABLE t(x NUMERIC)')
+        bdb.execute('CREATE POPULATION p FOR t(x NUMERICAL)')
+        bdb.execute('CREATE GENERATOR p_cc FOR p USING crosscat()')
+        assert core.bayesdb_has_table(bdb, 'bayesdb_crosscat_theta')
+        bdb.metamodels['crosscat']
+        assert 'crosscat' in bdb.metamodels.keys()
+        assert core.bayesdb_has_table(bdb, 'bayesdb_crosscat_theta')
+        assert 'nonesuch' not in bdb.metamodels
+        with pytest.raises(KeyError):
+            bdb.metamodels['nonesuch']
+
+def test_lazy_builtin_rollback():
+    with bayeslite.bayesdb_open() as bdb:
+        bdb.sql_execute('CREATE TABLE t(x NUMERIC)')
+        for x in xrange(10):
+            bdb.sql_execute('INSERT INTO t (x) VALUES (?)', (x,))
+        bdb.execute('CREATE POPULATION p FOR t(x NUMERICAL)')
+        # Rolling back the first use of a builtin metamodel rolls back
+        # its registration too.
+        bdb.execute('BEGIN')
+        bdb.execute('CREATE GENERATOR p_cc FOR p USING crosscat()')
+        bdb.execute('ROLLBACK')
+        assert not core.bayesdb_has_table(bdb, 'bayesdb_crosscat_theta')
+        assert 'crosscat' in bdb.metamodels
+        bdb.execute('CREATE GENERATOR p_cc FOR p USING crosscat()')
+        bdb.execute('INITIALIZE 1 MODEL FOR p_cc')
+        assert core.bayesdb_has_table(bdb, 'bayesdb_crosscat_theta')
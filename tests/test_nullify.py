@@ -53,3 +53,45 @@ def test_nullify():
             (None, None),
         ]
         assert bayesdb_nullify(bdb, 't', 'fnord') == 0
+
+def test_nullify_values():
+    with bayesdb_open(':memory:') as bdb:
+        bdb.sql_execute('create table t(x,y,z)')
+        for row in [
+            ['1', '', 'nan'],
+            ['nan', 'foo', None],
+            ['2', 'NA', 'bar'],
+            [None, None, None],
+        ]:
+            bdb.sql_execute('insert into t values(?,?,?)', row)
+        assert bayesdb_nullify(bdb, 't', ['', 'nan', 'NA']) == 4
+        assert bdb.execute('select * from t').fetchall() == [
+            ('1', None, None),
+            (None, 'foo', None),
+            ('2', None, 'bar'),
+            (None, None, None),
+        ]
+        assert bayesdb_nullify(bdb, 't', set(['foo', 'bar']),
+            columns=['y']) == 1
+        assert bdb.execute('select y from t').fetchall() == [
+            (None,), (None,), (None,), (None,),
+        ]
+        assert bayesdb_nullify(bdb, 't', []) == 0
+        assert bayesdb_nullify(bdb, 't', '2', columns=[]) == 0
+
+def test_nullify_wide():
+    # Wider than any one sqlite3 expression may be deep.
+    ncols = 1500
+    row = ["''" if i % 3 == 0 else "'%d'" % (i,) for i in xrange(ncols)]
+    with bayesdb_open(':memory:') as bdb:
+        bdb.sql_execute('create table t(%s)' %
+            (','.join('c%d' % (i,) for i in xrange(ncols)),))
+        # Too many columns to insert with parameters.
+        bdb.sql_execute('insert into t values(%s)' % (','.join(row),))
+        bdb.sql_execute('insert into t values(%s)' %
+            (','.join(["'x'"] * ncols),))
+        assert bayesdb_nullify(bdb, 't', ['', 'x']) == ncols + ncols/3
+        assert bdb.execute('select * from t').fetchall() == [
+            tuple(None if i % 3 == 0 else str(i) for i in xrange(ncols)),
+            (None,) * ncols,
+        ]
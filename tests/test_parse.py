@@ -35,6 +35,14 @@ def parse_bql_string(string):
         assert phrase0 == phrase
         assert pos0 == pos - start
         start = pos
+    # Fed a code point at a time, the incremental parser finds the same
+    # phrases.
+    parser = parse.BQLIncrementalParser()
+    incremental = []
+    for c in string:
+        incremental.extend(phrase for phrase, _string in parser.feed(c))
+    incremental.extend(phrase for phrase, _string in parser.close())
+    assert incremental == phrases
     return phrases
 
 def test_empty():
@@ -46,6 +54,36 @@ def test_empty():
     assert [] == parse_bql_string(' ; ')
     assert [] == parse_bql_string(' ; ; ')
 
+def test_incremental():
+    parser = parse.BQLIncrementalParser()
+    assert not parser.incomplete()
+    assert ['select 0;'] == \
+        [string for _phrase, string in parser.feed('select 0; select 1e')]
+    assert parser.incomplete()
+    assert ['select 1e+1 ;'] == \
+        [string for _phrase, string in parser.feed('+1 ;;\n-- x\n')]
+    assert not parser.incomplete()
+    assert [] == list(parser.feed("select 'x;"))
+    assert parser.incomplete()
+    assert [] == list(parser.feed("\n"))
+    assert parser.incomplete()
+    assert [] == list(parser.feed("'"))
+    assert ["-- x\nselect 'x;\n'';';"] == \
+        [string for _phrase, string in parser.feed("';';")]
+    assert not parser.incomplete()
+    assert [] == list(parser.close())
+    with pytest.raises(parse.BQLParseError):
+        list(parser.feed('select 0c; select 1;\n'))
+    assert not parser.incomplete()
+    # Parameters are numbered anew in each phrase.
+    phrases = list(parser.feed('select ?; select :x, ?;\n'))
+    assert [phrase.n_numpar for phrase, _string in phrases] == [1, 2]
+    assert [] == list(parser.feed('select :y'))
+    assert [ast.Parametrized(ast.Select(ast.SELQUANT_ALL,
+                [ast.SelColExp(ast.ExpNampar(1, ':y'), None)],
+                None, None, None, None, None),
+            1, {':y': 1})] == [phrase for phrase, _string in parser.close()]
+
 def test_multiquery():
     assert parse_bql_string('select 0; select 1;') == [
         ast.Select(ast.SELQUANT_ALL,
@@ -487,17 +525,22 @@ def test_select_bql():
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select mutual information with c from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
-            [ast.SelColExp(ast.ExpBQLMutInf(['c'], None, None, None), None)],
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], None, None, None, None, False),
+                None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select mutual information with (c) from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
-            [ast.SelColExp(ast.ExpBQLMutInf(['c'], None, None, None), None)],
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], None, None, None, None, False),
+                None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string(
             'select mutual information of c with (d) from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
-            [ast.SelColExp(ast.ExpBQLMutInf(['c'], ['d'], None, None),
-            None)],
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], ['d'], None, None, None, False),
+                None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string(
             'select mutual information of (a, b, q) with (d, r) '
@@ -508,7 +551,7 @@ def test_select_bql():
                 [('f', ast.ExpLit(ast.LitNull(0))),
                     ('z',ast.ExpLit(ast.LitInt(2))),
                     ('w', ast.ExpLit(ast.LitNull(0)))],
-                None),
+                None, None, False),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('select mutual information of c with d' +
@@ -519,7 +562,7 @@ def test_select_bql():
                     ['c'], ['d'], None,
                     ast.op(
                         ast.OP_ADD, ast.ExpLit(ast.LitInt(1)),
-                        ast.ExpLit(ast.LitInt(2)))),
+                        ast.ExpLit(ast.LitInt(2))), None, False),
                 None)],
             [ast.SelTab('t', None)], None, None, None, None)]
     assert parse_bql_string('''
@@ -532,7 +575,7 @@ def test_select_bql():
                     ['c'], None,
                     [('d', ast.ExpLit(ast.LitNull(0))),
                         ('a',ast.ExpLit(ast.LitInt(1)))],
-                    ast.ExpLit(ast.LitInt(10))
+                    ast.ExpLit(ast.LitInt(10)), None, False
                 ),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
@@ -547,7 +590,7 @@ def test_select_bql():
                     None,
                     [('d', ast.ExpLit(ast.LitNull(0))),
                         ('a',ast.ExpLit(ast.LitInt(1)))],
-                    ast.ExpLit(ast.LitInt(10))
+                    ast.ExpLit(ast.LitInt(10)), None, False
                 ),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
@@ -565,10 +608,40 @@ def test_select_bql():
                         ('e', ast.ExpLit(ast.LitNull(0))),
                         ('r', ast.ExpLit(ast.LitInt(2))),
                     ],
-                    None
+                    None, None, False
                 ),
             None)],
             [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select mutual information of c with d'
+            ' using 10 samples tolerance 0.01 from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], ['d'], None,
+                    ast.ExpLit(ast.LitInt(10)),
+                    ast.ExpLit(ast.LitFloat(0.01)), False),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    assert parse_bql_string('select mutual information'
+            ' of c with d tolerance 0.1 standard error from t;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(
+                ast.ExpBQLMutInf(['c'], ['d'], None, None,
+                    ast.ExpLit(ast.LitFloat(0.1)), True),
+                None)],
+            [ast.SelTab('t', None)], None, None, None, None)]
+    # STANDARD is a keyword only after MUTUAL INFORMATION.
+    assert parse_bql_string('select standard, standard + 1 from t'
+            ' where standard = 4;') == \
+        [ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(ast.ExpCol(None, 'standard'), None),
+                ast.SelColExp(ast.ExpOp(ast.OP_ADD, (
+                    ast.ExpCol(None, 'standard'),
+                    ast.ExpLit(ast.LitInt(1)))), None)],
+            [ast.SelTab('t', None)],
+            ast.ExpOp(ast.OP_EQ, (
+                ast.ExpCol(None, 'standard'),
+                ast.ExpLit(ast.LitInt(4)))),
+            None, None, None)]
     assert parse_bql_string('select correlation with c from t;') == \
         [ast.Select(ast.SELQUANT_ALL,
             [ast.SelColExp(ast.ExpBQLCorrel('c', None), None)],
@@ -1264,7 +1337,7 @@ def test_simulate_models():
                                 ('e', ast.ExpLit(ast.LitNull(0))),
                                 ('r', ast.ExpLit(ast.LitFloat(2.7)))
                             ],
-                            ast.ExpLit(ast.LitInt(100))),
+                            ast.ExpLit(ast.LitInt(100)), None, False),
                         'g'
                     ),
                 ],
@@ -1288,7 +1361,7 @@ def test_simulate_models():
                                 ('e', ast.ExpLit(ast.LitNull(0))),
                                 ('r', ast.ExpLit(ast.LitFloat(2.7)))
                             ],
-                            ast.ExpLit(ast.LitInt(100))),
+                            ast.ExpLit(ast.LitInt(100)), None, False),
                         'g'
                     ),
                 ],
@@ -1339,7 +1412,7 @@ def test_simulate_models():
                                         ('e', ast.ExpLit(ast.LitNull(0))),
                                         ('r', ast.ExpLit(ast.LitFloat(2.7)))
                                     ],
-                                    ast.ExpLit(ast.LitInt(100))),
+                                    ast.ExpLit(ast.LitInt(100)), None, False),
                                 'g'
                             ),
                         ],
@@ -1360,7 +1433,7 @@ def test_is_bql():
     assert ast.is_bql(ast.ExpBQLProbDensityFn(ast.ExpLit(ast.LitInt(0)), []))
     assert ast.is_bql(ast.ExpBQLSim(None, ast.ExpLit(ast.LitInt(0)), []))
     assert ast.is_bql(ast.ExpBQLDepProb('c0', 'c1'))
-    assert ast.is_bql(ast.ExpBQLMutInf('c0', 'c1', None, 100))
+    assert ast.is_bql(ast.ExpBQLMutInf('c0', 'c1', None, 100, None, False))
     assert ast.is_bql(ast.ExpBQLCorrel('c0', 'c1'))
     assert ast.is_bql(ast.ExpBQLPredict('c', ast.ExpLit(ast.LitInt(.5)), None))
     assert ast.is_bql(ast.ExpBQLPredictConf('c', None))
@@ -1492,6 +1565,7 @@ def test_using_model():
             population='t',
             generator='g',
             modelnos=[1,2],
+            sample=None,
             condition=None,
             grouping=None,
             order=None,
@@ -1558,6 +1632,94 @@ def test_using_model():
             limit=None)
     ]
 
+def test_using_model_subset():
+    assert parse_bql_string('estimate x from t modeled by g'
+            ' using top 3 models by logscore') == [
+        ast.Estimate(
+            quantifier=ast.SELQUANT_ALL,
+            columns=[ast.SelColExp(ast.ExpCol(None, 'x'), None)],
+            population='t',
+            generator='g',
+            modelnos=ast.ModelSubset(ast.MODELSUBSET_TOP, 3),
+            sample=None,
+            condition=None,
+            grouping=None,
+            order=None,
+            limit=None)
+    ]
+    assert parse_bql_string('simulate x from t using 2 random models'
+            ' limit 10') == [
+        ast.Simulate(
+            columns=[ast.SelColExp(ast.ExpCol(None, 'x'), None)],
+            population='t',
+            generator=None,
+            modelnos=ast.ModelSubset(ast.MODELSUBSET_RANDOM, 2),
+            constraints=[],
+            nsamples=ast.ExpLit(ast.LitInt(10)),
+            accuracy=None)
+    ]
+    # The new keywords still work as names.
+    assert parse_bql_string('select random(), top, logscore from t') == [
+        ast.Select(ast.SELQUANT_ALL,
+            [
+                ast.SelColExp(ast.ExpApp(False, 'random', []), None),
+                ast.SelColExp(ast.ExpCol(None, 'top'), None),
+                ast.SelColExp(ast.ExpCol(None, 'logscore'), None),
+            ],
+            [ast.SelTab('t', None)], None, None, None, None)
+    ]
+
+def test_estimate_sample():
+    assert parse_bql_string('estimate avg(x) from t sample 100 rows'
+            ' where y > 0') == [
+        ast.Estimate(
+            quantifier=ast.SELQUANT_ALL,
+            columns=[ast.SelColExp(
+                ast.ExpApp(False, 'avg', [ast.ExpCol(None, 'x')]), None)],
+            population='t',
+            generator=None,
+            modelnos=None,
+            sample=ast.Sample(ast.SAMPLE_ROWS, 100),
+            condition=ast.op(ast.OP_GT, ast.ExpCol(None, 'y'),
+                ast.ExpLit(ast.LitInt(0))),
+            grouping=None,
+            order=None,
+            limit=None)
+    ]
+    assert parse_bql_string('estimate x from t using model 1'
+            ' sample 2.5 percent')[0].sample == \
+        ast.Sample(ast.SAMPLE_PERCENT, 2.5)
+    with pytest.raises(parse.BQLParseError):
+        parse_bql_string('estimate * from columns of t sample 2 rows')
+    with pytest.raises(parse.BQLParseError):
+        parse_bql_string('estimate x from t sample 2')
+
+def test_explain():
+    assert parse_bql_string('explain estimate x from t where y > ?') == [
+        ast.Parametrized(ast.Explain(
+            ast.Estimate(
+                quantifier=ast.SELQUANT_ALL,
+                columns=[ast.SelColExp(ast.ExpCol(None, 'x'), None)],
+                population='t',
+                generator=None,
+                modelnos=None,
+                sample=None,
+                condition=ast.ExpOp(ast.OP_GT, (
+                    ast.ExpCol(None, 'y'),
+                    ast.ExpNumpar(1),
+                )),
+                grouping=None,
+                order=None,
+                limit=None)), 1, {})
+    ]
+    assert parse_bql_string('explain select explain from explain') == [
+        ast.Explain(ast.Select(ast.SELQUANT_ALL,
+            [ast.SelColExp(ast.ExpCol(None, 'explain'), None)],
+            [ast.SelTab('explain', None)], None, None, None, None))
+    ]
+    with pytest.raises(parse.BQLParseError):
+        parse_bql_string('explain drop table t')
+
 @contextlib.contextmanager
 def raises_str(klass, string):
     with pytest.raises(klass):
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import apsw
+import os
+import pytest
+import tempfile
+import threading
+
+import bayeslite
+
+from bayeslite.exception import BQLError
+
+import test_core
+
+@pytest.yield_fixture
+def pathname():
+    fd, pathname = tempfile.mkstemp(prefix='bayeslite', suffix='.bdb')
+    os.close(fd)
+    os.unlink(pathname)
+    try:
+        with bayeslite.bayesdb_open(pathname=pathname) as bdb:
+            test_core.t1_schema(bdb)
+            test_core.t1_data(bdb)
+            bdb.execute('''
+                CREATE POPULATION p1 FOR t1 (
+                    id IGNORE;
+                    label NOMINAL;
+                    age NUMERICAL;
+                    weight NUMERICAL
+                )
+            ''')
+            bdb.execute('CREATE GENERATOR p1_cc FOR p1 USING crosscat()')
+            bdb.execute('INITIALIZE 2 MODELS FOR p1_cc')
+        yield pathname
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(pathname + suffix):
+                os.unlink(pathname + suffix)
+
+def test_readonly(pathname):
+    with pytest.raises(ValueError):
+        bayeslite.bayesdb_open(readonly=True)
+    with bayeslite.bayesdb_open(pathname=pathname, readonly=True) as bdb:
+        assert bdb.execute('SELECT COUNT(*) FROM t1').fetchvalue() == \
+            len(test_core.t1_rows)
+        bdb.execute('ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1')\
+            .fetchall()
+        with pytest.raises(apsw.ReadOnlyError):
+            bdb.sql_execute('DELETE FROM t1')
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_pool(pathname, processes):
+    bql = 'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1 LIMIT ?'
+    with bayeslite.BayesDBPool(pathname, nreaders=2,
+            processes=processes) as pool:
+        def analyze():
+            pool.writer.execute('ANALYZE p1_cc FOR 2 ITERATIONS WAIT')
+        writer = threading.Thread(target=analyze)
+        writer.start()
+        results = [pool.submit(bql, (k,)) for k in xrange(1, 8)]
+        assert [len(result.get()) for result in results] == range(1, 8)
+        writer.join()
+        assert len(pool.execute(bql, (3,))) == 3
+        with pytest.raises(BQLError):
+            pool.execute('ESTIMATE PREDICTIVE PROBABILITY OF nonesuch'
+                ' FROM p1')
+        # Readers see the writer's commits.
+        pool.writer.sql_execute('DELETE FROM t1 WHERE id = 1')
+        assert pool.execute('SELECT COUNT(*) FROM t1') == \
+            [(len(test_core.t1_rows) - 1,)]
+
+def test_pool_shared_thetas(pathname):
+    with bayeslite.BayesDBPool(pathname, nreaders=2) as pool:
+        generator_id = bayeslite.core.bayesdb_get_generator(
+            pool.writer, None, 'p1_cc')
+        metamodel = pool.writer.metamodels['crosscat']
+        def theta():
+            with pool.reader() as reader:
+                return metamodel._crosscat_theta(reader, generator_id, 0)
+        # Readers share the thetas they parse...
+        thetas = [theta() for _ in xrange(2)]
+        assert thetas[0] is thetas[1]
+        # ...until the writer changes them.
+        pool.writer.execute('ANALYZE p1_cc FOR 1 ITERATION WAIT')
+        assert theta() is not thetas[0]
+        assert theta() == metamodel._crosscat_theta(
+            pool.writer, generator_id, 0)
+    # Closing the pool forgets them.
+    assert not any(key[0] is pool for key in metamodel._shared_thetas)
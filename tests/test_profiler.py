@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import bayeslite
+
+import test_core
+
+def test_profiler():
+    with test_core.analyzed_bayesdb_population(test_core.t1(), 1, 1) \
+            as (bdb, _population_id, _generator_id):
+        profiler = bayeslite.BayesDBProfiler()
+        bdb.profile(profiler)
+        bql = 'ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1'
+        results = bdb.execute(bql).fetchall()
+        bdb.unprofile(profiler)
+        assert len(results) == len(test_core.t1_rows)
+        report = profiler.report()
+        qids = set(r[0] for r in report if r[1] == bql)
+        assert len(qids) == 1
+        qid = qids.pop()
+        records = dict(((phase, name), (calls, total, self_))
+            for qid_, _query, phase, name, calls, total, self_ in report
+            if qid_ == qid)
+        assert ('parse', None) in records
+        assert ('compile', None) in records
+        assert ('sql', 'execute') in records
+        assert ('sql', 'step') in records
+        calls, _total, _self = \
+            records['bqlfn', 'bql_row_column_predictive_probability']
+        assert calls == len(test_core.t1_rows)
+        assert any(phase == 'metamodel' and name.startswith('crosscat.')
+            for phase, name in records)
+        for calls, total, self_ in records.itervalues():
+            assert 0 < calls
+            assert 0 <= self_ <= total + 1e-9
+        # The report is queryable from BQL.
+        rows = bdb.execute('''
+            SELECT calls FROM bayesdb_profile
+                WHERE qid = ? AND phase = 'bqlfn'
+                    AND name = 'bql_row_column_predictive_probability'
+        ''', (qid,)).fetchall()
+        assert rows == [(len(test_core.t1_rows),)]
+        # Nothing more is recorded once the profiler is removed.
+        n = len(profiler.report())
+        bdb.execute(bql).fetchall()
+        assert len(profiler.report()) == n
@@ -67,6 +67,19 @@ def test_schema_upgrade_on_open():
                 print "old_version =", old_version, "file =", f.name
                 raise
 
+def test_schema_readonly():
+    with tempfile.NamedTemporaryFile(prefix='bayeslite') as f:
+        with bayesdb_open(pathname=f.name, version=10) as bdb:
+            test_core.t1_schema(bdb)
+            test_core.t1_data(bdb)
+        # A read-only database is never upgraded.
+        with bayesdb_open(pathname=f.name, readonly=True) as bdb:
+            bayesdb_schema_required(bdb, 10, 'opened read-only')
+            with pytest.raises(BayesDBException):
+                bayesdb_schema_required(bdb, 11, 'opened read-only')
+            assert bdb.execute('SELECT COUNT(*) FROM t1').fetchvalue() == \
+                len(test_core.t1_rows)
+
 def test_schema_compatible():
     for i, old_version in enumerate(USABLE_VERSIONS[:-1]):
         for new_version in USABLE_VERSIONS[i+1:]:
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import contextlib
+import os
+import pytest
+import shutil
+import tempfile
+
+import bayeslite
+
+import test_core
+
+@contextlib.contextmanager
+def tempdir():
+    path = tempfile.mkdtemp(prefix='bayeslite')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+dependence_sql = 'ESTIMATE DEPENDENCE PROBABILITY OF age WITH weight BY p1'
+predictive_sql = '''
+    ESTIMATE PREDICTIVE PROBABILITY OF age FROM p1 ORDER BY _rowid_
+'''
+
+def test_export_serve():
+    with test_core.analyzed_bayesdb_population(test_core.t1(), 2, 1) \
+            as (bdb, _population_id, _generator_id), \
+            tempdir() as path:
+        pathname = os.path.join(path, 'p1_cc.snapshot')
+        bayeslite.bayesdb_export_models(bdb, 'p1_cc', pathname)
+        with pytest.raises(ValueError):
+            bayeslite.bayesdb_export_models(bdb, 'p1_cc', pathname)
+        dependence = bdb.execute(dependence_sql).fetchall()
+        with bayeslite.bayesdb_open(pathname=pathname, readonly=True,
+                storage_profile='serve') as snapshot:
+            assert snapshot.execute(dependence_sql).fetchall() == dependence
+            assert len(snapshot.execute(
+                'SIMULATE age, weight FROM p1 LIMIT 3').fetchall()) == 3
+            # No data, and no history.
+            assert snapshot.execute('SELECT COUNT(*) FROM t1').fetchvalue() \
+                == 0
+            assert snapshot.execute('''
+                SELECT COUNT(*) FROM bayesdb_crosscat_diagnostics
+            ''').fetchvalue() == 0
+            assert snapshot.execute('''
+                SELECT COUNT(*) FROM bayesdb_crosscat_theta
+            ''').fetchvalue() == 2
+
+def test_import():
+    with test_core.analyzed_bayesdb_population(test_core.t1(), 2, 1) \
+            as (bdb, _population_id, _generator_id), \
+            tempdir() as path:
+        pathname = os.path.join(path, 'p1_cc.snapshot')
+        bayeslite.bayesdb_export_models(bdb, 'p1_cc', pathname)
+        predictive = bdb.execute(predictive_sql).fetchall()
+
+        # Into a BayesDB with the same data.
+        with bayeslite.bayesdb_open() as replica:
+            test_core.t1_schema(replica)
+            test_core.t1_data(replica)
+            bayeslite.bayesdb_import_models(replica, pathname)
+            assert replica.execute(predictive_sql).fetchall() == predictive
+            with pytest.raises(ValueError):
+                bayeslite.bayesdb_import_models(replica, pathname)
+            bayeslite.bayesdb_import_models(replica, pathname, replace=True)
+            bayeslite.bayesdb_import_models(replica, pathname, name='p1_cc2')
+            assert replica.execute('''
+                SELECT name FROM bayesdb_generator ORDER BY id
+            ''').fetchall() == [('p1_cc',), ('p1_cc2',)]
+            assert replica.execute(predictive_sql).fetchall() == predictive
+
+        # Into an empty BayesDB, with the data in the snapshot.
+        data_pathname = os.path.join(path, 'p1_cc_data.snapshot')
+        bayeslite.bayesdb_export_models(bdb, 'p1_cc', data_pathname,
+            data=True)
+        with bayeslite.bayesdb_open() as replica:
+            bayeslite.bayesdb_import_models(replica, data_pathname)
+            assert replica.execute(predictive_sql).fetchall() == predictive
+
+        # Not into a BayesDB whose population differs.
+        with bayeslite.bayesdb_open() as replica:
+            test_core.t1_schema(replica)
+            replica.execute('''
+                CREATE POPULATION p1 FOR t1 (
+                    id IGNORE; label NOMINAL; age NUMERICAL; weight IGNORE
+                )
+            ''')
+            with pytest.raises(ValueError):
+                bayeslite.bayesdb_import_models(replica, pathname)
+            assert replica.execute('''
+                SELECT COUNT(*) FROM bayesdb_generator
+            ''').fetchvalue() == 0
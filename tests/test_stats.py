@@ -74,6 +74,17 @@ def test_chi2_sf():
     assert relerr(.0482861, stats.chi2_sf(3.9,1)) < .05
     assert relerr(.3464377e-4, stats.chi2_sf(193,121)) < .05
 
+def test_chi2_sf_array():
+    x = [0, .8, .6, .1, 9, 1.9, 1, 8, 3.9, 193, -1]
+    df = [12, .1, .6, .05, 12, 3, 4.2, 7, 1, 121, 2]
+    sf = stats.chi2_sf(x, df)
+    assert len(sf) == len(x)
+    for i in range(len(x)):
+        assert relerr(stats.chi2_sf(x[i], df[i]), sf[i]) < 1e-12
+    assert relerr(.7029304, stats.chi2_sf([9, 9], 12)[1]) < .05
+    with pytest.raises(ValueError):
+        stats.chi2_sf([1, 2], [1, 0])
+
 def test_f_sf():
     # Non-positive degrees of freedom should throw an error.
     with pytest.raises(ValueError):
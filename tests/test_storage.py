@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+#   Copyright (c) 2010-2016, MIT Probabilistic Computing Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import pytest
+import tempfile
+
+import bayeslite
+
+from bayeslite.txn import BayesDBTxnError
+
+def test_storage_profile():
+    fd, pathname = tempfile.mkstemp(prefix='bayeslite', suffix='.bdb')
+    os.close(fd)
+    os.unlink(pathname)
+    try:
+        with bayeslite.bayesdb_open(pathname=pathname,
+                storage_profile='fast') as bdb:
+            settings = bdb.storage_settings()
+            assert settings['journal_mode'] == 'wal'
+            assert settings['synchronous'] == 'normal'
+            assert settings['page_size'] == 4096
+            assert settings['cache_size'] == -64*1024
+            assert settings['temp_store'] == 'memory'
+            bdb.sql_execute('CREATE TABLE t(x)')
+        # The journal mode and page size persist in the file; the rest
+        # are settings of the connection.
+        with bayeslite.bayesdb_open(pathname=pathname,
+                storage_profile={'page_size': 8192, 'mmap_size': 4096}) \
+                as bdb:
+            settings = bdb.storage_settings()
+            assert settings['journal_mode'] == 'wal'
+            assert settings['page_size'] == 4096
+            assert settings['synchronous'] == 'full'
+            assert settings['mmap_size'] == 4096
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(pathname + suffix):
+                os.unlink(pathname + suffix)
+
+def test_storage_profile_invalid():
+    with pytest.raises(ValueError):
+        bayeslite.bayesdb_open(storage_profile='nonesuch')
+    with pytest.raises(ValueError):
+        bayeslite.bayesdb_open(storage_profile={'nonesuch': 1})
+    with pytest.raises(ValueError):
+        bayeslite.bayesdb_open(storage_profile={'synchronous': 'maybe'})
+    with pytest.raises(ValueError):
+        bayeslite.bayesdb_open(storage_profile={'mmap_size': '1; DROP'})
+
+@pytest.mark.parametrize('profile', ['default', 'fast'])
+def test_backup(profile):
+    fd, pathname = tempfile.mkstemp(prefix='bayeslite', suffix='.bdb')
+    os.close(fd)
+    os.unlink(pathname)
+    backup_pathname = pathname + '.backup'
+    try:
+        with bayeslite.bayesdb_open(pathname=pathname,
+                storage_profile=profile) as bdb:
+            bdb.sql_execute('CREATE TABLE t(x)')
+            for i in xrange(1000):
+                bdb.sql_execute('INSERT INTO t VALUES (?)', ('x'*100 + str(i),))
+            steps = []
+            def progress(copied, total):
+                steps.append((copied, total))
+            with bdb.savepoint():
+                # Uncommitted changes are not in the backup.
+                bdb.sql_execute('DELETE FROM t')
+                bdb.backup(backup_pathname, pages_per_step=4,
+                    progress=progress)
+            assert 1 < len(steps)
+            assert steps[-1][0] == steps[-1][1]
+        with bayeslite.bayesdb_open(pathname=backup_pathname) as bdb:
+            assert bdb.sql_execute('SELECT COUNT(*) FROM t').fetchvalue() \
+                == 1000
+    finally:
+        for path in (pathname, backup_pathname):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.unlink(path + suffix)
+
+def test_backup_concurrent():
+    # In WAL mode, a commit during the backup neither blocks on it nor
+    # gets into it.
+    fd, pathname = tempfile.mkstemp(prefix='bayeslite', suffix='.bdb')
+    os.close(fd)
+    os.unlink(pathname)
+    backup_pathname = pathname + '.backup'
+    try:
+        with bayeslite.bayesdb_open(pathname=pathname,
+                storage_profile='fast') as bdb:
+            bdb.sql_execute('CREATE TABLE t(x)')
+            for i in xrange(1000):
+                bdb.sql_execute('INSERT INTO t VALUES (?)', ('x'*100 + str(i),))
+            def progress(_copied, _total):
+                bdb.sql_execute('INSERT INTO t VALUES (42)')
+            bdb.backup(backup_pathname, pages_per_step=4, progress=progress)
+            assert 1000 < bdb.sql_execute('SELECT COUNT(*) FROM t') \
+                .fetchvalue()
+        with bayeslite.bayesdb_open(pathname=backup_pathname) as bdb:
+            assert bdb.sql_execute('SELECT COUNT(*) FROM t').fetchvalue() \
+                == 1000
+
+        with bayeslite.bayesdb_open() as bdb:
+            bdb.sql_execute('CREATE TABLE t(x)')
+            bdb.sql_execute('INSERT INTO t VALUES (1)')
+            bdb.backup(backup_pathname)
+            # Nothing uncommitted is copied.
+            with pytest.raises(BayesDBTxnError):
+                with bdb.transaction():
+                    bdb.sql_execute('INSERT INTO t VALUES (2)')
+                    bdb.backup(backup_pathname)
+        with bayeslite.bayesdb_open(pathname=backup_pathname) as bdb:
+            assert bdb.sql_execute('SELECT x FROM t').fetchall() == [(1,)]
+            with pytest.raises(ValueError):
+                bdb.backup(pathname, pages_per_step=0)
+    finally:
+        for path in (pathname, backup_pathname):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.unlink(path + suffix)